@@ -0,0 +1,184 @@
+"""
+Microbenchmarks for the hot functions of the model.
+
+The classes follow the asv conventions (``params``, ``param_names``,
+``setup`` and ``time_*`` methods) so they can be run by asv, but they are
+normally run with ``python benchmarks/run_benchmarks.py`` which saves the
+timings to a JSON file that can be compared between commits.
+
+Synthetic populations come from ``tests/generate_test_data.py``.
+"""
+import os
+import sys
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+import trachoma.trachoma_functions as tf
+from trachoma.coverage import clearScheduleCache
+from trachoma.runner import run_simulations
+from generate_test_data import DEMOG, make_params, make_population, make_simulation_results
+
+POPULATION_SIZES = [1000, 10000, 100000]
+PREVALENCES = ['low', 'high']
+
+
+class PopulationBenchmark:
+    '''
+    Base class for benchmarks that act on a single population.
+    '''
+    params = [POPULATION_SIZES, PREVALENCES]
+    param_names = ['N', 'prevalence']
+    # number of calls timed in each repeat, and number of repeats
+    number = 1
+    repeat = 5
+    vaccinated_fraction = 0.0
+
+    def setup(self, N, prevalence):
+        self.params_dict = make_params(N)
+        self.demog = DEMOG
+        self.vals = make_population(N, prevalence, vaccinated_fraction=self.vaccinated_fraction,
+                                    params=self.params_dict)
+        np.random.seed(1)
+
+
+class StepF(PopulationBenchmark):
+    vaccinated_fraction = 0.2
+
+    def time_stepF_fixed(self, N, prevalence):
+        tf.stepF_fixed(vals=self.vals, params=self.params_dict, demog=self.demog, bet=0.2)
+
+
+class LambdaStep(PopulationBenchmark):
+    number = 10
+    vaccinated_fraction = 0.2
+
+    def time_getlambdaStep(self, N, prevalence):
+        tf.getlambdaStep(params=self.params_dict, Age=self.vals['Age'], bact_load=self.vals['bact_load'],
+                         IndD=self.vals['IndD'], bet=0.2, demog=self.demog, vaccinated=self.vals['vaccinated'],
+                         time_since_vaccinated=self.vals['time_since_vaccinated'])
+
+
+class BacterialLoad(PopulationBenchmark):
+    number = 10
+    vaccinated_fraction = 0.2
+
+    def time_bacterialLoad(self, N, prevalence):
+        tf.bacterialLoad(params=self.params_dict, vals=self.vals)
+
+
+class MDA(PopulationBenchmark):
+
+    def time_MDA_timestep_Age_range(self, N, prevalence):
+        tf.MDA_timestep_Age_range(self.vals, self.params_dict, 0, 100, 1, 0, self.demog)
+
+
+class Vaccination(PopulationBenchmark):
+
+    def setup(self, N, prevalence):
+        super().setup(N, prevalence)
+        self.VaccData = [[2025.0, 0, 10, 0.8, 0, 1]]
+        self.vals['numVacc'] = np.zeros(1, dtype=object)
+        self.vals['nDosesVacc'] = np.zeros(1, dtype=object)
+        self.vals['coverageVacc'] = np.zeros(1, dtype=object)
+
+    def time_doVaccAgeRange(self, N, prevalence):
+        tf.doVaccAgeRange(self.params_dict, self.vals, 0, self.VaccData, 1, self.demog)
+
+
+class Survey(PopulationBenchmark):
+
+    def time_returnSurveyPrev(self, N, prevalence):
+        tf.returnSurveyPrev(self.vals, self.params_dict['TestSensitivity'], self.params_dict['TestSpecificity'],
+                            self.demog, 1, self.params_dict['surveyCoverage'])
+
+
+class TreatProbability(PopulationBenchmark):
+
+    def time_editTreatProbability(self, N, prevalence):
+        tf.editTreatProbability(self.vals, 0.6, 0.3)
+
+
+class ResultsIHME:
+    params = [POPULATION_SIZES, PREVALENCES]
+    param_names = ['N', 'prevalence']
+    number = 1
+    repeat = 3
+
+    def setup(self, N, prevalence):
+        self.params_dict = make_params(N)
+        self.results = make_simulation_results(N, prevalence, n_draws=2, n_years=3)
+        np.random.seed(1)
+
+    def time_getResultsIHME(self, N, prevalence):
+        tf.getResultsIHME(self.results, DEMOG, self.params_dict, range(2020, 2023))
+
+
+class MDAInfo:
+    params = [POPULATION_SIZES, PREVALENCES]
+    param_names = ['N', 'prevalence']
+    number = 1
+    repeat = 3
+
+    def setup(self, N, prevalence):
+        self.results = make_simulation_results(N, prevalence, n_draws=2, n_years=3)
+        self.sim_params = {'burnin': 26}
+
+    def time_getMDAInfo(self, N, prevalence):
+        tf.getMDAInfo(self.results, date(2019, 1, 1), self.sim_params, DEMOG)
+
+
+class PlatformData:
+    # reading the coverage data doesn't depend on the population, so this is
+    # parametrised over the coverage files instead
+    params = [['scen1.csv', 'scen2c.csv', 'scen3a_10.csv'], ['MDA', 'Vaccine']]
+    param_names = ['coverage_file', 'platform']
+    # the schedules read are cached, so only the first call after setup parses the file
+    number = 1
+    repeat = 10
+
+    def setup(self, coverage_file, platform):
+        clearScheduleCache()
+
+    def time_readPlatformData(self, coverage_file, platform):
+        tf.readPlatformData(coverage_file, platform)
+
+
+class PlatformDataCached:
+    # reading coverage data again, once the file's schedule is cached
+    params = PlatformData.params
+    param_names = PlatformData.param_names
+    number = 5
+    repeat = 5
+
+    def setup(self, coverage_file, platform):
+        clearScheduleCache()
+        tf.readPlatformData(coverage_file, platform)
+
+    def time_readPlatformData(self, coverage_file, platform):
+        tf.readPlatformData(coverage_file, platform)
+
+
+class Backends:
+    # several short draws, where starting processes and pickling inputs and outputs
+    # is a large part of the cost
+    params = [POPULATION_SIZES[:2], ['processes', 'threads']]
+    param_names = ['N', 'backend']
+    number = 1
+    repeat = 3
+    n_draws = 4
+    weeks = 26
+
+    def setup(self, N, backend):
+        self.params_dict = make_params(N)
+        self.population = make_population(N, 'high', params=self.params_dict)
+        self.states = [tf.seed_to_state(s) for s in range(self.n_draws)]
+
+    def time_run_simulations(self, N, backend):
+        run_simulations(pickleData=self.population, params=self.params_dict, timesim=self.weeks, burnin=0,
+                        demog=DEMOG, betas=np.full(self.n_draws, 0.2), MDA_times=np.array([10]),
+                        MDAData=[[2020.0, 0, 100, 0.8, 0, 1]], vacc_times=np.array([self.weeks + 100]),
+                        VaccData=[[3026.0, 2, 5, 0.0, 0, 1]], outputTimes=np.array([self.weeks - 1]),
+                        doSurvey=False, doIHMEOutput=True, numpy_states=self.states, n_jobs=2, backend=backend)
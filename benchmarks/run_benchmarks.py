@@ -0,0 +1,153 @@
+"""
+Run the microbenchmarks in benchmarks.py and save the timings as JSON.
+
+Usage:
+
+    python benchmarks/run_benchmarks.py -o bench_<commit>.json
+    python benchmarks/run_benchmarks.py -k StepF --sizes 1000 10000
+    python benchmarks/run_benchmarks.py --compare bench_old.json bench_new.json
+
+Each benchmark is run for every combination of its parameters. Before each
+repeat the benchmark's setup is called again, so functions which change the
+population (MDA, vaccination) are always timed on the same starting state.
+"""
+import argparse
+import datetime
+import inspect
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+import benchmarks.benchmarks as bm
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_classes(pattern=None):
+    for name, cls in inspect.getmembers(bm, inspect.isclass):
+        if cls.__module__ != bm.__name__ or not hasattr(cls, 'params'):
+            continue
+        for method in sorted(m for m in dir(cls) if m.startswith('time_')):
+            key = name + '.' + method
+            if pattern is None or pattern in key:
+                yield key, cls, method
+
+
+def run_benchmark(cls, method, param_values, repeat=None):
+    '''
+    Time one benchmark method for one set of parameter values.
+    Returns the per call times of every repeat in seconds.
+    '''
+    instance = cls()
+    number = getattr(cls, 'number', 1)
+    repeat = repeat or getattr(cls, 'repeat', 5)
+    func = getattr(instance, method)
+    times = []
+    for _ in range(repeat):
+        instance.setup(*param_values)
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*param_values)
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def run_all(pattern=None, sizes=None, repeat=None, verbose=True):
+    results = []
+    for key, cls, method in benchmark_classes(pattern):
+        grid = list(cls.params)
+        if sizes is not None and cls.param_names[0] == 'N':
+            grid[0] = [n for n in grid[0] if n in sizes]
+        for param_values in itertools.product(*grid):
+            times = run_benchmark(cls, method, param_values, repeat)
+            entry = {
+                'name': key,
+                'params': dict(zip(cls.param_names, param_values)),
+                'min': min(times),
+                'median': statistics.median(times),
+                'mean': statistics.mean(times),
+                'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+                'repeat': len(times),
+                'number': getattr(cls, 'number', 1),
+            }
+            results.append(entry)
+            if verbose:
+                print(f"{key:45s} {str(param_values):28s} median {entry['median'] * 1e3:10.3f} ms")
+    return results
+
+
+def result_key(entry):
+    return entry['name'] + ' ' + json.dumps(entry['params'], sort_keys=True)
+
+
+def compare(old_path, new_path, threshold=1.1):
+    '''
+    Print the ratio new/old of the median times of two benchmark files and
+    return the number of benchmarks which got slower by more than threshold.
+    '''
+    with open(old_path) as f:
+        old = {result_key(e): e for e in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {result_key(e): e for e in json.load(f)['results']}
+    n_slower = 0
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key]['median'] / old[key]['median']
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            n_slower += 1
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print(f"{key:80s} {old[key]['median'] * 1e3:10.3f} ms -> {new[key]['median'] * 1e3:10.3f} ms  x{ratio:6.2f}{flag}")
+    return n_slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', help='path of the JSON file to save the results in')
+    parser.add_argument('-k', '--filter', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--sizes', type=int, nargs='+', help='population sizes to run, defaults to all')
+    parser.add_argument('--repeat', type=int, help='override the number of repeats of every benchmark')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved result files')
+    parser.add_argument('--threshold', type=float, default=1.1, help='ratio above which a benchmark counts as slower')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        n_slower = compare(args.compare[0], args.compare[1], args.threshold)
+        return 1 if n_slower > 0 else 0
+
+    results = run_all(args.filter, args.sizes, args.repeat)
+    output = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    path = args.output or f"bench_{output['commit'] or 'results'}.json"
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=1)
+    print(f"Saved {len(results)} timings to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+End-to-end scaling harness.
+
+Runs run_single_simulation over a grid of (cores, N, draws, years) and records,
+for each point of the grid, the wall time, the CPU utilisation of the workers,
+the peak RSS of the parent and of the workers, and the number of bytes
+transferred between processes (task arguments sent to the workers, and results
+sent back). The report shows strong scaling (fixed work, more cores) and weak
+scaling (draws per core fixed, more cores) so that it is clear where joblib's
+per-task overhead and result pickling start to dominate.
+
+Usage:
+
+    python benchmarks/scaling.py --cores 1 2 4 8 --sizes 1000 2500 --draws 8 --years 5
+    python benchmarks/scaling.py --weak --draws-per-core 2 --cores 1 2 4 8
+
+The raw measurements are saved to scaling.json, a markdown report to scaling.md
+and, if matplotlib is installed, plots of the scaling curves to scaling.png, all
+in --output-dir. Everything runs locally.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import pickle
+import platform
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+import numpy as np
+from joblib import Parallel, delayed
+from joblib.externals.loky import get_reusable_executor
+
+import trachoma.trachoma_functions as tf
+from trachoma.telemetry import current_rss
+from generate_test_data import DEMOG, make_params, make_population
+
+
+def make_workload(N, years, prevalence='high'):
+    '''
+    Starting population and intervention schedule for a run of the given number of years,
+    with a whole population MDA every year.
+    '''
+    params = make_params(N)
+    population = make_population(N, prevalence, params=params)
+    timesim = 52 * years
+    MDAData = [[2020.0 + y, 0, 100, 0.8, 0, 1] for y in range(years)]
+    return dict(
+        pickleData=population, params=params, timesim=timesim, burnin=0, demog=DEMOG,
+        MDA_times=np.arange(years) * 52 + 10, MDAData=MDAData,
+        vacc_times=np.array([timesim + 100]), VaccData=[[3026.0, 2, 5, 0.0, 0, 1]],
+        outputTimes=np.arange(1, years + 1) * 52 - 1, doSurvey=False, doIHMEOutput=True,
+    )
+
+
+def _reset_peak_rss():
+    '''
+    Reset the peak RSS of this process to its current RSS, which Linux allows through
+    /proc/self/clear_refs. Returns whether it was reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss(reset):
+    '''
+    Peak RSS of this process in bytes, since the last reset if reset is True, otherwise
+    over its lifetime.
+    '''
+    if reset:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measured_simulation(index, beta, numpy_state, workload):
+    '''
+    Run one simulation and measure it from inside the worker.
+    '''
+    reset = _reset_peak_rss()
+    start_usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    result = tf.run_single_simulation(beta=beta, index=index, numpy_state=numpy_state, **workload)
+    wall = time.perf_counter() - start
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (end_usage.ru_utime - start_usage.ru_utime) + (end_usage.ru_stime - start_usage.ru_stime)
+    metrics = {
+        'pid': os.getpid(),
+        'wall': wall,
+        'cpu': cpu,
+        'rss': current_rss(),
+        'peak_rss': _peak_rss(reset),
+        'result_bytes': len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)),
+    }
+    return result, metrics
+
+
+def run_point(cores, N, draws, years, workload=None, warm=True):
+    '''
+    Run one point of the grid and return its measurements. Each point has new
+    workers, so that their peak RSS is that of this point. If warm is True the
+    workers are started, and run a short simulation each, before the timing
+    starts, so that the one-off cost of spawning them and importing trachoma
+    isn't counted as per-task overhead.
+    '''
+    if workload is None:
+        workload = make_workload(N, years)
+    get_reusable_executor().shutdown(wait=True)
+    if warm and cores > 1:
+        # run_single_simulation is pickled by reference, so the workers import trachoma to run it
+        warmup = dict(make_workload(50, 1), timesim=4)
+        Parallel(n_jobs=cores, batch_size=1)(
+            delayed(tf.run_single_simulation)(beta=0.2, index=i, numpy_state=tf.seed_to_state(i), **warmup)
+            for i in range(2 * cores))
+    betas = np.full(draws, 0.2)
+    states = [tf.seed_to_state(s) for s in range(draws)]
+    task_bytes = sum(len(pickle.dumps((i, betas[i], states[i], workload), protocol=pickle.HIGHEST_PROTOCOL))
+                     for i in range(draws))
+
+    parent_usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    out = Parallel(n_jobs=cores)(delayed(measured_simulation)(i, betas[i], states[i], workload) for i in range(draws))
+    wall = time.perf_counter() - start
+    parent_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    tasks = [m for _, m in out]
+    worker_cpu = sum(m['cpu'] for m in tasks)
+    parent_cpu = (parent_end.ru_utime - parent_usage.ru_utime) + (parent_end.ru_stime - parent_usage.ru_stime)
+    task_wall = sum(m['wall'] for m in tasks)
+    busy_cores = min(cores, draws)
+    return {
+        'cores': cores, 'N': N, 'draws': draws, 'years': years,
+        'wall_time': wall,
+        'weeks_per_second': draws * 52 * years / wall,
+        # share of the available core time which was spent computing. With one core joblib
+        # runs the simulations in the parent, so the parent's CPU time already includes them
+        'cpu_utilisation': (parent_cpu if cores == 1 else worker_cpu) / (wall * busy_cores),
+        'worker_cpu': worker_cpu,
+        'parent_cpu': parent_cpu,
+        # time not spent inside the simulations: spawning workers, pickling, scheduling and collecting results
+        'overhead_fraction': max(0.0, 1 - task_wall / (wall * busy_cores)),
+        'n_workers': len({m['pid'] for m in tasks}),
+        'parent_peak_rss': parent_end.ru_maxrss * 1024,
+        'worker_peak_rss': max(m['peak_rss'] for m in tasks),
+        'bytes_to_workers': task_bytes,
+        'bytes_from_workers': sum(m['result_bytes'] for m in tasks),
+    }
+
+
+def scaling_curves(points, weak=False):
+    '''
+    Add speedup and parallel efficiency, relative to the single core run with the
+    same N and years (and the same number of draws for strong scaling).
+    '''
+    for point in points:
+        key = (point['N'], point['years']) if weak else (point['N'], point['years'], point['draws'])
+        base = [p for p in points if p['cores'] == 1 and
+                ((p['N'], p['years']) if weak else (p['N'], p['years'], p['draws'])) == key]
+        if not base:
+            continue
+        if weak:
+            # for weak scaling the work grows with the cores, so the speedup is the ratio of throughputs
+            point['speedup'] = point['weeks_per_second'] / base[0]['weeks_per_second']
+        else:
+            point['speedup'] = base[0]['wall_time'] / point['wall_time']
+        point['efficiency'] = point['speedup'] / point['cores']
+    return points
+
+
+def markdown_report(points, weak):
+    columns = ['cores', 'N', 'draws', 'years', 'wall_time', 'weeks_per_second', 'speedup', 'efficiency',
+               'cpu_utilisation', 'overhead_fraction', 'worker_peak_rss', 'bytes_to_workers', 'bytes_from_workers']
+    lines = [f"# {'Weak' if weak else 'Strong'} scaling", '',
+             '| ' + ' | '.join(columns) + ' |', '|' + '---|' * len(columns)]
+    for point in points:
+        row = []
+        for column in columns:
+            value = point.get(column, '')
+            if column.endswith('rss') or column.startswith('bytes'):
+                value = f'{value / 1e6:.2f} MB'
+            elif isinstance(value, float):
+                value = f'{value:.3f}'
+            row.append(str(value))
+        lines.append('| ' + ' | '.join(row) + ' |')
+    return '\n'.join(lines) + '\n'
+
+
+def plot(points, weak, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    fig, axes = plt.subplots(1, 2, figsize=(11, 4))
+    groups = {}
+    for p in points:
+        groups.setdefault((p['N'], p['years']) if weak else (p['N'], p['years'], p['draws']), []).append(p)
+    for key, group in sorted(groups.items()):
+        group = sorted(group, key=lambda p: p['cores'])
+        cores = [p['cores'] for p in group]
+        label = f"N={key[0]}, {key[1]} years" + ('' if weak else f", {key[2]} draws")
+        axes[0].plot(cores, [p.get('speedup', np.nan) for p in group], marker='o', label=label)
+        axes[1].plot(cores, [p['overhead_fraction'] for p in group], marker='o', label=label)
+    max_cores = max(p['cores'] for p in points)
+    axes[0].plot([1, max_cores], [1, 1 if weak else max_cores], 'k--', linewidth=0.8, label='ideal')
+    axes[0].set_xlabel('cores')
+    axes[0].set_ylabel('throughput per core (relative)' if weak else 'speedup')
+    axes[1].set_xlabel('cores')
+    axes[1].set_ylabel('overhead fraction')
+    axes[0].legend(fontsize='small')
+    fig.suptitle(f"{'Weak' if weak else 'Strong'} scaling")
+    fig.tight_layout()
+    fig.savefig(path)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2500])
+    parser.add_argument('--draws', type=int, nargs='+', default=[8],
+                        help='number of draws (strong scaling)')
+    parser.add_argument('--years', type=int, nargs='+', default=[5])
+    parser.add_argument('--weak', action='store_true', help='weak scaling: draws = draws-per-core * cores')
+    parser.add_argument('--draws-per-core', type=int, default=2)
+    parser.add_argument('--cold', action='store_true', help='include the time taken to start the workers')
+    parser.add_argument('--output-dir', default='.')
+    args = parser.parse_args(argv)
+
+    if 1 not in args.cores:
+        args.cores = [1] + args.cores
+    points = []
+    for N, years in itertools.product(args.sizes, args.years):
+        workload = make_workload(N, years)
+        draw_counts = [None] if args.weak else args.draws
+        for draws, cores in itertools.product(draw_counts, sorted(args.cores)):
+            n_draws = args.draws_per_core * cores if args.weak else draws
+            point = run_point(cores, N, n_draws, years, workload, warm=not args.cold)
+            points.append(point)
+            print(f"cores={cores:3d} N={N:7d} draws={n_draws:4d} years={years:3d}  "
+                  f"wall {point['wall_time']:8.2f} s  cpu {point['cpu_utilisation']:6.1%}  "
+                  f"overhead {point['overhead_fraction']:6.1%}  returned {point['bytes_from_workers'] / 1e6:8.2f} MB")
+    scaling_curves(points, args.weak)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, 'scaling.json'), 'w') as f:
+        json.dump({'date': datetime.datetime.now().isoformat(), 'machine': platform.machine(),
+                   'cpu_count': os.cpu_count(), 'python': platform.python_version(), 'weak': args.weak,
+                   'points': points}, f, indent=1)
+    with open(os.path.join(args.output_dir, 'scaling.md'), 'w') as f:
+        f.write(markdown_report(points, args.weak))
+    plotted = plot(points, args.weak, os.path.join(args.output_dir, 'scaling.png'))
+    print(f"Report written to {args.output_dir}" + (' (with plots)' if plotted else ''))
+
+
+if __name__ == '__main__':
+    main()
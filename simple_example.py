@@ -1,9 +1,9 @@
 import numpy as np
 
 from trachoma.trachoma_functions import *
+from trachoma.pool import SimulationPool
 import multiprocessing
 import time
-from joblib import Parallel, delayed
 num_cores = multiprocessing.cpu_count()
 import pickle
 
@@ -25,6 +25,7 @@ params = {'N': 2500,
           'min_ID':11, #Parameters relating to duration of infection period, including ID period
           'av_D_duration':300/7,
           'min_D':1, #Parameters relating to duration of disease period
+          'dis_red':0.3,
           'v_1':1,
           'v_2':2.6,
           'phi':1.4,
@@ -47,7 +48,10 @@ params = {'N': 2500,
           'vacc_prob_block_transmission':  0.8, 
           'vacc_reduce_bacterial_load': 0.5, 
           'vacc_reduce_duration': 0.5,  
-          'vacc_waning_length': 52 * 5}
+          'vacc_waning_length': 52 * 5,
+          'importation_rate': 0,
+          'importation_reduction_rate': 1,
+          'surveyCoverage': 0.4}
 
 
 sim_params = {'timesim':52*23, 
@@ -127,20 +131,22 @@ numpy_states = list(map(lambda s: seed_to_state(s), np.random.randint(2^32, size
 #############################################################################################################################
 #############################################################################################################################
 # run as many simulations as specified
-results = Parallel(n_jobs=num_cores)(
-         delayed(run_single_simulation)(pickleData = pickleData[i], 
-                                        params = params, 
-                                        timesim = sim_params['timesim'],
-                                        burnin = sim_params['burnin'],
-                                        demog=demog, 
-                                        beta = allBetas.beta[i], 
-                                        MDA_times = MDA_times, 
-                                        MDAData=MDAData, 
-                                        vacc_times = vacc_times, 
-                                        VaccData = VaccData,
-                                        outputTimes= outputTimes, 
-                                        index = i,
-                                        numpy_state=numpy_states[i]) for i in range(numSims))
+# the pool's workers load the scenario once and are kept running, so further IUs or scenarios can be run
+# with the same pool, each task only sending the draw index, beta and random state
+with SimulationPool(n_workers=num_cores) as pool:
+    with pool.context(pickleData = pickleData,
+                      params = params,
+                      timesim = sim_params['timesim'],
+                      burnin = sim_params['burnin'],
+                      demog=demog,
+                      MDA_times = MDA_times,
+                      MDAData=MDAData,
+                      vacc_times = vacc_times,
+                      VaccData = VaccData,
+                      outputTimes= outputTimes,
+                      doSurvey = True,
+                      doIHMEOutput = True) as context:
+        results = pool.run(context, betas = allBetas.beta[:numSims], seeds = numpy_states)
 
 
 print(time.time()- start)
@@ -1,6 +1,150 @@
 from trachoma import Trachoma_Simulation
+import numpy as np
 import numpy.testing
 
+import trachoma.trachoma_functions as tf
+
+# prevalence levels used for the synthetic populations, given as the proportion
+# of the population who are currently infected
+PREVALENCE_LEVELS = {'low': 0.01, 'high': 0.3}
+
+DEMOG = {'tau': 0.0004807692,
+         'max_age': 3120,
+         'mean_age': 1040}
+
+
+def make_params(N=1000, **overrides):
+    '''
+    Parameter dictionary matching the one used in the end to end test,
+    with the population size set to N.
+    '''
+    params = {'N': N,
+              'av_I_duration': 2,
+              'av_ID_duration': 200 / 7,
+              'inf_red': 0.45,
+              'min_ID': 11,
+              'av_D_duration': 300 / 7,
+              'min_D': 1,
+              'dis_red': 0.3,
+              'v_1': 1,
+              'v_2': 2.6,
+              'phi': 1.4,
+              'epsilon': 0.5,
+              'MDA_Cov': 0.8,
+              'MDA_Eff': 0.85,
+              'rho': 0.3,
+              'nweeks_year': 52,
+              'babiesMaxAge': 0.5,
+              'youngChildMaxAge': 9,
+              'olderChildMaxAge': 15,
+              'b1': 1,
+              'ep2': 0.114,
+              'n_inf_sev': 38,
+              'TestSensitivity': 0.96,
+              'TestSpecificity': 0.965,
+              'SecularTrendIndicator': 0,
+              'SecularTrendYearlyBetaDecrease': 0.05,
+              'vacc_prob_block_transmission': 0.8,
+              'vacc_reduce_bacterial_load': 0.5,
+              'vacc_reduce_duration': 0.5,
+              'vacc_waning_length': 52 * 5,
+              'importation_rate': 0,
+              'importation_reduction_rate': 1,
+              'surveyCoverage': 0.4}
+    params.update(overrides)
+    return params
+
+
+def make_population(N, prevalence, seed=0, vaccinated_fraction=0.0, params=None, demog=DEMOG):
+    '''
+    Build a synthetic population of size N where roughly `prevalence` of people
+    are infected. Infected people are spread through the latent, ID and D
+    stages so that every transition in stepF_fixed has someone to act on.
+
+    Parameters
+    ----------
+    N : int
+        population size
+    prevalence : float or str
+        proportion of people infected, or a key of PREVALENCE_LEVELS
+    seed : int
+        seed used to generate the population
+    vaccinated_fraction : float
+        proportion of the population who have been vaccinated at some point
+        in the last waning period
+
+    Returns
+    -------
+    dict
+        vals dictionary in the same format as returned by Set_inits
+    '''
+    if isinstance(prevalence, str):
+        prevalence = PREVALENCE_LEVELS[prevalence]
+    if params is None:
+        params = make_params(N)
+    sim_params = {'N_MDA': 0}
+    MDAData = [[2020.0, 0, 100, 0.8, 0, 2]]
+    vals = tf.Set_inits(params=params, demog=demog, sim_params=sim_params, MDAData=MDAData,
+                        numpy_state=tf.seed_to_state(seed))
+    vals = tf.Check_for_MDA_Vacc_And_Survey_Data(vals)
+    vals = tf.resetMDAVaccAndSurveyData(vals)
+
+    # people have had a number of infections which increases with age
+    vals['No_Inf'] = np.random.poisson(lam=1 + 20 * prevalence * vals['Age'] / demog['max_age'])
+
+    infected = np.where(np.random.uniform(size=N) < prevalence)[0]
+    stage = np.random.randint(3, size=len(infected))
+    latent = infected[stage == 0]
+    active = infected[stage == 1]
+    diseased_only = infected[stage == 2]
+
+    vals['IndI'][infected] = 1
+    vals['No_Inf'][infected] = np.maximum(vals['No_Inf'][infected], 1)
+    vals['T_latent'][latent] = vals['Ind_latent'][latent]
+    vals['IndD'][active] = 1
+    vals['T_ID'][active] = np.random.randint(1, params['min_ID'] + 1, size=len(active))
+    vals['IndD'][diseased_only] = 1
+    vals['IndI'][diseased_only] = 0
+    vals['T_D'][diseased_only] = np.random.randint(1, 10, size=len(diseased_only))
+    vals['bact_load'] = tf.bacterialLoad(params=params, vals=vals)
+
+    vaccinated = np.random.uniform(size=N) < vaccinated_fraction
+    vals['vaccinated'][vaccinated] = True
+    vals['time_since_vaccinated'][vaccinated] = np.random.randint(params['vacc_waning_length'], size=np.count_nonzero(vaccinated))
+
+    vals['N_MDA'] = 0
+    return vals
+
+
+def make_simulation_results(N, prevalence, n_draws=2, n_years=3, n_mda_rounds=2, seed=0, demog=DEMOG):
+    '''
+    Build synthetic output in the format returned by run_single_simulation
+    for a number of draws, so the collation functions (getResultsIHME,
+    getMDAInfo, ...) can be run without running the simulation itself.
+
+    Returns
+    -------
+    list
+        one (vals, results) tuple per draw
+    '''
+    max_age = demog['max_age'] // 52
+    out = []
+    for draw in range(n_draws):
+        vals = make_population(N, prevalence, seed=seed + draw, demog=demog)
+        results = []
+        for year in range(n_years):
+            results.append(tf.outputResult(vals=vals, i=(year + 1) * 52, nDoses=np.zeros(2), coverage=np.zeros(2),
+                                           nMDA=np.zeros(2), nSurvey=0, surveyPass=0, true_elimination=0,
+                                           nVacc=np.zeros(1), nVaccDoses=np.zeros(1), propVacc=np.zeros(1)))
+            for mda_round in range(n_mda_rounds):
+                key = str(year + 1 + mda_round * 0.0001) + ", MDA (campaign " + str(mda_round) + ")"
+                treated = np.random.uniform(size=N) < 0.8
+                vals['n_treatments'][key], _ = np.histogram(vals['Age'][treated] / 52, bins=np.arange(max_age + 1))
+                vals['n_treatments_population'][key], _ = np.histogram(vals['Age'] / 52, bins=np.arange(max_age + 1))
+        out.append((vals, results))
+    return out
+
+
 def main():
     Trachoma_Simulation("tests/data/beta_values.csv",
                         "tests/data/mda_input_2008_2017.csv",
@@ -0,0 +1,76 @@
+import unittest
+from datetime import date
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.adaptive import RunningStatistics, NTDMCPrevalence, observedTF, run_adaptive, trueElimination
+from trachoma.reduction import OutputSpec, mergeIHME, mergeNTDMC
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestRunningStatistics(unittest.TestCase):
+
+    def test_batches_match_numpy(self):
+        values = np.random.RandomState(0).normal(size=(23, 4))
+        statistics = RunningStatistics()
+        for start, stop in [(0, 1), (1, 8), (8, 8), (8, 23)]:
+            statistics.add(values[start:stop])
+        self.assertEqual(statistics.count, 23)
+        npt.assert_allclose(statistics.mean, values.mean(axis=0))
+        npt.assert_allclose(statistics.variance, values.var(axis=0, ddof=1))
+        npt.assert_allclose(statistics.halfWidth(0.95), 1.959964 * values.std(axis=0, ddof=1) / np.sqrt(23),
+                            rtol=1e-6)
+
+
+class TestAdaptiveRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(300, TestSensitivity=1, TestSpecificity=1)
+        self.burnin = 10
+        self.spec = OutputSpec(outputYear=[2019, 2020], burnin=self.burnin)
+        self.kwargs = dict(params=self.params, timesim=2 * 52 + self.burnin, burnin=self.burnin, demog=DEMOG,
+                           betas=[0.2] * 12, MDA_times=np.array([30]), MDAData=[[2020.0, 0, 100, 0.8, 0, 1]],
+                           vacc_times=np.array([10 ** 6]), VaccData=[[2021.0, 0, 10, 0.5, 0, 1]],
+                           outputTimes=np.array([51, 103]) + self.burnin, doSurvey=False,
+                           numpy_states=[seed_to_state(s) for s in range(12)], spec=self.spec,
+                           backend='threads', n_jobs=1)
+        self.targets = {'ObservedTF': observedTF(DEMOG['max_age'] // 52), 'elimination': trueElimination,
+                        'NTDMC': NTDMCPrevalence}
+
+    def test_stops_once_precise(self):
+        # nobody is infected, so every draw is the same
+        population = make_population(300, 0.0, seed=1, params=self.params)
+        summaries, report = run_adaptive(population, targets=self.targets, tolerance=0.01, min_draws=4, **self.kwargs)
+        self.assertEqual(len(summaries), 4)
+        self.assertTrue(report.converged)
+        npt.assert_array_equal(report.statistics['elimination'].mean, [1, 1])
+
+    def test_runs_batches_up_to_max_draws(self):
+        population = make_population(300, 'high', seed=1, params=self.params)
+        summaries, report = run_adaptive(population, targets=self.targets, tolerance=1e-6, min_draws=4,
+                                         batch_size=3, max_draws=10, **self.kwargs)
+        self.assertEqual(report.draws, 10)
+        self.assertFalse(report.converged)
+        table = report.table()
+        self.assertEqual(list(table.columns), ['target', 'index', 'draws', 'mean', 'sd', 'half_width', 'tolerance',
+                                               'converged'])
+        self.assertTrue(np.all(table['draws'] == 10))
+
+        # the outputs have a column for each draw, and the targets follow them
+        sim_params = {'burnin': self.burnin, 'N_MDA': 1}
+        IHME = mergeIHME(summaries, DEMOG, self.spec, date(2019, 1, 1), sim_params)
+        draws = ['draw_' + str(i) for i in range(10)]
+        self.assertEqual(list(IHME.columns[4:]), draws)
+        for year, mean in zip([2019, 2020], report.statistics['ObservedTF'].mean):
+            rows = (IHME['Time'] == year) & IHME['age_start'].isin(range(1, 10))
+            observed = IHME.loc[rows & (IHME['measure'] == 'ObservedTF'), draws].to_numpy(dtype=float)
+            number = IHME.loc[rows & (IHME['measure'] == 'number'), draws].to_numpy(dtype=float)
+            self.assertAlmostEqual(np.mean((observed * number).sum(axis=0) / number.sum(axis=0)), mean)
+        NTDMC = mergeNTDMC(summaries, date(2019, 1, 1))
+        npt.assert_allclose(NTDMC[draws].to_numpy(dtype=float).mean(axis=1), report.statistics['NTDMC'].mean)
+
+
+if __name__ == '__main__':
+    unittest.main()
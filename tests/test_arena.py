@@ -0,0 +1,64 @@
+import pickle
+import unittest
+from datetime import date
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.arena import OutputArena
+from trachoma.reduction import OutputSpec, mergeIHME, mergeIPM, mergeNTDMC
+from trachoma.runner import run_simulations
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestOutputArena(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(500)
+        self.burnin = 26
+        self.timesim = 3 * 52 + self.burnin
+        self.outputYear = [2019, 2020, 2021]
+        self.Start_date = date(2019, 1, 1)
+        self.sim_params = {'burnin': self.burnin, 'N_MDA': 2}
+        self.spec = OutputSpec(outputYear=self.outputYear, burnin=self.burnin,
+                               MDAAgeRanges=np.array([[0, 100], [1, 10]], dtype=object),
+                               VaccAgeRanges=np.array([[0, 10]], dtype=object))
+        population = make_population(500, 'high', seed=3, params=self.params)
+        self.kwargs = dict(pickleData=population, params=self.params, timesim=self.timesim, burnin=self.burnin,
+                           demog=DEMOG, betas=[0.2, 0.25, 0.3], MDA_times=np.array([86, 86]),
+                           MDAData=[[2020.0, 0, 100, 0.8, 0, 2], [2020.0, 1, 10, 0.8, 1, 2]],
+                           vacc_times=np.array([112]), VaccData=[[2021.0, 0, 10, 0.5, 0, 1]],
+                           outputTimes=np.array([52, 104, 155]) + self.burnin, doSurvey=True, doIHMEOutput=True,
+                           numpy_states=[seed_to_state(s) for s in range(3)], n_jobs=2)
+
+    def test_arena_outputs_match_summaries(self):
+        summaries = run_simulations(summary=self.spec, **self.kwargs)
+        with OutputArena(self.spec, 3, DEMOG, self.timesim) as arena:
+            from_arena = run_simulations(arena=arena, **self.kwargs)
+            IHME = mergeIHME(from_arena, DEMOG, self.spec, self.Start_date, self.sim_params)
+            IPM = mergeIPM(from_arena, self.spec)
+            NTDMC = mergeNTDMC(from_arena, self.Start_date)
+            self.assertEqual(arena.ihme_by_age(1).shape, (3, 4, DEMOG['max_age'] // 52))
+            npt.assert_array_equal(arena.ihme_by_age(1)[:, 3].sum(axis=1), np.repeat(500, 3))
+            del from_arena
+        self.assertTrue(IHME.equals(mergeIHME(summaries, DEMOG, self.spec, self.Start_date, self.sim_params)))
+        self.assertTrue(IPM.equals(mergeIPM(summaries, self.spec)))
+        self.assertTrue(NTDMC.equals(mergeNTDMC(summaries, self.Start_date)))
+
+    def test_unfinished_draws(self):
+        with OutputArena(self.spec, 2, DEMOG, self.timesim) as arena:
+            with self.assertRaises(RuntimeError):
+                arena.summaries()
+
+    def test_pickled_arena_shares_memory(self):
+        with OutputArena(self.spec, 2, DEMOG, self.timesim) as arena:
+            copy = pickle.loads(pickle.dumps(arena))
+            copy.blocks['NTDMC'][1, :] = 0.5
+            npt.assert_array_equal(arena.blocks['NTDMC'][1], 0.5)
+            copy.close()
+            self.assertLess(len(pickle.dumps(arena)), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.runner import run_simulations
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestThreadBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(400, importation_rate=0.001, importation_reduction_rate=0.9)
+        self.kwargs = dict(pickleData=make_population(400, 'high', seed=2, params=self.params), params=self.params,
+                           timesim=2 * 52, burnin=0, demog=DEMOG, betas=[0.2, 0.25, 0.3],
+                           MDA_times=np.array([30]), MDAData=[[2020.0, 0, 100, 0.8, 0, 1]],
+                           vacc_times=np.array([60]), VaccData=[[2021.0, 0, 10, 0.5, 0, 1]],
+                           outputTimes=np.array([51, 103]), doSurvey=True, doIHMEOutput=True,
+                           numpy_states=[seed_to_state(s) for s in range(3)], n_jobs=3)
+
+    def test_threads_match_processes(self):
+        processes = run_simulations(backend='processes', **self.kwargs)
+        threads = run_simulations(backend='threads', **self.kwargs)
+        for (vals, results), (expected_vals, expected_results) in zip(threads, processes):
+            for key in ['IndI', 'IndD', 'No_Inf', 'Age', 'treatProbability', 'True_Prev_Disease_children_1_9']:
+                npt.assert_array_equal(vals[key], expected_vals[key])
+            npt.assert_array_equal(results[-1].IndD, expected_results[-1].IndD)
+
+    def test_random_state_matches_global_state(self):
+        kwargs = dict(self.kwargs)
+        for key in ['betas', 'numpy_states', 'n_jobs']:
+            kwargs.pop(key)
+        vals, _ = run_single_simulation(beta=0.2, index=0, numpy_state=seed_to_state(5), **kwargs)
+        np.random.seed(123)
+        own, _ = run_single_simulation(beta=0.2, index=0, numpy_state=seed_to_state(5),
+                                       rng=np.random.RandomState(), **kwargs)
+        npt.assert_array_equal(vals['IndI'], own['IndI'])
+        npt.assert_array_equal(vals['No_Inf'], own['No_Inf'])
+        # the global state isn't used
+        self.assertEqual(np.random.get_state()[2], seed_to_state(5)[2])
+
+    def test_params_not_changed(self):
+        run_simulations(backend='threads', **self.kwargs)
+        self.assertEqual(self.params['importation_rate'], 0.001)
+        self.assertEqual(self.params['N'], 400)
+
+    def test_threads_profile_only_time(self):
+        # tracemalloc is process-global, so the profilers of the threads can't trace memory
+        results = run_simulations(backend='threads', profile=True, **self.kwargs)
+        for vals, _ in results:
+            phases = vals['phase_profile']['phases']
+            self.assertGreater(phases['infection']['time'], 0)
+            self.assertTrue(all(stats['peak_memory'] == 0 for stats in phases.values()))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            run_simulations(backend='gpu', **self.kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+from trachoma.burnin import AdaptiveBurnin, StationarityDetector
+from trachoma.reduction import OutputSpec, run_and_summarise
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestStationarityDetector(unittest.TestCase):
+
+    def test_constant_series_stationary_after_min_weeks(self):
+        detector = StationarityDetector(2, min_weeks=520, batch_weeks=52, window=3)
+        stationary = [detector.add([0.3, 2.0]) for week in range(520)]
+        self.assertTrue(stationary[-1])
+        self.assertFalse(any(stationary[:-1]))
+
+    def test_needs_two_windows_of_batches(self):
+        detector = StationarityDetector(1, min_weeks=0, batch_weeks=10, window=4)
+        stationary = [detector.add([1.0]) for week in range(100)]
+        self.assertEqual(stationary.index(True), 79)
+
+    def test_trending_series_not_stationary(self):
+        detector = StationarityDetector(2, min_weeks=0, batch_weeks=52, window=5)
+        # the second series rises by 10% every five years
+        self.assertFalse(any(detector.add([0.3, 1.02 ** (week / 52)]) for week in range(52 * 40)))
+
+    def test_tolerances(self):
+        detector = AdaptiveBurnin(min_weeks=0, batch_weeks=1, window=1, rtol=0.1, atol=0.01).detector(1)
+        detector.add([1.0])
+        self.assertTrue(detector.add([1.1]))
+        detector.add([0.1])
+        self.assertFalse(detector.add([0.125]))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            AdaptiveBurnin(batch_weeks=0)
+        with self.assertRaises(ValueError):
+            AdaptiveBurnin(min_weeks=520, max_weeks=260)
+
+
+class TestAdaptiveBurnin(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(300)
+        self.MDAData = [[2020.0, 0, 100, 0.8, 0, 1]]
+        self.VaccData = [[2021.0, 0, 10, 0.5, 0, 1]]
+
+    def run_simulation(self, vals, burnin, timesim, adaptive_burnin, MDA_times=(10 ** 6,), seed=0, telemetry=None):
+        return tf.run_single_simulation(vals, self.params, timesim, burnin, DEMOG, 0.2,
+                                        MDA_times=np.array(MDA_times), MDAData=self.MDAData,
+                                        vacc_times=np.array([10 ** 6]), VaccData=self.VaccData,
+                                        outputTimes=np.array([burnin + 51, burnin + 103]), doSurvey=False,
+                                        doIHMEOutput=True, index=0, numpy_state=tf.seed_to_state(seed),
+                                        rng=np.random.RandomState(seed), adaptive_burnin=adaptive_burnin,
+                                        telemetry=telemetry)
+
+    def test_stops_early_and_skips_rest_of_burnin(self):
+        burnin, timesim = 30 * 52, 32 * 52
+        vals = make_population(300, 'high', seed=1, params=self.params)
+        adaptive = AdaptiveBurnin(min_weeks=260, window=3, rtol=0.1, atol=0.01)
+        events = []
+        vals, results = self.run_simulation(vals, burnin, timesim, adaptive, MDA_times=[burnin + 26],
+                                            telemetry=events.append)
+        weeks = vals['Burnin_weeks']
+        self.assertGreaterEqual(weeks, 260)
+        self.assertLess(weeks, burnin)
+        self.assertEqual(vals['Burnin_skipped_weeks'], burnin - weeks)
+        # only the weeks simulated are reported
+        end = [e for e in events if e['event'] == 'task_end'][0]
+        self.assertEqual(end['weeks'], weeks + timesim - burnin)
+        prevalence = np.array(vals['True_Prev_Disease_children_1_9'])
+        self.assertEqual(len(prevalence), timesim)
+        self.assertTrue(np.all(np.isnan(prevalence[weeks:burnin])))
+        self.assertFalse(np.any(np.isnan(prevalence[:weeks])))
+        self.assertFalse(np.any(np.isnan(prevalence[burnin:])))
+        # the MDA and outputs are at the same weeks as for the full burnin
+        self.assertEqual(len(results), 2)
+        self.assertEqual(list(vals['n_treatments']), ['30.5, MDA (campaign 0)'])
+
+    def test_stops_once_infection_extinct(self):
+        # nobody is infected in the population from Set_inits, and there is no importation
+        vals = tf.Set_inits(self.params, DEMOG, {'N_MDA': 0}, self.MDAData, tf.seed_to_state(0))
+        vals, results = self.run_simulation(vals, 520, 624, AdaptiveBurnin())
+        self.assertEqual(vals['Burnin_weeks'], 1)
+        self.assertTrue(np.all(np.isnan(vals['True_Prev_Disease_children_1_9'][1:520])))
+        npt.assert_array_equal(vals['True_Prev_Disease_children_1_9'][520:], 0)
+
+    def test_full_burnin_same_as_fixed(self):
+        burnin, timesim = 104, 208
+        population = make_population(300, 'high', seed=2, params=self.params)
+        fixed, _ = self.run_simulation(dict(population), burnin, timesim, None)
+        adaptive, _ = self.run_simulation(dict(population), burnin, timesim, AdaptiveBurnin(min_weeks=burnin))
+        self.assertEqual(adaptive['Burnin_weeks'], burnin)
+        self.assertNotIn('Burnin_weeks', fixed)
+        npt.assert_array_equal(adaptive['True_Prev_Disease_children_1_9'], fixed['True_Prev_Disease_children_1_9'])
+        npt.assert_array_equal(adaptive['IndD'], fixed['IndD'])
+
+    def test_max_weeks(self):
+        vals = make_population(300, 'high', seed=1, params=self.params)
+        summary = run_and_summarise(OutputSpec(outputYear=[2019, 2020], burnin=520), pickleData=vals,
+                                    params=self.params, timesim=624, burnin=520, demog=DEMOG, beta=0.2,
+                                    MDA_times=np.array([10 ** 6]), MDAData=self.MDAData,
+                                    vacc_times=np.array([10 ** 6]), VaccData=self.VaccData,
+                                    outputTimes=np.array([571, 623]), doSurvey=False, doIHMEOutput=False, index=0,
+                                    numpy_state=tf.seed_to_state(0), rng=np.random.RandomState(0),
+                                    adaptive_burnin=AdaptiveBurnin(min_weeks=52, max_weeks=100, rtol=0, atol=0))
+        self.assertEqual(summary.burnin_weeks, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+from trachoma.calibration import calibrate
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(200)
+        self.kwargs = dict(pickleData=make_population(200, 'high', seed=1, params=self.params), params=self.params,
+                           demog=DEMOG, burnin=52, observations=[(90, 0.3), (60, 0.4)], prior=(0.1, 0.3),
+                           MDA_times=np.array([70]), MDAData=[[2020.0, 0, 100, 0.8, 0, 1]],
+                           vacc_times=np.array([10 ** 6]), VaccData=[[2021.0, 0, 10, 0.5, 0, 1]],
+                           batch_size=10, max_candidates=10)
+
+    def test_posterior_in_input_format(self):
+        result = calibrate(tolerance=1, **self.kwargs)
+        self.assertEqual(list(result.posterior.columns), ['Random Generator', 'bet'])
+        self.assertEqual(len(result.posterior), 10)
+        self.assertEqual(list(result.posterior['Random Generator']), list(range(1, 11)))
+        self.assertTrue(result.posterior['bet'].between(0.1, 0.3).all())
+        self.assertTrue(np.all(result.distances <= 1))
+        self.assertEqual(result.rejected_early, 0)
+
+    def test_rejects_early_and_shares_burnin(self):
+        result = calibrate(tolerance=0, **self.kwargs)
+        self.assertEqual(len(result.posterior), 0)
+        self.assertEqual(result.rejected_early, 10)
+        # everyone was stopped at the first survey, after burnins shared by the candidates of each bin
+        separate = calibrate(tolerance=0, bin_width=None, **self.kwargs)
+        self.assertEqual(separate.weeks, 10 * 61)
+        self.assertLess(result.weeks, separate.weeks)
+
+    def test_posterior_reproduced_without_shared_burnins(self):
+        result = calibrate(tolerance=1, bin_width=None, **self.kwargs)
+        self.assertTrue(result.burnins.equals(result.posterior))
+        kwargs = dict(self.kwargs)
+        for key in ['observations', 'prior', 'batch_size', 'max_candidates']:
+            kwargs.pop(key)
+        sensitivity, specificity = self.params['TestSensitivity'], self.params['TestSpecificity']
+        for (seed, beta), distance in list(zip(result.posterior.itertuples(index=False), result.distances))[:3]:
+            vals, _ = tf.run_single_simulation(timesim=91, beta=beta, outputTimes=np.array([101]), doSurvey=False,
+                                               doIHMEOutput=False, index=0, numpy_state=tf.seed_to_state(seed),
+                                               rng=np.random.RandomState(), **kwargs)
+            prevalence = np.array(vals['True_Prev_Disease_children_1_9'])[[60, 90]]
+            expected = sensitivity * prevalence + (1 - specificity) * (1 - prevalence)
+            self.assertAlmostEqual(np.max(np.abs(expected - [0.4, 0.3])), distance)
+
+    def test_shared_burnins_returned(self):
+        result = calibrate(tolerance=1, **self.kwargs)
+        self.assertEqual(list(result.burnins.columns), ['Random Generator', 'bet'])
+        self.assertEqual(len(result.burnins), 10)
+        # the burnin of each bin is run with the seed of its first candidate, at the middle of the bin
+        npt.assert_allclose(result.burnins['bet'], (np.floor(result.posterior['bet'] / 0.01) + 0.5) * 0.01)
+        self.assertTrue(np.all(result.burnins['Random Generator'] <= result.posterior['Random Generator']))
+
+    def test_surveys_must_follow_burnin(self):
+        kwargs = dict(self.kwargs, observations=[(40, 0.3)])
+        with self.assertRaises(ValueError):
+            calibrate(tolerance=1, **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
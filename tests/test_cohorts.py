@@ -0,0 +1,129 @@
+import copy
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+from trachoma.cohorts import (CohortIndex, ageCount, ageHistogram, ageMask, ageMembers, ageOf, ageYearHistogram,
+                              syncAges)
+from generate_test_data import make_params
+
+
+RANGES = [(52, 520), (None, 27), (3121, None), (0.5 * 52, 10.2 * 52), (None, None), (5000, 6000), (100, 50)]
+
+
+class TestCohortIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(3)
+        self.Age = self.rng.randint(1, 3121, 2000)
+        self.index = CohortIndex(self.Age)
+
+    def assertMatchesAges(self):
+        npt.assert_array_equal(self.index.ages(), self.Age)
+        for lower, upper in RANGES:
+            expected = ageMask({'Age': self.Age}, lower, upper)
+            npt.assert_array_equal(self.index.members(lower, upper), np.where(expected)[0])
+            npt.assert_array_equal(self.index.mask(lower, upper), expected)
+            self.assertEqual(self.index.count(lower, upper), np.count_nonzero(expected))
+
+    def test_selections_match_comparing_ages(self):
+        self.assertMatchesAges()
+
+    def test_ageing_resets_and_imports(self):
+        for week in range(60):
+            self.Age += 1
+            self.index.advance()
+            reset = np.unique(self.rng.randint(0, len(self.Age), 10))
+            self.Age[reset] = 0
+            self.index.update(reset, self.Age)
+            imported = np.unique(self.rng.randint(0, len(self.Age), 3))
+            self.Age[imported] = self.rng.randint(1, 4000, len(imported))
+            self.index.update(imported, self.Age)
+        self.assertMatchesAges()
+        # order is still grouped by birth week
+        self.assertTrue(np.all(np.diff(self.index.birth[self.index.order]) >= 0))
+
+    def test_float_ages_are_rejected(self):
+        with self.assertRaises(ValueError):
+            CohortIndex(np.array([1.5, 2.0]))
+
+    def test_helpers_use_index(self):
+        vals = {'Age': self.Age, 'cohorts': self.index}
+        npt.assert_array_equal(ageMembers(vals, 52, 520), ageMembers({'Age': self.Age}, 52, 520))
+        self.assertEqual(ageCount(vals, 52, 520), ageCount({'Age': self.Age}, 52, 520))
+        self.assertEqual(set(ageMembers(vals, 52, 520, ordered=False)), set(ageMembers(vals, 52, 520)))
+        npt.assert_array_equal(ageOf(vals, [3, 7]), self.Age[[3, 7]])
+
+    def test_unordered_members_are_slices(self):
+        start, stop = self.index._bounds(52, 520, 'left')
+        members = self.index.members(52, 520, ordered=False)
+        self.assertTrue(np.shares_memory(members, self.index.order))
+        npt.assert_array_equal(members, self.index.order[start:stop])
+        with self.assertRaises(ValueError):
+            members[0] = 0
+
+    def test_histograms_match_numpy(self):
+        self.Age[:5] = 3120
+        self.index = CohortIndex(self.Age)
+        vals = {'Age': self.Age, 'cohorts': self.index}
+        for nYears in (60, 59):
+            npt.assert_array_equal(ageYearHistogram(vals, nYears),
+                                   np.histogram(self.Age / 52, bins=np.arange(nYears + 1))[0])
+            people = self.rng.uniform(size=len(self.Age)) < 0.3
+            npt.assert_array_equal(ageYearHistogram(vals, nYears, people),
+                                   np.histogram(self.Age[people] / 52, bins=np.arange(nYears + 1))[0])
+        weights = (self.rng.uniform(size=len(self.Age)) < 0.1).astype(int)
+        for nBins in (60, 7, 1):
+            npt.assert_array_equal(ageHistogram(vals, nBins), np.histogram(self.Age, bins=nBins)[0])
+            histogram = ageHistogram(vals, nBins, weights=weights)
+            npt.assert_array_equal(histogram, np.histogram(self.Age, bins=nBins, weights=weights)[0])
+            self.assertEqual(histogram.dtype, weights.dtype)
+
+    def test_age_structure_follows_population(self):
+        vals = {'Age': self.Age, 'cohorts': self.index}
+        before = ageYearHistogram(vals, 60)
+        self.Age += 52
+        self.index.advance(52)
+        npt.assert_array_equal(ageYearHistogram(vals, 60), np.histogram(self.Age / 52, bins=np.arange(61))[0])
+        self.assertFalse(np.array_equal(ageYearHistogram(vals, 60), before))
+        self.Age[:100] = 0
+        self.index.update(np.arange(100), self.Age)
+        npt.assert_array_equal(ageYearHistogram(vals, 60), np.histogram(self.Age / 52, bins=np.arange(61))[0])
+
+
+class TestModelWithCohortIndex(unittest.TestCase):
+
+    def test_reset_with_index(self):
+        demog = {'tau': 0.01, 'max_age': 3120, 'mean_age': 1040}
+        Age = np.random.RandomState(0).randint(1, 3200, 5000)
+        without = tf.Reset(Age, demog, {}, rng=np.random.RandomState(1))
+        withIndex = tf.Reset(Age, demog, {}, rng=np.random.RandomState(1), cohorts=CohortIndex(Age))
+        npt.assert_array_equal(withIndex, without)
+
+    def test_steps_keep_index_up_to_date(self):
+        params = make_params(3000, importation_rate=0.01, importation_reduction_rate=1)
+        demog = {'tau': 0.0004807692, 'max_age': 3120, 'mean_age': 1040}
+        rng = np.random.RandomState(5)
+        vals = tf.Set_inits(params, demog, {'N_MDA': 0}, [], rng.get_state(), rng=rng)
+        vals = tf.Seed_infection(params=params, vals=vals)
+        state = rng.get_state()
+        without = copy.deepcopy(vals)
+        vals['cohorts'] = CohortIndex(vals['Age'])
+        for _ in range(100):
+            vals = tf.stepF_fixed(vals, params, demog, 0.2, rng=rng)
+        rng.set_state(state)
+        for _ in range(100):
+            without = tf.stepF_fixed(without, params, demog, 0.2, rng=rng)
+        npt.assert_array_equal(vals['cohorts'].ages(), without['Age'])
+        # ages are only written into vals['Age'] when they are synced
+        self.assertFalse(np.array_equal(vals['Age'], without['Age']))
+        syncAges(vals)
+        npt.assert_array_equal(vals['Age'], without['Age'])
+        npt.assert_array_equal(vals['IndI'], without['IndI'])
+        npt.assert_array_equal(vals['IndD'], without['IndD'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+import trachoma.compliance
+from trachoma.compliance import betaCDF, complianceTable, treatmentProbabilities
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestComplianceQuantiles(unittest.TestCase):
+
+    def test_beta_cdf(self):
+        npt.assert_allclose(betaCDF([0.5], 2, 3), [0.6875])
+        npt.assert_allclose(betaCDF([0, 0.3, 1], 1, 1), [0, 0.3, 1])
+        npt.assert_allclose(betaCDF([0.2], 0.5, 0.5), [2 / np.pi * np.arcsin(np.sqrt(0.2))])
+
+    def test_probabilities_have_beta_distribution(self):
+        cov, snc = 0.7, 0.3
+        alpha, beta = cov * (1 - snc) / snc, (1 - cov) * (1 - snc) / snc
+        p = treatmentProbabilities(np.random.RandomState(0).uniform(size=100000), cov, snc)
+        self.assertAlmostEqual(p.mean(), cov, delta=0.005)
+        self.assertAlmostEqual(p.var(), alpha * beta / ((alpha + beta) ** 2 * (alpha + beta + 1)), delta=0.002)
+        npt.assert_array_equal(treatmentProbabilities([0.1, 0.9], cov, 0), [cov, cov])
+
+    def test_tables_shared_by_threads(self):
+        cap = trachoma.compliance.MAX_CACHED_TABLES
+        trachoma.compliance.MAX_CACHED_TABLES = 2
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                keys = [(0.5, 0.2), (0.6, 0.2), (0.7, 0.2), (0.8, 0.2)] * 10
+                tables = list(executor.map(lambda key: complianceTable(*key), keys))
+        finally:
+            trachoma.compliance.MAX_CACHED_TABLES = cap
+        for key, table in zip(keys, tables):
+            npt.assert_array_equal(table[0], complianceTable(*key)[0])
+
+    def test_coverage_change_keeps_order(self):
+        vals = {'IndI': np.zeros(1000), 'compliance_quantile': np.random.RandomState(1).uniform(size=1000)}
+        editTreatProbability(vals, 0.6, 0.3)
+        order = np.argsort(vals['treatProbability'], kind='stable')
+        editTreatProbability(vals, 0.9, 0.2)
+        npt.assert_array_equal(np.argsort(vals['treatProbability'], kind='stable'), order)
+        npt.assert_array_equal(order, np.argsort(vals['compliance_quantile'], kind='stable'))
+
+    def test_default_mode_unchanged(self):
+        vals = {'IndI': np.zeros(500), 'treatProbability': np.random.RandomState(2).uniform(size=500)}
+        expected = vals['treatProbability'].copy()
+        new = np.sort(drawTreatmentProbabilities(500, 0.6, 0.3, np.random.RandomState(3)))
+        for rank, person_index in enumerate(np.argsort(vals['treatProbability'])):
+            expected[person_index] = new[rank]
+        editTreatProbability(vals, 0.6, 0.3, np.random.RandomState(3))
+        npt.assert_array_equal(vals['treatProbability'], expected)
+
+    def test_simulation_in_quantile_mode(self):
+        params = make_params(500, rho=0.3, complianceQuantiles=True)
+        vals, _ = run_single_simulation(pickleData=make_population(500, 'high', params=params), params=params,
+                                        timesim=2 * 52, burnin=0, demog=DEMOG, beta=0.2,
+                                        MDA_times=np.array([30, 80]),
+                                        MDAData=[[2020.0, 0, 100, 0.8, 0, 2], [2021.0, 0, 100, 0.6, 0, 2]],
+                                        vacc_times=np.array([60]), VaccData=[[2021.0, 0, 10, 0.5, 0, 1]],
+                                        outputTimes=np.array([51, 103]), doSurvey=False, doIHMEOutput=False,
+                                        index=0, numpy_state=seed_to_state(1))
+        u = vals['compliance_quantile']
+        self.assertTrue(np.all((u >= 0) & (u <= 1)))
+        npt.assert_array_equal(vals['treatProbability'], treatmentProbabilities(u, 0.6, 0.3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+import trachoma.coverage
+from trachoma.coverage import InterventionSchedule, loadInterventionSchedule
+
+
+class TestInterventionSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'coverage.csv')
+        shutil.copy(DEFAULT_DATA_PATH / 'test_coverage_data.csv', self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_schedule_matches_platform_data(self):
+        schedule = loadInterventionSchedule(self.path)
+        MDAData = readPlatformData('coverage.csv', 'MDA', data_path=self.directory)
+        self.assertEqual(len(MDAData), 8)
+        self.assertEqual(schedule.platformData('MDA'), MDAData)
+        npt.assert_array_equal(schedule.coverage[schedule.select('MDA')], [row[3] for row in MDAData])
+        self.assertEqual(schedule.dates('MDA'), getInterventionDates(MDAData))
+        npt.assert_array_equal(schedule.weeks('MDA', date(2019, 1, 1), 26),
+                               [26 + int((d - date(2019, 1, 1)).days / 7) for d in getInterventionDates(MDAData)])
+
+    def test_missing_platform_is_padded(self):
+        schedule = loadInterventionSchedule(self.path)
+        self.assertEqual(schedule.platformData('Nothing'), [[3026.0, 2, 5, 0.6, 0, 2], [3026.0, 2, 5, 0.6, 0, 2]])
+        self.assertEqual(schedule.ageRanges('Nothing').shape, (0, 2))
+
+    def test_cached_until_modified(self):
+        schedule = loadInterventionSchedule(self.path)
+        self.assertIs(loadInterventionSchedule(self.path), schedule)
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(lines[:2]) + '\n')
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        changed = loadInterventionSchedule(self.path)
+        self.assertIsNot(changed, schedule)
+        self.assertLess(len(changed.select('MDA')), len(schedule.select('MDA')))
+
+    def test_shared_by_threads(self):
+        paths = [self.path]
+        for i in range(3):
+            paths.append(os.path.join(self.directory, f'coverage{i}.csv'))
+            shutil.copy(self.path, paths[-1])
+        cap = trachoma.coverage.MAX_CACHED_SCHEDULES
+        trachoma.coverage.MAX_CACHED_SCHEDULES = 2
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                schedules = list(executor.map(loadInterventionSchedule, paths * 20))
+        finally:
+            trachoma.coverage.MAX_CACHED_SCHEDULES = cap
+        for schedule in schedules:
+            self.assertEqual(schedule.platformData('MDA'), schedules[0].platformData('MDA'))
+
+    def test_pickle(self):
+        schedule = loadInterventionSchedule(self.path)
+        copy = pickle.loads(pickle.dumps(schedule))
+        self.assertEqual(copy.platformData('MDA'), schedule.platformData('MDA'))
+        npt.assert_array_equal(copy.ageRanges('MDA'), schedule.ageRanges('MDA'))
+        self.assertLess(len(pickle.dumps(schedule)), 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
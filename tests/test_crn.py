@@ -0,0 +1,93 @@
+import pickle
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+from trachoma.crn import CommonRandomNumbers, contrastReport, personUniforms, streamFor
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestCommonRandomNumbers(unittest.TestCase):
+
+    def test_streams_are_keyed_by_draw_process_and_week(self):
+        rng = CommonRandomNumbers(7, draw=3)
+        rng.setWeek(10)
+        infection = rng.stream('infection').uniform(size=5)
+        self.assertIs(rng.stream('infection'), rng.stream('infection'))
+        other = CommonRandomNumbers(7, draw=3)
+        other.setWeek(10)
+        # the stream doesn't depend on what was drawn from the other streams
+        other.stream('MDA').uniform(size=100)
+        npt.assert_array_equal(other.stream('infection').uniform(size=5), infection)
+        other.setWeek(11)
+        self.assertFalse(np.array_equal(other.stream('infection').uniform(size=5), infection))
+        different = CommonRandomNumbers(7, draw=4)
+        different.setWeek(10)
+        self.assertFalse(np.array_equal(different.stream('infection').uniform(size=5), infection))
+
+    def test_person_uniforms_do_not_depend_on_who_is_drawn(self):
+        rng = CommonRandomNumbers(1)
+        everyone = personUniforms(rng, 'infection', np.arange(50), 50)
+        rng = CommonRandomNumbers(1)
+        npt.assert_array_equal(personUniforms(rng, 'infection', np.array([3, 40]), 50), everyone[[3, 40]])
+
+    def test_pickled_with_streams(self):
+        rng = CommonRandomNumbers(7, draw=3)
+        rng.setWeek(10)
+        rng.uniform(size=3)
+        rng.stream('infection').uniform(size=3)
+        copy = pickle.loads(pickle.dumps(rng))
+        self.assertIsInstance(copy, CommonRandomNumbers)
+        self.assertEqual((copy.crn_seed, copy.draw, copy.week), (7, 3, 10))
+        npt.assert_array_equal(copy.uniform(size=5), rng.uniform(size=5))
+        npt.assert_array_equal(copy.stream('infection').uniform(size=5), rng.stream('infection').uniform(size=5))
+        # seeding it as a RandomState still works
+        copy.seed(5)
+        npt.assert_array_equal(copy.uniform(size=5), np.random.RandomState(5).uniform(size=5))
+
+    def test_random_state_is_used_for_every_process(self):
+        rng = np.random.RandomState(0)
+        self.assertIs(streamFor(rng, 'survey'), rng)
+        self.assertEqual(len(personUniforms(rng, 'infection', np.array([3, 40]), 50)), 2)
+
+    def test_contrast_report(self):
+        a = np.array([0.1, 0.3, 0.2, 0.4])
+        report = contrastReport(a, a + [0.05, 0.06, 0.05, 0.04])
+        self.assertAlmostEqual(report['difference'], 0.05)
+        self.assertAlmostEqual(report['se'], np.std([0.05, 0.06, 0.05, 0.04], ddof=1) / 2)
+        self.assertAlmostEqual(report['se_independent'], np.sqrt(2 * np.var(a, ddof=1) / 4), places=2)
+        self.assertGreater(report['variance_reduction'], 100)
+        with self.assertRaises(ValueError):
+            contrastReport(a, a[:3])
+
+
+class TestSimulationWithCommonRandomNumbers(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(400, importation_rate=0.001, importation_reduction_rate=0.9)
+        self.kwargs = dict(pickleData=make_population(400, 'high', seed=2, params=self.params), params=self.params,
+                           timesim=2 * 52, burnin=0, demog=DEMOG, beta=0.2, MDAData=[[2020.0, 0, 100, 0.0, 0, 1]],
+                           vacc_times=np.array([10 ** 6]), VaccData=[[2021.0, 0, 10, 0.5, 0, 1]],
+                           outputTimes=np.array([103]), doSurvey=False, doIHMEOutput=False, index=0,
+                           numpy_state=tf.seed_to_state(5))
+
+    def run_scenarios(self, **kwargs):
+        # an MDA with no coverage changes nothing but the random numbers drawn
+        withMDA, _ = tf.run_single_simulation(MDA_times=np.array([30]), rng=np.random.RandomState(),
+                                              **self.kwargs, **kwargs)
+        withoutMDA, _ = tf.run_single_simulation(MDA_times=np.array([10 ** 6]), rng=np.random.RandomState(),
+                                                 **self.kwargs, **kwargs)
+        return withMDA, withoutMDA
+
+    def test_scenarios_share_random_numbers(self):
+        withMDA, withoutMDA = self.run_scenarios(crn_seed=11)
+        for key in ['IndI', 'IndD', 'No_Inf', 'Age', 'True_Prev_Disease_children_1_9']:
+            npt.assert_array_equal(withMDA[key], withoutMDA[key])
+        withMDA, withoutMDA = self.run_scenarios()
+        self.assertFalse(np.array_equal(withMDA['No_Inf'], withoutMDA['No_Inf']))
+
+
+if __name__ == '__main__':
+    unittest.main()
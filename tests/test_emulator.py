@@ -0,0 +1,118 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
+
+from trachoma.emulator import FEATURES, Emulator, main, trainingRow
+from trachoma.reduction import DrawSummary
+
+
+def make_runs(n, seed):
+    '''
+    Training table of a smooth made-up model: prevalence falling with the MDA coverage and
+    number of rounds from a baseline increasing with beta.
+    '''
+    rng = np.random.RandomState(seed)
+    runs = pd.DataFrame({feature: np.zeros(n) for feature in FEATURES})
+    runs['beta'] = rng.uniform(0.05, 0.3, n)
+    runs['mda_coverage'] = rng.uniform(0.5, 0.9, n)
+    runs['mda_rounds'] = rng.randint(1, 6, n)
+    for year in range(4):
+        runs['prevalence_' + str(year)] = (0.4 * runs['beta'] / 0.3 *
+                                           np.exp(-year * runs['mda_coverage'] * runs['mda_rounds'] / 5))
+    runs['elimination_probability'] = 1 / (1 + np.exp(20 * (runs['prevalence_3'] - 0.05)))
+    return runs
+
+
+class TestEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.runs = make_runs(120, 0)
+        self.cells = make_runs(30, 1)
+        self.emulator = Emulator().add(self.runs)
+
+    def test_predicts_new_cells(self):
+        self.assertEqual(self.emulator.targets, ['prevalence_0', 'prevalence_1', 'prevalence_2', 'prevalence_3',
+                                                 'elimination_probability'])
+        mean, sd = self.emulator.predict(self.cells)
+        npt.assert_allclose(mean, self.cells[self.emulator.targets], atol=0.02)
+        self.assertTrue(np.all(sd.to_numpy() < 0.02))
+
+    def test_flags_cells_far_from_runs(self):
+        cells = self.cells.copy()
+        cells.loc[:9, 'beta'] = 0.8
+        screened = self.emulator.screen(cells, max_sd=0.02)
+        npt.assert_array_equal(screened['simulate'], np.arange(30) < 10)
+        self.assertIn('elimination_probability_sd', screened.columns)
+        self.assertTrue(screened['elimination_probability'].between(0, 1).all())
+
+    def test_incremental_training(self):
+        emulator = Emulator().add(self.runs[:60])
+        emulator.add(self.runs[60:], optimise=False)
+        # runs already added are replaced rather than duplicated
+        emulator.add(self.runs[:10], optimise=False)
+        self.assertEqual(len(emulator.X), 120)
+        whole = Emulator().add(self.runs[:60])
+        whole.add(self.runs, optimise=False)
+        npt.assert_allclose(emulator.predict(self.cells)[0], whole.predict(self.cells)[0])
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model = os.path.join(directory, 'emulator.npz')
+            for name, runs in [('a.csv', self.runs[:60]), ('b.csv', self.runs[60:]), ('cells.csv', self.cells)]:
+                runs.to_csv(os.path.join(directory, name), index=False)
+            main(['train', model, os.path.join(directory, 'a.csv')])
+            main(['train', model, os.path.join(directory, 'b.csv')])
+            self.assertEqual(len(Emulator.load(model).X), 120)
+            output = os.path.join(directory, 'screened.csv')
+            main(['screen', model, os.path.join(directory, 'cells.csv'), '-o', output, '--max-sd', '0.02'])
+            screened = pd.read_csv(output)
+            self.assertEqual(len(screened), 30)
+            self.assertFalse(screened['simulate'].any())
+
+    def test_model_path_without_extension(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model = os.path.join(directory, 'emulator')
+            for name, runs in [('a.csv', self.runs[:60]), ('b.csv', self.runs[60:])]:
+                runs.to_csv(os.path.join(directory, name), index=False)
+                main(['train', model, os.path.join(directory, name), '--no-optimise'])
+            self.assertEqual(os.listdir(directory).count('emulator.npz'), 1)
+            self.assertEqual(len(Emulator.load(model).X), 120)
+
+    def test_unreadable_model_is_not_replaced(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model = os.path.join(directory, 'emulator.npz')
+            with open(model, 'w') as f:
+                f.write('not an emulator')
+            self.runs.to_csv(os.path.join(directory, 'a.csv'), index=False)
+            with self.assertRaises(ValueError):
+                main(['train', model, os.path.join(directory, 'a.csv')])
+            with open(model) as f:
+                self.assertEqual(f.read(), 'not an emulator')
+
+    def test_help_shows_usage(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), self.assertRaises(SystemExit):
+            main(['--help'])
+        self.assertIn('python -m trachoma.emulator screen', stdout.getvalue())
+
+    def test_training_row_from_summaries(self):
+        # elimination is read from the draws' indicators, so the second draw, whose prevalence of disease
+        # in the last year is 0, hasn't eliminated the infection
+        summaries = [DrawSummary(n_years=3, NTDMC=np.array([0.2, 0.1, 0.02]), elimination=np.array([0, 0, 1])),
+                     DrawSummary(n_years=3, NTDMC=np.array([0.3, 0.1, 0.0]), elimination=np.array([0, 1, 0]))]
+        row = trainingRow({'beta': 0.2}, summaries)
+        self.assertEqual(row['beta'], 0.2)
+        npt.assert_allclose([row['prevalence_0'], row['prevalence_1'], row['prevalence_2']], [0.25, 0.1, 0.01])
+        self.assertEqual(row['elimination_probability'], 0.5)
+        with self.assertRaises(ValueError):
+            trainingRow({'beta': 0.2}, [DrawSummary(n_years=3, NTDMC=np.zeros(3))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from datetime import date
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+from trachoma.meanfield import (ID, LATENT, MeanFieldModel, expectedPeriods, initialState, mdaMeanField,
+                                meanFieldGap, populationState, run_meanfield, stepMeanField, vaccinateMeanField)
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestMeanFieldModel(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(1000)
+        self.model = MeanFieldModel(self.params, DEMOG)
+
+    def test_expected_periods_match_simulation_functions(self):
+        periodID, periodD = expectedPeriods(self.params, maxInfections=5)
+        rng = np.random.RandomState(0)
+        n = 200000
+        for infections in (1, 3):
+            vals = {'Ind_ID_period_base': rng.poisson(self.params['av_ID_duration'], n),
+                    'No_Inf': np.full(n, infections), 'vaccinated': np.zeros(n, dtype=bool)}
+            self.assertAlmostEqual(periodID[0, infections], np.mean(tf.ID_period_function(np.arange(n), self.params,
+                                                                                          vals)), delta=0.05)
+            bases = rng.poisson(self.params['av_D_duration'], n)
+            self.assertAlmostEqual(periodD[infections], np.mean(tf.D_period_function(bases, np.full(n, infections),
+                                                                                     self.params, None)), delta=0.05)
+        # vaccination halves the ID period
+        self.assertLess(periodID[1, 1], 0.6 * periodID[0, 1])
+
+    def test_population_state_matches_population(self):
+        np.random.seed(2)
+        vals = make_population(1000, 'high', vaccinated_fraction=0.3, params=self.params)
+        state = populationState(vals, self.model)
+        self.assertAlmostEqual(state.X.sum(), 1)
+        self.assertAlmostEqual(state.infected(self.model).sum(), np.mean(vals['IndI']))
+        self.assertAlmostEqual(state.diseased(self.model).sum(), np.mean(vals['IndD']))
+        self.assertAlmostEqual(state.X[:, 1].sum(), np.mean(vals['vaccinated']))
+        self.assertEqual(len(state.vaccinationWeeks), 2)
+
+    def test_step_keeps_population(self):
+        state = initialState(self.model)
+        for week in range(200):
+            stepMeanField(state, self.model, 0.2, 0.001)
+        self.assertAlmostEqual(state.X.sum(), 1)
+        self.assertTrue(np.all(state.X >= 0))
+        self.assertEqual(state.week, 200)
+        self.assertGreater(state.infected(self.model).sum(), 0.05)
+
+    def test_mda_cures_efficacy_of_those_treated(self):
+        np.random.seed(3)
+        state = populationState(make_population(1000, 'high', params=self.params), self.model)
+        before = state.infected(self.model)
+        mdaMeanField(state, self.model, 0, 100, 0.8)
+        after = state.infected(self.model)
+        # babies are cured at half the efficacy
+        babies = self.model.ageLower + self.model.ageWidth <= 27
+        npt.assert_allclose(after[babies], before[babies] * (1 - 0.8 * 0.85 * 0.5))
+        older = self.model.ageLower > 26
+        npt.assert_allclose(after[older], before[older] * (1 - 0.8 * 0.85))
+        self.assertAlmostEqual(state.X.sum(), 1)
+
+    def test_vaccination_strata(self):
+        state = initialState(self.model)
+        vaccinateMeanField(state, self.model, 0, 10, 0.5)
+        # half of each age class under 10 is vaccinated
+        vaccinated = state.X[:, 1].sum(axis=(0, 2))
+        unvaccinated = state.X[:, 0].sum(axis=(0, 2))
+        npt.assert_allclose(vaccinated, unvaccinated * np.where(self.model.ageLower < 520, 1, 0))
+        npt.assert_allclose(self.model.protection(state), [0, self.params['vacc_prob_block_transmission']])
+        # once the protection has waned, the strata of earlier rounds are merged
+        state.week += self.params['vacc_waning_length']
+        vaccinateMeanField(state, self.model, 0, 10, 0.5)
+        state.week += self.params['vacc_waning_length']
+        vaccinateMeanField(state, self.model, 0, 10, 0.5)
+        self.assertEqual(len(state.vaccinationWeeks), 3)
+        npt.assert_allclose(self.model.protection(state), [0, 0, self.params['vacc_prob_block_transmission']])
+        self.assertAlmostEqual(state.X.sum(), 1)
+
+
+class TestMeanFieldAgreement(unittest.TestCase):
+
+    def test_agrees_with_stochastic_mean_at_high_N(self):
+        N, timesim = 4000, 780
+        params = make_params(N)
+        MDAData = [[2020.0, 0, 100, 0.8, 0, 1]]
+        schedule = dict(MDA_times=np.array([10 ** 6]), MDAData=MDAData, vacc_times=np.array([10 ** 6]),
+                        VaccData=[[2021.0, 0, 10, 0.5, 0, 1]])
+        trajectory = run_meanfield(None, params, timesim, 0, DEMOG, 0.2, **schedule)
+
+        numpy_state = tf.seed_to_state(0)
+        vals = tf.Seed_infection(params, tf.Set_inits(params, DEMOG, {'N_MDA': 0}, MDAData, numpy_state))
+        rng = np.random.RandomState(0)
+        vals, simParams, simDemog = tf.prepareSimulation(vals, params, DEMOG, MDAData, numpy_state, rng)
+        vals, results = tf.sim_Ind_MDA_Include_Survey(simParams, vals, timesim, 0, simDemog, 0.2,
+                                                      outputTimes=np.array([timesim + 10]), doSurvey=False,
+                                                      doIHMEOutput=False, numpy_state=numpy_state, rng=rng,
+                                                      **schedule)
+        # averaged over the last five years, once the prevalence has reached equilibrium
+        prevalence = np.mean(vals['True_Prev_Disease_children_1_9'][520:])
+        infections = np.mean(vals['True_Infections_Disease_children_1_9'][520:])
+        self.assertAlmostEqual(np.mean(trajectory.prevalence[520:]), prevalence, delta=0.04)
+        self.assertAlmostEqual(np.mean(trajectory.infections[520:]), infections, delta=0.02)
+
+        ntdmc = tf.collateNTDMC([tf.getDrawNTDMC(vals, 0)], date(2019, 1, 1))
+        gap = meanFieldGap(trajectory, ntdmc, 0)
+        self.assertEqual(list(gap.columns), ['Time', 'stochastic', 'meanfield', 'difference'])
+        npt.assert_allclose(gap['meanfield'], trajectory.prevalence[::52])
+        npt.assert_allclose(gap['difference'], gap['stochastic'] - gap['meanfield'])
+
+
+if __name__ == '__main__':
+    unittest.main()
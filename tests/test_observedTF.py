@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from generate_test_data import DEMOG, make_params, make_simulation_results
+
+
+class TestObservedTF(unittest.TestCase):
+
+    def setUp(self):
+        self.max_age = DEMOG['max_age'] // 52
+        self.outputYear = [2020, 2021, 2022]
+
+    def test_perfect_test_matches_individual_sampling(self):
+        # with a perfect test both samplers count exactly the diseased people in each bin
+        params = make_params(2000, TestSensitivity=1, TestSpecificity=1)
+        results = make_simulation_results(2000, 'high', n_draws=2, n_years=3)
+        individual = getResultsIHME(results, DEMOG, params, self.outputYear)
+        aggregated = getResultsIHME(results, DEMOG, params, self.outputYear, aggregateObservedTF=True)
+        self.assertTrue(individual.equals(aggregated))
+
+    def test_same_distribution_as_individual_sampling(self):
+        params = make_params(2000)
+        vals, _ = make_simulation_results(2000, 'high', n_draws=1, n_years=1)[0]
+        Age, IndD = vals['Age'], vals['IndD']
+        nums, edges = np.histogram(Age, bins=self.max_age)
+        diseased, _ = np.histogram(Age, bins=edges, weights=IndD)
+        expected = diseased * params['TestSensitivity'] + (nums - diseased) * (1 - params['TestSpecificity'])
+
+        np.random.seed(0)
+        n_reps = 2000
+        samples = np.array([sampleObservedTF(Age, IndD, self.max_age, params) for _ in range(n_reps)])
+        self.assertEqual(samples.shape, (n_reps, self.max_age))
+        self.assertTrue(np.all(samples <= nums))
+        # variance of a sum of two binomials
+        var = (diseased * params['TestSensitivity'] * (1 - params['TestSensitivity']) +
+               (nums - diseased) * params['TestSpecificity'] * (1 - params['TestSpecificity']))
+        tolerance = 5 * np.sqrt(var / n_reps) + 1e-9
+        npt.assert_array_less(np.abs(samples.mean(axis=0) - expected), tolerance)
+
+    def test_observed_proportions(self):
+        params = make_params(500)
+        results = make_simulation_results(500, 'low', n_draws=2, n_years=3)
+        np.random.seed(1)
+        df = getResultsIHME(results, DEMOG, params, self.outputYear, aggregateObservedTF=True)
+        observed = df[df.measure == "ObservedTF"]
+        self.assertEqual(len(observed), len(self.outputYear) * self.max_age)
+        for draw in ['draw_0', 'draw_1']:
+            self.assertTrue(np.all((observed[draw] >= 0) & (observed[draw] <= 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import pickle
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.parameters import ModelParams, Demography, derived
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestModelParams(unittest.TestCase):
+
+    def setUp(self):
+        self.params_dict = make_params(500)
+        self.params = ModelParams.from_dict(self.params_dict)
+        self.demog = Demography.from_dict(DEMOG)
+
+    def test_behaves_like_dict(self):
+        self.assertEqual(dict(self.params), self.params_dict)
+        self.assertEqual(self.params['MDA_Cov'], 0.8)
+        self.assertEqual(self.params.get('missing', 3), 3)
+        with self.assertRaises(KeyError):
+            self.params['missing']
+        self.assertEqual(self.params.replace(N=20)['N'], 20)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.params.N = 10
+        with self.assertRaises(ValueError):
+            self.demog.import_ages[0] = 3
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            ModelParams.from_dict(make_params(0))
+        with self.assertRaises(ValueError):
+            ModelParams.from_dict(make_params(500, epsilon=1.5))
+        with self.assertRaises(ValueError):
+            ModelParams.from_dict({key: value for key, value in self.params_dict.items() if key != 'min_ID'})
+        with self.assertRaises(ValueError):
+            Demography.from_dict(dict(DEMOG, max_age=0))
+
+    def test_derived_constants_match_dict(self):
+        for name in ['inv_min_ID', 'inv_min_D', 'phi_plus_1', 'young_child_max_age', 'older_child_max_age']:
+            self.assertEqual(derived(self.params, name), derived(self.params_dict, name))
+        self.assertEqual(self.demog.death_probability, 1 - np.exp(- DEMOG['tau']))
+        npt.assert_array_equal(self.demog.import_age_probabilities, derived(DEMOG, 'import_age_probabilities'))
+
+    def test_pickle(self):
+        params = pickle.loads(pickle.dumps(self.params))
+        self.assertEqual(dict(params), self.params_dict)
+        self.assertEqual(params.inv_min_ID, self.params.inv_min_ID)
+        demog = pickle.loads(pickle.dumps(self.demog))
+        npt.assert_array_equal(demog.import_ages, self.demog.import_ages)
+
+    def test_bacterial_load_uses_params(self):
+        vals = make_population(500, 'high', params=self.params_dict)
+        load = bacterialLoad(self.params, vals)
+        doubled = bacterialLoad(self.params.replace(b1=2), vals)
+        npt.assert_array_almost_equal(doubled, 2 * load)
+
+    def test_step_matches_dict(self):
+        vals = make_population(500, 'high', seed=1, params=self.params_dict)
+        expected = stepF_fixed(copy.deepcopy(vals), self.params_dict, DEMOG, 0.2, rng=np.random.RandomState(4))
+        compiled = stepF_fixed(copy.deepcopy(vals), self.params, self.demog, 0.2, rng=np.random.RandomState(4))
+        for key in ['IndI', 'IndD', 'T_ID', 'T_D', 'Age', 'bact_load']:
+            npt.assert_array_equal(compiled[key], expected[key])
+
+    def test_simulation_does_not_change_importation_rate(self):
+        params = make_params(300, importation_rate=0.01, importation_reduction_rate=0.5)
+        run_single_simulation(pickleData=make_population(300, 'high', params=params), params=params,
+                              timesim=2 * 52, burnin=0, demog=DEMOG, beta=0.2, MDA_times=np.array([30]),
+                              MDAData=[[2020.0, 0, 100, 0.8, 0, 1]], vacc_times=np.array([60]),
+                              VaccData=[[2021.0, 0, 10, 0.5, 0, 1]], outputTimes=np.array([51, 103]),
+                              doSurvey=False, doIHMEOutput=False, index=0, numpy_state=seed_to_state(1))
+        self.assertEqual(params['importation_rate'], 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
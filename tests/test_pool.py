@@ -0,0 +1,68 @@
+import os
+import pickle
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.pool import SimulationPool
+from trachoma.runner import run_simulations
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestSimulationPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SimulationPool(n_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def setUp(self):
+        self.params = make_params(300)
+        populations = [make_population(300, 'high', seed=s, params=self.params) for s in range(3)]
+        self.static = dict(pickleData=populations, params=self.params, timesim=2 * 52, burnin=0, demog=DEMOG,
+                           MDA_times=np.array([30]), MDAData=[[2020.0, 0, 100, 0.8, 0, 1]],
+                           vacc_times=np.array([200]), VaccData=[[3026.0, 2, 5, 0.0, 0, 1]],
+                           outputTimes=np.array([51, 103]), doSurvey=False, doIHMEOutput=True)
+        self.betas = [0.2, 0.25, 0.3]
+
+    def test_same_results_as_run_simulations(self):
+        expected = run_simulations(betas=self.betas, numpy_states=[seed_to_state(s) for s in range(3)], n_jobs=1,
+                                   **self.static)
+        with self.pool.context(**self.static) as context:
+            results = self.pool.run(context, self.betas, seeds=range(3))
+            # a second scenario run with the same workers
+            again = self.pool.run(context, self.betas[::-1], seeds=[2, 1, 0], indices=[2, 1, 0])
+        for (vals, snapshots), (expected_vals, expected_snapshots) in zip(results, expected):
+            npt.assert_array_equal(vals['IndI'], expected_vals['IndI'])
+            npt.assert_array_equal(vals['True_Prev_Disease_children_1_9'],
+                                   expected_vals['True_Prev_Disease_children_1_9'])
+            self.assertEqual(len(snapshots), len(expected_snapshots))
+        npt.assert_array_equal(again[0][0]['IndD'], results[2][0]['IndD'])
+
+    def test_closed_context_file_is_removed(self):
+        context = self.pool.context(**self.static)
+        path = context.path
+        self.assertTrue(os.path.exists(path))
+        context.close()
+        self.assertFalse(os.path.exists(path))
+        with self.assertRaises(ValueError):
+            self.pool.run(context, self.betas, seeds=range(3))
+
+    def test_workers_use_one_thread(self):
+        self.assertEqual(self.pool.executor.submit(os.getenv, 'OMP_NUM_THREADS').result(), '1')
+
+    def test_parallel_while_pool_open(self):
+        # the pool's executor is its own, so run_simulations can use joblib's alongside it
+        with self.pool.context(**self.static) as context:
+            pooled = self.pool.run(context, self.betas[:2], seeds=range(2))
+            parallel = run_simulations(betas=self.betas[:2], numpy_states=[seed_to_state(s) for s in range(2)],
+                                       n_jobs=2, **self.static)
+            again = self.pool.run(context, self.betas[:2], seeds=range(2))
+        for (vals, _), (expected_vals, _), (vals_again, _) in zip(pooled, parallel, again):
+            npt.assert_array_equal(vals['IndD'], expected_vals['IndD'])
+            npt.assert_array_equal(vals_again['IndD'], expected_vals['IndD'])
@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.profiling import PHASES, PhaseProfiler, merge_reports, format_report
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestPhaseProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(500)
+        self.timesim = 3 * 52
+        self.MDAData = [[2020.0, 0, 100, 0.8, 0, 2], [2020.0, 1, 10, 0.8, 1, 2]]
+        self.MDA_times = np.array([60, 60])
+        self.VaccData = [[2021.0, 0, 10, 0.5, 0, 1]]
+        self.vacc_times = np.array([80])
+        self.outputTimes = np.array([52, 104, 155])
+        self.population = make_population(500, 'high', seed=3, params=self.params)
+
+    def run_simulation(self, profile):
+        return run_single_simulation(pickleData=self.population, params=self.params, timesim=self.timesim, burnin=0,
+                                     demog=DEMOG, beta=0.2, MDA_times=self.MDA_times, MDAData=self.MDAData,
+                                     vacc_times=self.vacc_times, VaccData=self.VaccData, outputTimes=self.outputTimes,
+                                     doSurvey=True, doIHMEOutput=True, index=0, numpy_state=seed_to_state(1),
+                                     profile=profile)
+
+    def test_profile_counts_each_phase(self):
+        vals, _ = self.run_simulation(profile=True)
+        report = vals['phase_profile']
+        self.assertEqual(set(report['phases'].keys()), set(PHASES))
+        self.assertEqual(report['phases']['infection']['calls'], self.timesim)
+        self.assertEqual(report['phases']['transitions']['calls'], self.timesim)
+        self.assertEqual(report['phases']['metrics']['calls'], self.timesim)
+        # both MDAs are in the same week, and are done together
+        self.assertEqual(report['phases']['MDA']['calls'], 1)
+        self.assertEqual(report['phases']['snapshots']['calls'], len(self.outputTimes))
+        self.assertGreater(report['phases']['infection']['time'], 0)
+        self.assertGreater(report['wall_time'], 0)
+
+    def test_profiling_does_not_change_results(self):
+        vals_profiled, _ = self.run_simulation(profile=True)
+        vals, _ = self.run_simulation(profile=False)
+        self.assertNotIn('phase_profile', vals)
+        npt.assert_array_equal(vals['IndI'], vals_profiled['IndI'])
+        npt.assert_array_equal(vals['True_Prev_Disease_children_1_9'], vals_profiled['True_Prev_Disease_children_1_9'])
+
+    def test_merge_reports(self):
+        results = [self.run_simulation(profile=True) for _ in range(2)]
+        merged = collatePhaseProfiles(results)
+        self.assertEqual(merged['draws'], 2)
+        self.assertEqual(merged['phases']['infection']['calls'], 2 * self.timesim)
+        reports = [res[0]['phase_profile'] for res in results]
+        self.assertEqual(merged['phases']['MDA']['peak_memory'],
+                         max(r['phases']['MDA']['peak_memory'] for r in reports))
+        self.assertEqual(merge_reports([None])['draws'], 0)
+        self.assertIn('infection', format_report(merged))
+
+    def test_phase_without_memory_tracing(self):
+        profiler = PhaseProfiler(trace_memory=False)
+        profiler.start()
+        with profiler.phase('MDA'):
+            pass
+        profiler.stop()
+        report = profiler.report()
+        self.assertEqual(report['phases']['MDA']['calls'], 1)
+        self.assertEqual(report['phases']['MDA']['peak_memory'], 0)
+
+    def test_one_profiler_traces_memory_at_a_time(self):
+        first, second = PhaseProfiler(), PhaseProfiler()
+        first.start()
+        try:
+            with self.assertRaises(RuntimeError):
+                second.start()
+            # timings can still be recorded
+            PhaseProfiler(trace_memory=False).start()
+        finally:
+            first.stop()
+        second.start()
+        second.stop()
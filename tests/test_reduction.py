@@ -0,0 +1,71 @@
+import pickle
+import unittest
+from datetime import date
+
+import numpy as np
+import numpy.testing as npt
+
+from trachoma.trachoma_functions import *
+from trachoma.reduction import OutputSpec, DrawSummary, mergeIHME, mergeIPM, mergeNTDMC
+from trachoma.runner import run_simulations
+from generate_test_data import DEMOG, make_params, make_population, make_simulation_results
+
+
+class TestWorkerReduction(unittest.TestCase):
+
+    def setUp(self):
+        # a perfect test so that ObservedTF doesn't depend on where it is sampled
+        self.params = make_params(500, TestSensitivity=1, TestSpecificity=1)
+        self.burnin = 26
+        self.timesim = 3 * 52 + self.burnin
+        self.MDAData = [[2020.0, 0, 100, 0.8, 0, 2], [2020.0, 1, 10, 0.8, 1, 2]]
+        self.VaccData = [[2021.0, 0, 10, 0.5, 0, 1]]
+        self.outputYear = [2019, 2020, 2021]
+        self.Start_date = date(2019, 1, 1)
+        self.sim_params = {'burnin': self.burnin, 'N_MDA': 2}
+        self.spec = OutputSpec(outputYear=self.outputYear, burnin=self.burnin,
+                               MDAAgeRanges=np.array([[0, 100], [1, 10]], dtype=object),
+                               VaccAgeRanges=np.array([[0, 10]], dtype=object))
+        population = make_population(500, 'high', seed=3, params=self.params)
+        self.kwargs = dict(pickleData=population, params=self.params, timesim=self.timesim, burnin=self.burnin,
+                           demog=DEMOG, betas=[0.2, 0.25], MDA_times=np.array([86, 86]), MDAData=self.MDAData,
+                           vacc_times=np.array([112]), VaccData=self.VaccData,
+                           outputTimes=np.array([52, 104, 155]) + self.burnin, doSurvey=True, doIHMEOutput=True,
+                           numpy_states=[seed_to_state(1), seed_to_state(2)], n_jobs=2)
+
+    def test_merged_outputs_match_collated_outputs(self):
+        results = run_simulations(**self.kwargs)
+        summaries = run_simulations(summary=self.spec, **self.kwargs)
+        self.assertTrue(all(isinstance(summary, DrawSummary) for summary in summaries))
+
+        IHME = combineIHME_MDA_SurveyData(results, DEMOG, self.params, self.outputYear, self.Start_date,
+                                          self.sim_params)
+        self.assertTrue(IHME.equals(mergeIHME(summaries, DEMOG, self.spec, self.Start_date, self.sim_params)))
+        IPM = getResultsIPM(results, DEMOG, self.params, self.outputYear, self.spec.MDAAgeRanges,
+                            self.spec.VaccAgeRanges)
+        self.assertTrue(IPM.equals(mergeIPM(summaries, self.spec)))
+        NTDMC = getResultsNTDMC(results, self.Start_date, self.burnin)
+        self.assertTrue(NTDMC.equals(mergeNTDMC(summaries, self.Start_date)))
+
+    def test_summary_is_small(self):
+        results = run_simulations(**self.kwargs)
+        summaries = run_simulations(summary=self.spec, **self.kwargs)
+        full = len(pickle.dumps(results[0]))
+        reduced = len(pickle.dumps(summaries[0]))
+        self.assertLess(reduced * 5, full)
+        self.assertGreater(summaries[0].nbytes, 0)
+
+
+class TestCollation(unittest.TestCase):
+
+    def test_empty_age_groups_counted_as_zero_in_every_draw(self):
+        results = make_simulation_results(100, 'low', n_draws=3, n_years=2)
+        df = getResultsIHME(results, DEMOG, make_params(100), [2020, 2021])
+        number = df[df.measure == "number"]
+        for i, (vals, snapshots) in enumerate(results):
+            nums, _ = np.histogram(snapshots[0].Age, bins=DEMOG['max_age'] // 52)
+            npt.assert_array_equal(number['draw_' + str(i)].values[:len(nums)], nums)
+
+
+if __name__ == '__main__':
+    unittest.main()
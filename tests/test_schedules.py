@@ -0,0 +1,56 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.schedules
+from trachoma.schedules import constantSchedule, exponentialDecaySchedule, secularTrendSchedule, simulationSchedules
+from generate_test_data import make_params
+
+
+class TestSchedules(unittest.TestCase):
+
+    def test_exponential_decay_matches_running_product(self):
+        rate, expected = 0.003, []
+        for i in range(300):
+            if i % 52 == 0:
+                rate *= 0.83
+            expected.append(rate)
+        npt.assert_array_equal(exponentialDecaySchedule(0.003, 0.83, 300), expected)
+
+    def test_secular_trend_matches_loop(self):
+        timesim, burnin, bet, decrease = 52 * 6, 52, 0.2, 0.05
+        simbeta = bet * np.ones(timesim + 1)
+        for j in range(round(burnin / 52), round(len(simbeta) / 52)):
+            bet1 = simbeta[j * 52]
+            for i in range(52 + 1):
+                simbeta[(j * 52) + i] = bet1 - (decrease * bet1 * i / 52)
+        npt.assert_array_equal(secularTrendSchedule(bet, timesim + 1, burnin, decrease), simbeta)
+
+    def test_simulation_schedules_are_shared(self):
+        params = make_params(100, importation_rate=0.01, importation_reduction_rate=0.9)
+        schedules = simulationSchedules(params, 0.2, 520, 26)
+        self.assertIs(simulationSchedules(dict(params), 0.2, 520, 26), schedules)
+        self.assertEqual(len(schedules['beta']), 521)
+        self.assertEqual(len(schedules['importation_rate']), 520)
+        with self.assertRaises(ValueError):
+            schedules['beta'][0] = 1
+        npt.assert_array_equal(constantSchedule(0.2, 521), schedules['beta'])
+
+    def test_shared_by_threads(self):
+        params = make_params(100)
+        cap = trachoma.schedules.MAX_CACHED_SCHEDULES
+        trachoma.schedules.MAX_CACHED_SCHEDULES = 2
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                betas = [0.1, 0.2, 0.3, 0.4] * 50
+                schedules = list(executor.map(lambda bet: simulationSchedules(params, bet, 104, 52), betas))
+        finally:
+            trachoma.schedules.MAX_CACHED_SCHEDULES = cap
+        for bet, schedule in zip(betas, schedules):
+            npt.assert_array_equal(schedule['beta'], bet)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+from trachoma.splitting import infectedAfterSurveysPassed, run_splitting
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestSplitting(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(200, importation_rate=0.001, importation_reduction_rate=1)
+        self.population = make_population(200, 'high', seed=1, params=self.params)
+        self.MDAData = [[2020.0, 0, 100, 0.8, 0, 1]]
+        self.schedule = dict(MDA_times=np.array([10]), MDAData=self.MDAData, vacc_times=np.array([10 ** 6]),
+                             VaccData=[[2021.0, 0, 10, 0.5, 0, 1]])
+
+    def start(self, seed):
+        rng = np.random.RandomState(seed)
+        numpy_state = rng.get_state()
+        vals, params, demog = tf.prepareSimulation(self.population, self.params, DEMOG, self.MDAData, numpy_state, rng)
+        return tf.initSimulation(params, vals, 40, 0, demog, 0.2, outputTimes=np.array([39]), doSurvey=True,
+                                 doIHMEOutput=True, numpy_state=numpy_state, rng=rng, **self.schedule)
+
+    def test_advancing_in_parts_matches_whole_simulation(self):
+        sim = self.start(4)
+        tf.advanceSimulation(sim, 15)
+        fork = tf.forkSimulation(sim)
+        tf.advanceSimulation(sim, 40)
+        vals, results = tf.finaliseSimulation(sim)
+        rng = np.random.RandomState(4)
+        numpy_state = rng.get_state()
+        population, params, demog = tf.prepareSimulation(self.population, self.params, DEMOG, self.MDAData,
+                                                         numpy_state, rng)
+        whole, wholeResults = tf.sim_Ind_MDA_Include_Survey(params, population, 40, 0, demog, 0.2,
+                                                            outputTimes=np.array([39]), doSurvey=True,
+                                                            doIHMEOutput=True, numpy_state=numpy_state, rng=rng,
+                                                            **self.schedule)
+        # a fork with a copy of the random state continues in the same way
+        tf.advanceSimulation(fork, 40)
+        forked, forkedResults = tf.finaliseSimulation(fork)
+        for key in ['IndI', 'IndD', 'No_Inf', 'Age', 'True_Prev_Disease_children_1_9']:
+            npt.assert_array_equal(vals[key], whole[key])
+            npt.assert_array_equal(forked[key], whole[key])
+        npt.assert_array_equal(results[0].IndD, wholeResults[0].IndD)
+        npt.assert_array_equal(forkedResults[0].IndD, wholeResults[0].IndD)
+
+    def test_fork_is_independent(self):
+        sim = self.start(4)
+        tf.advanceSimulation(sim, 15)
+        before = sim['vals']['IndI'].copy()
+        fork = tf.forkSimulation(sim, np.random.RandomState(9))
+        tf.advanceSimulation(fork, 30)
+        npt.assert_array_equal(sim['vals']['IndI'], before)
+        self.assertEqual(sim['week'], 15)
+        self.assertEqual(len(sim['prevalence']), 15)
+
+    def test_certain_and_impossible_events(self):
+        kwargs = dict(pickleData=self.population, params=self.params, timesim=20, burnin=0, demog=DEMOG, beta=0.2,
+                      doSurvey=False, progress=lambda sim: sim['week'], n_trajectories=3, replicates=2,
+                      **self.schedule)
+        certain = run_splitting(levels=[5, 10], **kwargs)
+        self.assertEqual(certain.probability, 1)
+        self.assertEqual(certain.se, 0)
+        impossible = run_splitting(levels=[5, 25], **kwargs)
+        self.assertEqual(impossible.probability, 0)
+        npt.assert_array_equal(impossible.stage_probabilities, [1, 0])
+
+    def test_resurgence_progress(self):
+        sim = self.start(4)
+        self.assertEqual(infectedAfterSurveysPassed(sim), -1)
+        sim['surveyPass'] = 2
+        self.assertEqual(infectedAfterSurveysPassed(sim), np.count_nonzero(sim['vals']['IndI']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trachoma.trachoma_functions import *
+from trachoma.runner import run_simulations, write_output
+from trachoma.telemetry import NULL_TELEMETRY, Telemetry, make_telemetry, current_rss
+from generate_test_data import DEMOG, make_params, make_population
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.params = make_params(300)
+        self.timesim = 2 * 52 + 10
+        self.MDAData = [[2020.0, 0, 100, 0.8, 0, 1]]
+        self.VaccData = [[3026.0, 2, 5, 0.0, 0, 1]]
+        self.population = make_population(300, 'high', seed=3, params=self.params)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_draws(self, telemetry, n_jobs=1, n_draws=2):
+        return run_simulations(pickleData=self.population, params=self.params, timesim=self.timesim, burnin=0,
+                               demog=DEMOG, betas=[0.2] * n_draws, MDA_times=np.array([60]), MDAData=self.MDAData,
+                               vacc_times=np.array([self.timesim + 100]), VaccData=self.VaccData,
+                               outputTimes=np.array([52, 104]), doSurvey=False, doIHMEOutput=True,
+                               numpy_states=[seed_to_state(s) for s in range(n_draws)], n_jobs=n_jobs,
+                               telemetry=telemetry)
+
+    def test_callback_sink_receives_task_and_progress_events(self):
+        events = []
+        telemetry = Telemetry(events.append, min_interval=0, check_every=52)
+        results = self.run_draws(telemetry)
+        self.assertEqual(len(results), 2)
+        kinds = [e['event'] for e in events]
+        self.assertEqual(kinds.count('task_start'), 2)
+        self.assertEqual(kinds.count('task_end'), 2)
+        # progress is checked at weeks 52 and 104 of each draw
+        progress = [e for e in events if e['event'] == 'progress']
+        self.assertEqual([e['week'] for e in progress], [52, 104, 52, 104])
+        self.assertEqual(sorted({e['draw'] for e in progress}), [0, 1])
+        self.assertTrue(all(e['eta'] >= 0 for e in progress))
+        end = [e for e in events if e['event'] == 'task_end'][0]
+        self.assertEqual(end['weeks'], self.timesim)
+        self.assertGreater(end['weeks_per_second'], 0)
+        queue = [e for e in events if e['event'] == 'queue']
+        self.assertEqual(queue[0]['queue_depth'], 2)
+        self.assertEqual(queue[-1]['queue_depth'], 0)
+
+    def test_progress_is_throttled(self):
+        events = []
+        telemetry = Telemetry(events.append, min_interval=3600, check_every=1)
+        self.run_draws(telemetry, n_draws=1)
+        self.assertEqual([e for e in events if e['event'] == 'progress'], [])
+
+    def test_file_sink_with_worker_processes(self):
+        path = os.path.join(self.tmp.name, 'events.jsonl')
+        self.run_draws(path, n_jobs=2)
+        with open(path) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(sum(e['event'] == 'task_end' for e in events), 2)
+        self.assertEqual(sorted(e['draw'] for e in events if e['event'] == 'task_start'), [0, 1])
+
+    def test_logger_sink_and_write_output(self):
+        logger = logging.getLogger('trachoma-telemetry-test')
+        with self.assertLogs(logger, level='INFO') as logs:
+            path = os.path.join(self.tmp.name, 'out.csv')
+            write_output(pd.DataFrame({'a': range(10)}), path, telemetry=logger)
+        event = json.loads(logs.records[0].getMessage())
+        self.assertEqual(event['event'], 'write')
+        self.assertEqual(event['bytes'], os.path.getsize(path))
+
+    def test_no_telemetry(self):
+        self.assertIs(make_telemetry(None), NULL_TELEMETRY)
+        self.assertEqual(len(self.run_draws(None)), 2)
+        self.assertGreater(current_rss(), 0)
@@ -4,6 +4,7 @@ import copy
 import unittest
 import numpy.testing as npt
 from trachoma.trachoma_functions import *
+from trachoma.cohorts import CohortIndex
 
 class TestMDAFunctionality(unittest.TestCase):
     # start by defining parameters for the run
@@ -253,6 +254,36 @@ class TestMDAFunctionality(unittest.TestCase):
         npt.assert_allclose(np.mean(propCuredBabies), expectedProportionCuredBabies, atol=5e-03, err_msg="The values are not close enough for babies")
 
 
+    # doing the MDAs of a week together has to give the same results as doing them one after the other,
+    # including re-drawing the treatment probabilities between them and treating people twice
+    def testMergedCampaignsMatchSequential(self):
+        campaigns = [(0, 100.0, 0.8, 0, 0.3), (1, 10, 0.6, 1, 0.3), (0, 0.5, 0.6, 2, 0.3), (5, 15, 0.6, 3, 0.3)]
+        for withIndex in (False, True):
+            sequential = copy.deepcopy(self.vals)
+            merged = copy.deepcopy(self.vals)
+            for valsTest in (sequential, merged):
+                valsTest['n_treatments'] = {}
+                valsTest['n_treatments_population'] = {}
+            if withIndex:
+                merged['cohorts'] = CohortIndex(merged['Age'])
+            rng = np.random.RandomState(7)
+            numTreated = []
+            for ageStart, ageEnd, cov, label, systematic_non_compliance in campaigns:
+                check_if_we_need_to_redraw_probability_of_treatment(cov, systematic_non_compliance, sequential, rng)
+                sequential, n = MDA_timestep_Age_range(sequential, self.params, ageStart, ageEnd, 1, label, self.demog, rng)
+                numTreated.append(n)
+            mergedRng = np.random.RandomState(7)
+            merged, mergedNumTreated = MDA_campaigns_Age_range(merged, self.params, campaigns, 1, self.demog, mergedRng)
+
+            self.assertEqual(mergedNumTreated, numTreated)
+            for key in ['IndI', 'bact_load', 'T_ID', 'T_latent', 'treatProbability']:
+                npt.assert_array_equal(merged[key], sequential[key])
+            for key in ['n_treatments', 'n_treatments_population']:
+                self.assertEqual(merged[key].keys(), sequential[key].keys())
+                for campaign in merged[key]:
+                    npt.assert_array_equal(merged[key][campaign], sequential[key][campaign])
+            npt.assert_array_equal(mergedRng.uniform(size=5), rng.uniform(size=5))
+
     # this test is to check that once we re-draw the treatment probabilities people are still in the same rank order
     # e.g. if you were the most likely to get treated with the previous probabilities, you still are after re-drawing them
     def testRankCorellationOfTreatmentProbabilites(self):
@@ -0,0 +1,96 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import numpy.testing as npt
+
+import trachoma.trachoma_functions as tf
+import trachoma.vaccination
+from trachoma.vaccination import VaccinationStamps, waningTable
+from generate_test_data import DEMOG, make_params
+
+
+class TestVaccinationStamps(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(2)
+        self.N = 1000
+        self.vaccinated = self.rng.uniform(size=self.N) < 0.3
+        self.time_since_vaccinated = np.where(self.vaccinated, self.rng.randint(0, 400, self.N), 0).astype(float)
+        self.params = make_params(self.N, vacc_prob_block_transmission=0.8, vacc_waning_length=52 * 5)
+
+    def test_waning_table_matches_formula(self):
+        table = waningTable(0.8, 52 * 5)
+        weeks = np.arange(600, dtype=float)
+        expected = np.maximum(0.8 * (- weeks / (52 * 5) + 1), 0)
+        npt.assert_array_equal(table, expected[:len(table)])
+        self.assertTrue(np.all(expected[len(table):] == 0))
+
+    def test_waning_tables_shared_by_threads(self):
+        cap = trachoma.vaccination.MAX_CACHED_TABLES
+        trachoma.vaccination.MAX_CACHED_TABLES = 2
+        try:
+            with ThreadPoolExecutor(8) as executor:
+                lengths = [52, 104, 156, 208] * 50
+                tables = list(executor.map(lambda length: waningTable(0.8, length), lengths))
+        finally:
+            trachoma.vaccination.MAX_CACHED_TABLES = cap
+        for length, table in zip(lengths, tables):
+            self.assertEqual(len(table), length)
+
+    def test_stamps_follow_weekly_updates(self):
+        stamps = VaccinationStamps(self.vaccinated, self.time_since_vaccinated)
+        for week in range(30):
+            self.time_since_vaccinated[np.where(self.vaccinated)] += 1
+            stamps.advance()
+            new = np.unique(self.rng.randint(0, self.N, 20))
+            self.vaccinated[new] = True
+            self.time_since_vaccinated[new] = 0
+            stamps.vaccinate(new)
+            reset = np.unique(self.rng.randint(0, self.N, 5))
+            self.vaccinated[reset] = False
+            self.time_since_vaccinated[reset] = 0
+            stamps.remove(reset)
+        npt.assert_array_equal(stamps.people, np.flatnonzero(self.vaccinated))
+        written = np.zeros(self.N)
+        stamps.write(written)
+        npt.assert_array_equal(written, self.time_since_vaccinated)
+
+    def test_protection_gives_same_lambdas(self):
+        groups = tf.getAgeGroups(self.rng.randint(0, 3120, self.N), self.params)
+        IndD = (self.rng.uniform(size=self.N) < 0.2).astype(float)
+        A = [0.1, 0.2, 0.3]
+        stamps = VaccinationStamps(self.vaccinated, self.time_since_vaccinated)
+        npt.assert_array_equal(
+            tf.getIndividualLambdas(self.params, A, groups, IndD, self.vaccinated, self.time_since_vaccinated,
+                                    stamps.protection(self.params)),
+            tf.getIndividualLambdas(self.params, A, groups, IndD, self.vaccinated, self.time_since_vaccinated))
+
+    def test_fractional_times_are_rejected(self):
+        with self.assertRaises(ValueError):
+            VaccinationStamps(np.array([True, False]), np.array([1.5, 0]))
+
+
+class TestSteppingWithStamps(unittest.TestCase):
+
+    def test_steps_match_weekly_updates(self):
+        params = make_params(2000, vacc_prob_block_transmission=0.8, vacc_reduce_bacterial_load=0.5,
+                             vacc_reduce_duration=0.5, vacc_coverage=0.5, importation_rate=0.005,
+                             importation_reduction_rate=1)
+        rng = np.random.RandomState(4)
+        vals = tf.Set_inits(params, DEMOG, {'N_MDA': 0}, [], rng.get_state(), rng=rng)
+        vals = tf.Seed_infection(params=params, vals=vals)
+        vals = tf.vaccinate_population(vals, params, rng)
+        stamped = {key: value.copy() if isinstance(value, np.ndarray) else value for key, value in vals.items()}
+        stamped['vaccination'] = VaccinationStamps(stamped['vaccinated'], stamped['time_since_vaccinated'])
+        rng1, rng2 = np.random.RandomState(5), np.random.RandomState(5)
+        for _ in range(60):
+            vals = tf.stepF_fixed(vals, params, DEMOG, 0.2, rng=rng1)
+            stamped = tf.stepF_fixed(stamped, params, DEMOG, 0.2, rng=rng2)
+        stamped.pop('vaccination').write(stamped['time_since_vaccinated'])
+        for key in ['IndI', 'IndD', 'bact_load', 'vaccinated', 'time_since_vaccinated']:
+            npt.assert_array_equal(stamped[key], vals[key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+from dataclasses import dataclass, field
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from trachoma.runner import run_simulations
+from trachoma.telemetry import make_telemetry
+
+"""
+Run as many draws as are needed for the outputs to reach a given precision.
+
+A fixed number of draws per IU is more than is needed where the outputs vary little
+between draws, e.g. where the disease has been eliminated, and may be too few where
+they vary a lot. run_adaptive runs the draws in batches with run_simulations, keeping
+the running mean and variance of some target measures of each draw (see
+RunningStatistics), and stops once the confidence interval of the mean of every
+target is narrower than the tolerance, or the maximum number of draws has been run.
+
+The targets are functions of the DrawSummary of a draw (see trachoma.reduction)
+returning an array, e.g. of a measure in each output year. observedTF,
+trueElimination and NTDMCPrevalence make the common ones.
+
+The summaries returned are merged with mergeIHME, mergeIPM and mergeNTDMC as for a
+fixed number of draws, so the outputs have the same columns as those of that many
+draws. AdaptiveReport.table gives the precision reached for each target.
+"""
+
+
+class RunningStatistics:
+    '''
+    Mean and variance of arrays added in batches, updated with the parallel form of
+    Welford's algorithm, so the values don't need to be kept.
+
+    Attributes
+    ----------
+    count : int
+        number of arrays added
+    mean : array
+        their mean
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._sumSquares = None
+
+    def add(self, values):
+        '''
+        Add a batch of arrays, one per row of values.
+        '''
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        if n == 0:
+            return
+        values = values.reshape(n, -1)
+        mean = values.mean(axis=0)
+        sumSquares = ((values - mean) ** 2).sum(axis=0)
+        if self.count == 0:
+            self.mean, self._sumSquares = mean, sumSquares
+        else:
+            total = self.count + n
+            delta = mean - self.mean
+            self.mean = self.mean + delta * n / total
+            self._sumSquares = self._sumSquares + sumSquares + delta ** 2 * self.count * n / total
+        self.count += n
+
+    @property
+    def variance(self):
+        '''
+        Sample variance of the values added.
+        '''
+        if self.count < 2:
+            return np.full(np.shape(self.mean), np.nan)
+        return self._sumSquares / (self.count - 1)
+
+    def halfWidth(self, confidence=0.95):
+        '''
+        Half-width of the normal confidence interval of the mean.
+        '''
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        return z * np.sqrt(self.variance / self.count)
+
+
+def observedTF(max_age, ageStart=1, ageEnd=10):
+    '''
+    Target of the proportion of people aged from ageStart up to ageEnd years observed
+    with TF in each output year, from the IHME output of the draw.
+    '''
+    def target(summary):
+        rows = 4 * max_age + 2
+        years = np.asarray(summary.IHME).reshape(-1, rows)
+        observed = years[:, max_age + ageStart:max_age + ageEnd]
+        number = years[:, 3 * max_age + ageStart:3 * max_age + ageEnd]
+        total = number.sum(axis=1)
+        return (observed * number).sum(axis=1) / np.maximum(total, 1)
+    return target
+
+
+def trueElimination(summary):
+    '''
+    Target of whether there was no infection or disease at each output time, whose
+    mean is the probability of elimination.
+    '''
+    if summary.elimination is None:
+        raise ValueError('the summary has no elimination indicators')
+    return summary.elimination
+
+
+def NTDMCPrevalence(summary):
+    '''
+    Target of the NTDMC output, the true prevalence in 1-9 year olds in each year.
+    '''
+    return summary.NTDMC
+
+
+@dataclass
+class AdaptiveReport:
+    '''
+    Precision reached by run_adaptive.
+
+    Attributes
+    ----------
+    draws : int
+        number of draws run
+    converged : bool
+        whether every target reached its tolerance
+    statistics : dict
+        RunningStatistics of each target
+    tolerance : dict
+        tolerance of each target
+    confidence : float
+        level of the confidence intervals
+    '''
+    draws: int
+    converged: bool
+    statistics: dict = field(default_factory=dict)
+    tolerance: dict = field(default_factory=dict)
+    confidence: float = 0.95
+
+    def table(self):
+        '''
+        Data frame with the mean, standard deviation and confidence interval half-width
+        of each element of each target.
+        '''
+        frames = []
+        for name, statistics in self.statistics.items():
+            halfWidth = statistics.halfWidth(self.confidence)
+            frames.append(pd.DataFrame({'target': name, 'index': np.arange(len(statistics.mean)),
+                                        'draws': statistics.count, 'mean': statistics.mean,
+                                        'sd': np.sqrt(statistics.variance), 'half_width': halfWidth,
+                                        'tolerance': self.tolerance[name],
+                                        'converged': halfWidth <= self.tolerance[name]}))
+        return pd.concat(frames, ignore_index=True)
+
+
+def _converged(statistics, tolerance, confidence):
+    return all(np.all(statistics[name].halfWidth(confidence) <= tolerance[name]) for name in statistics)
+
+
+def run_adaptive(pickleData, params, timesim, burnin, demog, betas, MDA_times, MDAData, vacc_times, VaccData,
+                 outputTimes, doSurvey, numpy_states, spec, targets, tolerance, min_draws=20, max_draws=None,
+                 batch_size=None, confidence=0.95, telemetry=None, **kwargs):
+    '''
+    Run draws in batches until the confidence intervals of the means of the targets are
+    narrower than the tolerance.
+
+    Parameters
+    ----------
+    betas, numpy_states : sequence
+        beta and numpy random state of each draw that may be run, as for run_simulations
+    spec : OutputSpec
+        outputs kept for each draw (see trachoma.reduction)
+    targets : dict
+        function of the DrawSummary of a draw returning an array, for each target
+    tolerance : float or dict
+        largest half-width of the confidence intervals of the means, for all targets or for each
+    min_draws : int
+        number of draws run before checking the precision, which guards against stopping
+        because the first draws happened to agree
+    max_draws : int
+        most draws to run, by default len(betas)
+    batch_size : int
+        number of draws run between checks of the precision, by default min_draws
+    confidence : float
+        level of the confidence intervals
+    telemetry :
+        as for run_simulations. An 'adaptive' event is sent after each batch with
+        the number of draws and the widest half-width relative to its tolerance.
+    kwargs :
+        passed on to run_simulations, e.g. n_jobs or backend
+
+    Returns
+    -------
+    summaries : list of DrawSummary
+        summary of each draw run, in order
+    report : AdaptiveReport
+    '''
+    max_draws = len(betas) if max_draws is None else max_draws
+    if max_draws > min(len(betas), len(numpy_states)):
+        raise ValueError('there must be a beta and numpy state for each of max_draws draws')
+    if min_draws < 2:
+        raise ValueError('min_draws must be at least 2 to estimate the variance')
+    batch_size = min_draws if batch_size is None else batch_size
+    if not isinstance(tolerance, dict):
+        tolerance = {name: tolerance for name in targets}
+    telemetry = make_telemetry(telemetry)
+    statistics = {name: RunningStatistics() for name in targets}
+    summaries = []
+    while len(summaries) < max_draws:
+        start = len(summaries)
+        stop = min(max(start + batch_size, min_draws), max_draws)
+        population = pickleData[start:stop] if isinstance(pickleData, (list, tuple)) else pickleData
+        batch = run_simulations(population, params, timesim, burnin, demog, betas[start:stop], MDA_times, MDAData,
+                                vacc_times, VaccData, outputTimes, doSurvey, True, numpy_states[start:stop],
+                                telemetry=telemetry, summary=spec, first_draw=start, **kwargs)
+        summaries.extend(batch)
+        for name, target in targets.items():
+            statistics[name].add([target(summary) for summary in batch])
+        converged = _converged(statistics, tolerance, confidence)
+        telemetry.emit('adaptive', draws=len(summaries),
+                       precision=max(float(np.max(statistics[name].halfWidth(confidence) / tolerance[name]))
+                                     for name in statistics))
+        if converged:
+            break
+    return summaries, AdaptiveReport(draws=len(summaries), converged=converged, statistics=statistics,
+                                     tolerance=tolerance, confidence=confidence)
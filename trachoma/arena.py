@@ -0,0 +1,184 @@
+import inspect
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import trachoma.trachoma_functions as tf
+from trachoma.reduction import DrawSummary, INTERVENTION_KEYS
+
+"""
+Shared-memory output arena.
+
+An OutputArena is a block of shared memory allocated by the parent before the
+draws are run, holding for every draw the columns of the IHME, IPM and NTDMC
+outputs. When it is passed to run_single_simulation (or to run_simulations with
+arena=...) the worker running draw i writes its outputs directly into slice i,
+so the only things returned through joblib are the small MDA, vaccination and
+survey histograms. The parent then turns the finished arena into DrawSummary
+objects whose arrays are views of the shared memory, and writes the outputs with
+mergeIHME, mergeIPM and mergeNTDMC without deserialising anything.
+
+The IHME block has shape (draws, years, 4 * max_age + 2): for each year the four
+measures by age (TruePrevalence, ObservedTF, heavyInfections, number) followed by
+nSurvey and surveyPass. ihme_by_age(draw) returns a (years, measures, ages) view.
+"""
+
+# Python 3.13 can attach to a segment without registering it with the resource tracker
+_SHM_HAS_TRACK = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+
+class OutputArena:
+    '''
+    Shared memory holding the outputs of n_draws draws.
+
+    Parameters
+    ----------
+    spec : OutputSpec
+        outputs to store (see trachoma.reduction)
+    n_draws : int
+        number of draws
+    demog : dict
+        demography, used for the number of age groups
+    timesim : int
+        length of the simulation in weeks, used to size the NTDMC output
+    n_output_times : int
+        number of output times. Defaults to len(spec.outputYear)
+    '''
+
+    def __init__(self, spec, n_draws, demog, timesim, n_output_times=None):
+        self.spec = spec
+        self.n_draws = n_draws
+        self.demog = demog
+        self.max_age = demog['max_age'] // 52 # max_age in weeks
+        self.n_output_times = len(spec.outputYear) if n_output_times is None else n_output_times
+        nMDA = 0 if spec.MDAAgeRanges is None else len(spec.MDAAgeRanges)
+        nVacc = 0 if spec.VaccAgeRanges is None else len(spec.VaccAgeRanges)
+        self.layout = {
+            'IHME': ((n_draws, self.n_output_times, 4 * self.max_age + 2), np.float64),
+            'IPM': ((n_draws, self.n_output_times, 3 + 3 * nMDA + 3 * nVacc), np.float64),
+            'NTDMC': ((n_draws, len(range(spec.burnin, timesim, 52))), np.float64),
+            'n_years': ((n_draws,), np.int64),
+            'done': ((n_draws,), np.int8),
+        }
+        size = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype in self.layout.values())
+        self.name = 'trachoma_' + uuid.uuid4().hex[:16]
+        self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=max(size, 1))
+        self._owner = True
+        self._map()
+        self.blocks['done'][:] = 0
+
+    def _map(self):
+        self.blocks = {}
+        offset = 0
+        for key, (shape, dtype) in self.layout.items():
+            self.blocks[key] = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    def __getstate__(self):
+        # only the name and layout are sent to the workers, which attach to the same memory
+        return {key: value for key, value in self.__dict__.items() if key not in ('_shm', 'blocks')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if _SHM_HAS_TRACK:
+            self._shm = shared_memory.SharedMemory(name=self.name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+            # otherwise the worker's resource tracker would remove the segment when the worker exits
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._owner = False
+        self._map()
+
+    def write(self, draw, vals, results, params, rng=np.random):
+        '''
+        Write the outputs of draw from the output of sim_Ind_MDA_Include_Survey.
+        '''
+        n_years = len(results)
+        if n_years > self.n_output_times:
+            raise ValueError(f'draw {draw} has {n_years} output times, but the arena only has room for '
+                             f'{self.n_output_times}')
+        if self.spec.IHME:
+            column = tf.getDrawIHME(results, params, self.max_age, self.spec.aggregateObservedTF, rng)
+            self.blocks['IHME'][draw, :n_years] = column.reshape(n_years, -1)
+        if self.spec.MDAAgeRanges is not None:
+            VaccAgeRanges = self.spec.VaccAgeRanges if self.spec.VaccAgeRanges is not None else []
+            column = tf.getDrawIPM(results, len(self.spec.MDAAgeRanges), len(VaccAgeRanges))
+            self.blocks['IPM'][draw, :n_years] = column.reshape(n_years, -1)
+        NTDMC = tf.getDrawNTDMC(vals, self.spec.burnin)
+        self.blocks['NTDMC'][draw, :len(NTDMC)] = NTDMC
+        self.blocks['n_years'][draw] = n_years
+        self.blocks['done'][draw] = 1
+
+    def ihme_by_age(self, draw):
+        '''
+        View of the IHME measures by age of draw, with shape (years, 4, max_age).
+        '''
+        return self.blocks['IHME'][draw, :, :4 * self.max_age].reshape(self.n_output_times, 4, self.max_age)
+
+    def summaries(self, returned=None):
+        '''
+        DrawSummary of every draw, whose arrays are views of the arena.
+
+        Parameters
+        ----------
+        returned : list of DrawSummary
+            summaries returned by the workers, holding the MDA, vaccination and
+            survey histograms of each draw
+        '''
+        missing = np.where(self.blocks['done'] == 0)[0]
+        if len(missing) > 0:
+            raise RuntimeError(f'draws {missing.tolist()} have not been written to the arena')
+        summaries = []
+        for draw in range(self.n_draws):
+            n_years = int(self.blocks['n_years'][draw])
+            summary = DrawSummary(n_years=n_years, NTDMC=self.blocks['NTDMC'][draw])
+            if self.spec.IHME:
+                summary.IHME = self.blocks['IHME'][draw, :n_years].reshape(-1)
+            if self.spec.MDAAgeRanges is not None:
+                summary.IPM = self.blocks['IPM'][draw, :n_years].reshape(-1)
+            if returned is not None:
+                summary.interventions = returned[draw].interventions
+                summary.phase_profile = returned[draw].phase_profile
+                summary.burnin_weeks = returned[draw].burnin_weeks
+            summaries.append(summary)
+        return summaries
+
+    @property
+    def nbytes(self):
+        return self._shm.size
+
+    def close(self):
+        '''
+        Detach from the shared memory, and free it if this is the arena which allocated it.
+        Views returned by summaries can't be used afterwards.
+        '''
+        if self._shm is None:
+            return
+        self.blocks = {}
+        if self._owner:
+            self._shm.unlink()
+        try:
+            self._shm.close()
+        except BufferError:
+            # views are still in use, the memory is released when they are deleted
+            pass
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def run_into_arena(arena, **kwargs):
+    '''
+    Run run_single_simulation writing into arena, and return only the MDA,
+    vaccination and survey histograms of the draw.
+    '''
+    vals, results = tf.run_single_simulation(arena=arena, **kwargs)
+    return DrawSummary(n_years=len(results), NTDMC=None,
+                       interventions={key: vals[key] for key in INTERVENTION_KEYS if key in vals},
+                       phase_profile=vals.get('phase_profile'), burnin_weeks=vals.get('Burnin_weeks'))
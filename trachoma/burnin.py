@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+"""
+Adaptive burnin, stopped once the population has reached its endemic equilibrium.
+
+The burnin is a fixed number of weeks (40 years in loadParameters) for every IU
+and beta, though populations with a high beta reach equilibrium much sooner, and
+those in which the infection fades out are obviously at equilibrium once it has.
+With an AdaptiveBurnin, trachoma_functions.advanceBurnin runs the burnin a week at
+a time, feeding the prevalence of disease in 1-9 year olds and the mean bacterial
+load to a StationarityDetector, and stops once both are stationary (but not before
+min_weeks) or nobody is infected or diseased and there is no importation. The
+rest of the burnin is skipped, so the simulation carries on from the end of the
+nominal burnin, and MDA, vaccination, surveys and output times, which are all
+counted from the start of the nominal burnin, line up as they would have.
+
+The test is done on batch means: the weekly values of each series are averaged
+over batches of batch_weeks, and the series is taken to be stationary once the
+means of its last window batches and of the window batches before them differ
+by no more than rtol of the larger of them plus atol.
+
+Close to the threshold of beta below which the infection fades out, it can take
+decades to do so, and the burnin may well stop before it has, so fewer draws
+will have eliminated the infection by the end of the burnin than with the full
+one. For such IUs min_weeks can be raised, or the full burnin used.
+"""
+
+
+@dataclass
+class AdaptiveBurnin:
+    '''
+    Settings of an adaptive burnin.
+
+    Parameters
+    ----------
+    min_weeks : int
+        shortest burnin
+    max_weeks : int
+        longest burnin, by default the nominal burnin of the simulation. A burnin can't
+        be longer than the nominal one
+    batch_weeks : int
+        number of weeks averaged in each batch
+    window : int
+        number of batches in each of the two windows compared
+    rtol, atol : float
+        relative and absolute tolerance of the difference between the windows
+    '''
+    min_weeks: int = 10 * 52
+    max_weeks: Optional[int] = None
+    batch_weeks: int = 52
+    window: int = 5
+    rtol: float = 0.05
+    atol: float = 0.005
+
+    def __post_init__(self):
+        if self.batch_weeks < 1 or self.window < 1:
+            raise ValueError('batch_weeks and window must be at least 1')
+        if self.max_weeks is not None and self.max_weeks < self.min_weeks:
+            raise ValueError(f'max_weeks ({self.max_weeks}) is less than min_weeks ({self.min_weeks})')
+
+    def detector(self, n_series=2):
+        '''
+        New StationarityDetector with these settings.
+        '''
+        return StationarityDetector(n_series, self.min_weeks, self.batch_weeks, self.window, self.rtol, self.atol)
+
+
+class StationarityDetector:
+    '''
+    Online test of whether several series are stationary, by comparing the means of
+    the last two windows of batches of each.
+
+    Parameters
+    ----------
+    n_series : int
+        number of series
+    min_weeks : int
+        number of weeks before which the series aren't taken to be stationary
+    batch_weeks, window, rtol, atol :
+        as for AdaptiveBurnin
+    '''
+
+    def __init__(self, n_series, min_weeks, batch_weeks=52, window=5, rtol=0.05, atol=0.005):
+        self.min_weeks = min_weeks
+        self.batch_weeks = batch_weeks
+        self.window = window
+        self.rtol, self.atol = rtol, atol
+        self.weeks = 0
+        self._sums = np.zeros(n_series)
+        self.batches = []
+
+    def add(self, values):
+        '''
+        Add the values of the series in a week, returning whether they are stationary.
+        '''
+        self._sums += values
+        self.weeks += 1
+        if self.weeks % self.batch_weeks != 0:
+            return False
+        self.batches.append(self._sums / self.batch_weeks)
+        self._sums = np.zeros(len(self._sums))
+        return self.stationary()
+
+    def stationary(self):
+        '''
+        Whether every series is stationary, given the batches so far.
+        '''
+        if self.weeks < self.min_weeks or len(self.batches) < 2 * self.window:
+            return False
+        batches = np.array(self.batches[-2 * self.window:])
+        before, after = batches[:self.window].mean(axis=0), batches[self.window:].mean(axis=0)
+        return bool(np.all(np.abs(after - before) <= self.rtol * np.maximum(np.abs(before), np.abs(after)) +
+                           self.atol))
@@ -0,0 +1,181 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import trachoma.trachoma_functions as tf
+from trachoma.schedules import simulationSchedules
+from trachoma.telemetry import make_telemetry
+
+"""
+Calibrate beta to the TF prevalence observed in surveys of an IU by approximate
+Bayesian computation (ABC) with rejection.
+
+Candidate betas are drawn from a uniform prior in batches. Each is simulated up to
+the last survey, and accepted if the expected observed TF in 1-9 year olds (the true
+prevalence of disease seen through the sensitivity and specificity of the test) is
+within the tolerance of the observed prevalence at every survey. As the distance
+is the largest difference over the surveys, a candidate is rejected as soon as it
+is outside the tolerance at one of them, without simulating the rest of it.
+
+Most of the time of a simulation is in its burnin, at the end of which the
+population is close to its endemic equilibrium, which changes little with beta. The
+candidates of a batch are therefore grouped in bins of beta of width bin_width, and
+the candidates of a bin continue copies of one burnin run at the middle of the bin
+(see trachoma_functions.forkSimulation), each with its own beta and random numbers
+from the end of the burnin. With bin_width None each candidate has its own burnin.
+
+The accepted betas are returned with a seed each as a table in the format of the
+InputBet files, which run_simulations can be run with. With bin_width None the
+seed is that of the whole simulation of the candidate, so running it with
+numpy_state seed_to_state(seed) gives the accepted trajectory again. With shared
+burnins the seed is only that of the random numbers after the burnin, which was
+run with another seed at the beta of the middle of the bin; these are returned in
+CalibrationResult.burnins.
+"""
+
+
+@dataclass
+class CalibrationResult:
+    '''
+    Outcome of calibrate.
+
+    Attributes
+    ----------
+    posterior : DataFrame
+        accepted seeds and betas, in the format of the InputBet files
+    distances : array
+        distance of each accepted beta from the observations
+    candidates : int
+        number of candidates simulated
+    rejected_early : int
+        number rejected before their last survey
+    weeks : int
+        number of weeks simulated, counting each shared burnin once
+    burnins : DataFrame
+        seed and beta of the burnin each accepted beta continued, in the same
+        format and order as posterior. With bin_width None these are those of
+        the posterior
+    '''
+    posterior: pd.DataFrame
+    distances: np.ndarray
+    candidates: int
+    rejected_early: int
+    weeks: int
+    burnins: pd.DataFrame
+
+    @property
+    def acceptance_rate(self):
+        '''
+        Fraction of the candidates accepted.
+        '''
+        return len(self.posterior) / self.candidates if self.candidates > 0 else 0.0
+
+
+def expectedObservedTF(sim):
+    '''
+    Expected proportion of 1-9 year olds testing positive for TF in the last week of sim.
+    '''
+    params = sim['params']
+    prevalence = sim['prevalence'][-1]
+    return params['TestSensitivity'] * prevalence + (1 - params['TestSpecificity']) * (1 - prevalence)
+
+
+def _distance(sim, observations, tolerance):
+    '''
+    Run sim to each survey in turn, returning the largest difference between the expected and
+    observed TF, and whether it was stopped early for being outside the tolerance.
+    '''
+    distance = 0
+    for n, (week, observed) in enumerate(observations):
+        tf.advanceSimulation(sim, week + 1)
+        distance = max(distance, abs(expectedObservedTF(sim) - observed))
+        if distance > tolerance:
+            return distance, n < len(observations) - 1
+    return distance, False
+
+
+def calibrate(pickleData, params, demog, burnin, observations, prior, tolerance, MDA_times, MDAData, vacc_times,
+              VaccData, n_accept=100, batch_size=50, max_candidates=10000, bin_width=0.01, seed=0,
+              distToUse="Poisson", telemetry=None):
+    '''
+    Draw betas from their posterior given the TF prevalence observed in surveys.
+
+    Parameters
+    ----------
+    pickleData : dict
+        starting population, e.g. from Set_inits and Seed_infection
+    burnin : int
+        weeks of burnin before the simulated surveys
+    observations : sequence
+        (week, observed TF prevalence in 1-9 year olds) of each survey, with the weeks
+        counted from the start of the simulation, so after the burnin
+    prior : (float, float)
+        bounds of the uniform prior of beta
+    tolerance : float
+        largest difference between the expected and observed TF at any survey of an
+        accepted beta
+    MDA_times, MDAData, vacc_times, VaccData :
+        interventions, as for run_single_simulation
+    n_accept : int
+        number of betas to accept
+    batch_size : int
+        number of candidates drawn at a time
+    max_candidates : int
+        most candidates to simulate
+    bin_width : float
+        width of the bins of beta sharing a burnin, or None to run a burnin for each candidate
+    seed : int
+        seed of the candidates, whose own seeds are numbered from 1 as in the InputBet files
+    telemetry :
+        as for run_single_simulation. A 'calibration' event is sent after each batch
+
+    Returns
+    -------
+    CalibrationResult
+    '''
+    observations = sorted((int(week), observed) for week, observed in observations)
+    if len(observations) == 0 or observations[0][0] < burnin:
+        raise ValueError('there must be at least one survey, all of them after the burnin')
+    timesim = observations[-1][0] + 1
+    outputTimes = np.array([timesim + 10])
+    telemetry = make_telemetry(telemetry)
+    draw = np.random.RandomState(seed)
+    accepted, distances = [], []
+    candidates = rejected_early = weeks = 0
+    while len(accepted) < n_accept and candidates < max_candidates:
+        n = min(batch_size, max_candidates - candidates)
+        betas = draw.uniform(prior[0], prior[1], size=n)
+        seeds = np.arange(candidates + 1, candidates + n + 1)
+        candidates += n
+        bins = np.floor(betas / bin_width).astype(int) if bin_width else np.arange(n)
+        for b in np.unique(bins):
+            group = np.flatnonzero(bins == b)
+            rng = np.random.RandomState(seeds[group[0]])
+            numpy_state = rng.get_state()
+            vals, simParams, simDemog = tf.prepareSimulation(pickleData, params, demog, MDAData, numpy_state, rng)
+            burninBeta = (b + 0.5) * bin_width if bin_width else betas[group[0]]
+            start = tf.initSimulation(simParams, vals, timesim, burnin, simDemog, burninBeta, MDA_times, MDAData,
+                                      vacc_times, VaccData, outputTimes, False, False, numpy_state, distToUse, rng=rng)
+            tf.advanceSimulation(start, burnin)
+            weeks += burnin
+            for c in group:
+                if bin_width:
+                    sim = tf.forkSimulation(start, np.random.RandomState(seeds[c]))
+                    sim['betas'] = simulationSchedules(simParams, betas[c], timesim, burnin)['beta']
+                else:
+                    # the candidate's own burnin, carried on with the same random numbers
+                    sim = start
+                distance, early = _distance(sim, observations, tolerance)
+                weeks += sim['week'] - burnin
+                rejected_early += early
+                if distance <= tolerance and len(accepted) < n_accept:
+                    accepted.append((seeds[c], betas[c], seeds[group[0]], burninBeta))
+                    distances.append(distance)
+        telemetry.emit('calibration', candidates=candidates, accepted=len(accepted), rejected_early=rejected_early)
+    # in the order the candidates were drawn
+    order = np.argsort([candidate[0] for candidate in accepted], kind='stable')
+    posterior = pd.DataFrame([accepted[i][:2] for i in order], columns=['Random Generator', 'bet'])
+    burnins = pd.DataFrame([accepted[i][2:] for i in order], columns=['Random Generator', 'bet'])
+    return CalibrationResult(posterior=posterior, distances=np.array(distances)[order], candidates=candidates,
+                             rejected_early=rejected_early, weeks=weeks, burnins=burnins)
@@ -0,0 +1,351 @@
+import math
+
+import numpy as np
+
+"""
+Birth cohort index of the population, for selecting people by age.
+
+Everyone's age goes up by one every week, so the week they were born in (their
+birth cohort) only changes when they are reset or imported. A CohortIndex keeps
+the people of the population in order of birth week, and the number of people
+born in each week. The people in an age range are the people born in a range of
+weeks, who are next to each other in this order, and where they start and end is
+read off the cumulative numbers born, so counting them takes O(1) time and
+listing them is a slice of the order, instead of comparing everyone's age.
+Ageing the population is a matter of advancing the index's week, and moving the
+few people who are reset or imported each week only shifts the order along.
+
+sim_Ind_MDA_Include_Survey keeps an index of the population in vals['cohorts']
+while it runs, and everyone's age is then the index's week less their birth
+week. vals['Age'] isn't updated every week while the index is in vals: the
+step function reads ages through the index, and syncAges writes them into
+vals['Age'] where the array itself is needed, for the snapshots of the outputs
+and at the end of the simulation. Reset_state and Import_individual set the
+ages of the people they change in vals['Age'] and tell the index about them.
+Use ageCount, ageMembers, ageMask and ageOf, which use the index if there is
+one, and compare ages otherwise.
+
+ageMembers returns people in increasing order of index, the order np.where
+gives, so that the same random numbers go to the same people whether or not
+the index is used, unless ordered is False, when it returns the slice of the
+index's order, which is quicker where the order doesn't matter.
+
+The index also holds the age structure of the population, which the MDA,
+vaccination and survey outputs and the weekly metrics all need: the number of
+people of each age, which is the numbers born in each week in reverse, and
+everyone's age in years. These are calculated the first time they are needed
+in a week and kept until the population ages or changes. ageYearHistogram and
+ageHistogram give the same counts as np.histogram of the ages, using them.
+"""
+
+# number of tables of the bins of ages kept by a CohortIndex
+MAX_CACHED_TABLES = 16
+
+
+def _lowerAge(lower, closed):
+    # smallest integer age in the range
+    if lower is None:
+        return -math.inf
+    return math.ceil(lower) if closed == 'left' else math.floor(lower) + 1
+
+
+def _upperAge(upper, closed):
+    # smallest integer age above the range
+    if upper is None:
+        return math.inf
+    return math.ceil(upper) if closed == 'left' else math.floor(upper) + 1
+
+
+class CohortIndex:
+    '''
+    Index of a population by birth week.
+
+    Parameters
+    ----------
+    Age : array of int
+        age of everyone in weeks, at week 0 of the index
+
+    Attributes
+    ----------
+    week : int
+        number of weeks the population has aged since the index was made
+    birth : array of int
+        week each person was born in
+    order : array of int
+        people in order of birth week
+    origin : int
+        birth week of the first element of counts
+    counts : array of int
+        number of people born in each week from origin
+    '''
+
+    def __init__(self, Age):
+        Age = np.asarray(Age)
+        if not np.issubdtype(Age.dtype, np.integer):
+            raise ValueError(f'ages must be whole numbers of weeks, not {Age.dtype}')
+        self.week = 0
+        self.birth = -Age.astype(np.int64)
+        self.order = np.argsort(self.birth, kind='stable')
+        self.origin = int(self.birth.min(initial=0))
+        self.counts = np.bincount(self.birth - self.origin)
+        # values calculated from the current state, cleared when it changes
+        self._cache = {}
+        # bin of each age in np.histogram(Age, bins=nBins), by (youngest, oldest, nBins)
+        self._tables = {}
+
+    def __len__(self):
+        return len(self.birth)
+
+    def ages(self, people=None):
+        '''
+        Everyone's age in weeks, or that of the people with indices people.
+        '''
+        if people is None:
+            return self.week - self.birth
+        return self.week - self.birth[people]
+
+    def advance(self, weeks=1):
+        '''
+        Age everyone by weeks.
+        '''
+        self.week += weeks
+        self._cache.clear()
+
+    def _cached(self, key, calculate):
+        if key not in self._cache:
+            self._cache[key] = calculate()
+        return self._cache[key]
+
+    def starts(self):
+        '''
+        Position in order of the first person born in each week from origin,
+        followed by the number of people.
+        '''
+        return self._cached('starts', lambda: np.concatenate([[0], np.cumsum(self.counts)]))
+
+    def update(self, indices, Age):
+        '''
+        Move the people indices, whose ages have been changed to Age[indices],
+        to their new birth cohorts.
+        '''
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return
+        oldBirths = self.birth[indices]
+        newBirths = self.week - np.asarray(Age)[indices].astype(np.int64)
+
+        # positions of the people in order, searching only their own cohorts
+        starts = self.starts()
+        first = starts[oldBirths - self.origin]
+        sizes = starts[oldBirths - self.origin + 1] - first
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        candidates = np.repeat(first, sizes) + offsets
+        positions = candidates[self.order[candidates] == np.repeat(indices, sizes)]
+
+        self._extend(newBirths.min(), newBirths.max())
+        self.counts -= np.bincount(oldBirths - self.origin, minlength=len(self.counts))
+        # each person goes after the people already in their new cohort
+        newOrder = np.argsort(newBirths, kind='stable')
+        insertAt = np.cumsum(self.counts)[newBirths[newOrder] - self.origin]
+        order = np.delete(self.order, positions)
+        if insertAt[0] == len(order):
+            self.order = np.concatenate([order, indices[newOrder]])
+        else:
+            self.order = np.insert(order, insertAt, indices[newOrder])
+        self.counts += np.bincount(newBirths - self.origin, minlength=len(self.counts))
+        self.birth[indices] = newBirths
+        self._cache.clear()
+
+    def ageCounts(self):
+        '''
+        Number of people of each age in weeks, from 0 to the oldest. Ages can't be negative.
+        '''
+        def calculate():
+            # the last element of counts is the youngest cohort, of this age
+            youngest = self.week - self.origin - len(self.counts) + 1
+            counts = self.counts[::-1]
+            if youngest < 0:
+                counts = counts[-youngest:]
+            else:
+                counts = np.concatenate([np.zeros(youngest, dtype=counts.dtype), counts])
+            return np.trim_zeros(counts, 'b')
+        return self._cached('ageCounts', calculate)
+
+    def yearBins(self, nYears):
+        '''
+        Everyone's bin in np.histogram(Age / 52, bins=np.arange(nYears + 1)):
+        their age in years, with those aged exactly nYears in the last year,
+        and nYears for those who are older.
+        '''
+        return self._cached(('yearBins', nYears), lambda: _yearBins(self.ages(), nYears))
+
+    def yearHistogram(self, nYears):
+        '''
+        np.histogram(Age / 52, bins=np.arange(nYears + 1)) of the population.
+        '''
+        def calculate():
+            ageCounts = self.ageCounts()
+            return np.bincount(_yearBins(np.arange(len(ageCounts)), nYears), weights=ageCounts,
+                               minlength=nYears + 1)[:nYears].astype(np.int64)
+        return self._cached(('yearHistogram', nYears), calculate)
+
+    def ageBins(self, nBins):
+        '''
+        Youngest age, and the bin of each age from the youngest to the oldest in
+        np.histogram(Age, bins=nBins), whose bins are of equal width from the
+        youngest to the oldest age.
+        '''
+        ageCounts = self.ageCounts()
+        youngest, oldest = int(np.flatnonzero(ageCounts)[0]), len(ageCounts) - 1
+        key = (youngest, oldest, nBins)
+        if key not in self._tables:
+            # each age is a value of np.arange(youngest, oldest + 1), so its bin is found from the counts of that
+            binCounts, _ = np.histogram(np.arange(youngest, oldest + 1), bins=nBins)
+            if len(self._tables) >= MAX_CACHED_TABLES:
+                self._tables.clear()
+            self._tables[key] = np.repeat(np.arange(nBins), binCounts)
+        return youngest, self._tables[key]
+
+    def _extend(self, minBirth, maxBirth):
+        # make counts cover the birth weeks from minBirth to maxBirth
+        if minBirth < self.origin:
+            self.counts = np.concatenate([np.zeros(self.origin - minBirth, dtype=self.counts.dtype), self.counts])
+            self.origin = int(minBirth)
+        if maxBirth >= self.origin + len(self.counts):
+            # with room for the births of the next year, so that counts isn't extended every week
+            extra = maxBirth - self.origin - len(self.counts) + 1 + 52
+            self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=self.counts.dtype)])
+
+    def _bounds(self, lower, upper, closed):
+        # positions in order of the people in the age range
+        lowerAge, upperAge = _lowerAge(lower, closed), _upperAge(upper, closed)
+        if lowerAge >= upperAge:
+            return 0, 0
+        starts = self.starts()
+        # people with these ages were born from week - upperAge + 1 to week - lowerAge
+        first = 0 if upperAge == math.inf else self.week - upperAge + 1 - self.origin
+        last = len(self.counts) if lowerAge == -math.inf else self.week - lowerAge + 1 - self.origin
+        first = min(max(first, 0), len(self.counts))
+        last = min(max(last, 0), len(self.counts))
+        return int(starts[first]), int(starts[max(first, last)])
+
+    def count(self, lower=None, upper=None, closed='left'):
+        '''
+        Number of people with lower <= age < upper, in weeks, or lower < age <= upper
+        if closed is 'right'. Either bound can be None.
+        '''
+        start, stop = self._bounds(lower, upper, closed)
+        return stop - start
+
+    def members(self, lower=None, upper=None, ordered=True, closed='left'):
+        '''
+        Indices of the people in the age range, in increasing order, or if ordered
+        is False in order of birth week, as a read-only slice of order.
+        '''
+        start, stop = self._bounds(lower, upper, closed)
+        members = self.order[start:stop]
+        if ordered:
+            return np.sort(members)
+        members = members.view()
+        members.setflags(write=False)
+        return members
+
+    def mask(self, lower=None, upper=None, closed='left'):
+        '''
+        Boolean array which is True for the people in the age range.
+        '''
+        start, stop = self._bounds(lower, upper, closed)
+        mask = np.zeros(len(self.birth), dtype=bool)
+        mask[self.order[start:stop]] = True
+        return mask
+
+
+def _yearBins(Age, nYears):
+    # np.histogram puts ages of exactly nYears in the last bin, and leaves out older ages
+    return np.where(Age <= 52 * nYears, np.minimum(Age // 52, nYears - 1), nYears)
+
+
+def syncAges(vals):
+    '''
+    Write everyone's age into vals['Age'] from the CohortIndex in vals['cohorts'],
+    if there is one, as it isn't updated every week while there is.
+    '''
+    if 'cohorts' in vals:
+        cohorts = vals['cohorts']
+        np.subtract(cohorts.week, cohorts.birth, out=vals['Age'], casting='unsafe')
+
+
+def ageOf(vals, people):
+    '''
+    Ages in weeks of the people with indices people.
+    '''
+    if 'cohorts' in vals:
+        return vals['cohorts'].ages(people)
+    return vals['Age'][people]
+
+
+def ageCount(vals, lower=None, upper=None, closed='left'):
+    '''
+    Number of people with lower <= age < upper, in weeks, or lower < age <= upper
+    if closed is 'right'.
+    '''
+    if 'cohorts' in vals:
+        return vals['cohorts'].count(lower, upper, closed)
+    return np.count_nonzero(ageMask(vals, lower, upper, closed))
+
+
+def ageMembers(vals, lower=None, upper=None, ordered=True, closed='left'):
+    '''
+    Indices of the people with lower <= age < upper, in weeks, or lower < age <= upper
+    if closed is 'right', in increasing order. If ordered is False they can be in any order.
+    '''
+    if 'cohorts' in vals:
+        return vals['cohorts'].members(lower, upper, ordered, closed)
+    return np.where(ageMask(vals, lower, upper, closed))[0]
+
+
+def ageMask(vals, lower=None, upper=None, closed='left'):
+    '''
+    Boolean array which is True for the people with lower <= age < upper, in weeks,
+    or lower < age <= upper if closed is 'right'.
+    '''
+    if 'cohorts' in vals:
+        return vals['cohorts'].mask(lower, upper, closed)
+    Age = vals['Age']
+    mask = np.ones(len(Age), dtype=bool)
+    if lower is not None:
+        mask &= (Age >= lower) if closed == 'left' else (Age > lower)
+    if upper is not None:
+        mask &= (Age < upper) if closed == 'left' else (Age <= upper)
+    return mask
+
+
+def ageYearHistogram(vals, nYears, people=None):
+    '''
+    Number of people of each age in years, from 0 to nYears, as given by
+    np.histogram(vals['Age'][people] / 52, bins=np.arange(nYears + 1)). people
+    can be indices or a boolean array, and defaults to everyone.
+    '''
+    if 'cohorts' not in vals:
+        Age = vals['Age'] if people is None else vals['Age'][people]
+        return np.histogram(Age / 52, bins=np.arange(nYears + 1))[0]
+    if people is None:
+        return vals['cohorts'].yearHistogram(nYears).copy()
+    return np.bincount(vals['cohorts'].yearBins(nYears)[people], minlength=nYears + 1)[:nYears]
+
+
+def ageHistogram(vals, nBins, weights=None):
+    '''
+    np.histogram(vals['Age'], bins=nBins, weights=weights) of the population,
+    with nBins bins of equal width from the youngest to the oldest age.
+    '''
+    if 'cohorts' not in vals or len(vals['Age']) == 0:
+        return np.histogram(vals['Age'], bins=nBins, weights=weights)[0]
+    youngest, bins = vals['cohorts'].ageBins(nBins)
+    if weights is None:
+        return np.bincount(bins, weights=vals['cohorts'].ageCounts()[youngest:], minlength=nBins).astype(np.int64)
+    weights = np.asarray(weights)
+    # only people with a weight add to the counts, and there are usually few of them
+    weighted = np.flatnonzero(weights)
+    byAge = np.bincount(vals['cohorts'].ages(weighted) - youngest, weights=weights[weighted], minlength=len(bins))
+    return np.bincount(bins, weights=byAge, minlength=nBins).astype(weights.dtype)
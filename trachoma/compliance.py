@@ -0,0 +1,139 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+Systematic non-compliance as a fixed compliance quantile per person.
+
+By default everyone's probability of treatment is a draw from a beta
+distribution with mean the MDA coverage and intra-class correlation rho, and
+when the coverage or rho change editTreatProbability draws N new values and
+gives them out in the order of the old ones. In compliance quantile mode
+(params['complianceQuantiles'] = True) each person instead has a quantile u,
+stored in vals['compliance_quantile'], which is drawn once when they are born
+or imported. Their probability of treatment is the beta inverse CDF at u for
+the current coverage and rho, so a change of coverage is a table lookup, and
+the order of people's probabilities never changes.
+
+The inverse CDF of each (coverage, rho) is tabulated the first time it is
+needed and kept, in a cache shared by the threads of a process (see
+complianceTable). numpy has no beta CDF, so it is calculated with the continued
+fraction for the regularised incomplete beta function, on a grid of
+probabilities which is finer near 0 and 1, and inverted by interpolation. The quantiles are accurate to about 1e-4.
+"""
+
+# number of (coverage, rho) tables kept
+MAX_CACHED_TABLES = 64
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+_EPS = 1e-15
+_TINY = 1e-300
+
+
+def _betaContinuedFraction(a, b, x):
+    # modified Lentz's method for the continued fraction of the incomplete beta function
+    qab, qap, qam = a + b, a + 1, a - 1
+    c = np.ones_like(x)
+    d = 1 - qab * x / qap
+    d = 1 / np.where(np.abs(d) < _TINY, _TINY, d)
+    h = d.copy()
+    for m in range(1, 10001):
+        m2 = 2 * m
+        for aa in (m * (b - m) * x / ((qam + m2) * (a + m2)), -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))):
+            d = 1 + aa * d
+            d = 1 / np.where(np.abs(d) < _TINY, _TINY, d)
+            c = 1 + aa / c
+            c = np.where(np.abs(c) < _TINY, _TINY, c)
+            delta = d * c
+            h *= delta
+        if np.all(np.abs(delta - 1) < _EPS):
+            break
+    return h
+
+
+def betaCDF(x, a, b):
+    '''
+    CDF of the beta distribution with parameters a and b at x.
+    '''
+    x = np.clip(np.asarray(x, dtype=float), 0, 1)
+    inner = (x > 0) & (x < 1)
+    xi = x[inner]
+    logFront = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * np.log(xi) + b * np.log1p(-xi))
+    front = np.exp(logFront)
+    # the continued fraction converges quickly for x < (a + 1) / (a + b + 2), and by symmetry above it
+    low = xi < (a + 1) / (a + b + 2)
+    cdf = np.empty(len(xi))
+    cdf[low] = front[low] * _betaContinuedFraction(a, b, xi[low]) / a
+    cdf[~low] = 1 - front[~low] * _betaContinuedFraction(b, a, 1 - xi[~low]) / b
+    result = np.where(x >= 1, 1.0, 0.0)
+    result[inner] = np.clip(cdf, 0, 1)
+    return result
+
+
+def _grid():
+    ends = np.logspace(-14, -2, 400)
+    return np.unique(np.concatenate([[0], ends, np.linspace(0, 1, 16385), 1 - ends, [1]]))
+
+
+def complianceTable(cov, snc):
+    '''
+    Tabulated beta CDF for coverage cov and systematic non-compliance snc, as
+    (cdf, probabilities), with cdf strictly increasing.
+    '''
+    key = (float(cov), float(snc))
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+    alpha = cov * (1 - snc) / snc
+    beta = (1 - cov) * (1 - snc) / snc
+    probabilities = _grid()
+    cdf = betaCDF(probabilities, alpha, beta)
+    # keep the first probability with each value of the CDF, so that it can be interpolated
+    cdf, first = np.unique(cdf, return_index=True)
+    table = (cdf, probabilities[first])
+    for array in table:
+        array.setflags(write=False)
+    with _tables_lock:
+        _tables[key] = table
+        while len(_tables) > MAX_CACHED_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+
+def treatmentProbabilities(quantiles, cov, snc):
+    '''
+    Probabilities of treatment of people with compliance quantiles for the
+    coverage cov and systematic non-compliance snc. As with
+    drawTreatmentProbabilities, everyone has probability cov if snc is 0.
+    '''
+    quantiles = np.asarray(quantiles, dtype=float)
+    if cov == 0:
+        return np.zeros(len(quantiles))
+    if cov == 1:
+        return np.ones(len(quantiles))
+    if snc > 0:
+        cdf, probabilities = complianceTable(cov, snc)
+        return np.interp(quantiles, cdf, probabilities)
+    return np.ones(len(quantiles)) * cov
+
+
+def complianceQuantiles(treatProbability, cov, snc, rng=np.random):
+    '''
+    Compliance quantiles of people with probabilities of treatment
+    treatProbability, drawn from the beta distribution for cov and snc. If these
+    don't define the quantiles (such as when everyone has the same probability)
+    the quantiles are drawn at random.
+    '''
+    treatProbability = np.asarray(treatProbability, dtype=float)
+    if 0 < cov < 1 and snc > 0 and not np.isnan(treatProbability).any():
+        alpha = cov * (1 - snc) / snc
+        beta = (1 - cov) * (1 - snc) / snc
+        return betaCDF(treatProbability, alpha, beta)
+    return rng.uniform(size=len(treatProbability))
+
@@ -0,0 +1,186 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy import ndarray
+
+"""
+Compiled intervention schedules from the coverage files.
+
+readPlatformData and getInterventionAgeRanges read a coverage file with pandas
+every time they are called, and build the MDA and vaccination data cell by cell.
+Running many IUs and scenarios does this thousands of times for the same few
+files. An InterventionSchedule holds everything in one coverage file as typed
+arrays, one element per campaign (a row of the file with a positive coverage in
+a year column), built in a single pass. loadInterventionSchedule keeps the
+schedules of the most recently used files, keyed on their path and modification
+time, so each file is only parsed again if it changes. The cache is shared by
+the threads of a process, and guarded by a lock.
+
+The schedule is a small set of numpy arrays, so it is cheap to pickle and send
+to workers, and platformData, ageRanges, dates and weeks give the same values
+as readPlatformData, getInterventionAgeRanges, getInterventionDates and
+get_Intervention_times.
+"""
+
+# the year columns of a coverage file start after the seven description columns
+FIRST_YEAR_COLUMN = 7
+
+# row used by readPlatformData to pad the data of a platform with less than two campaigns
+NO_INTERVENTION = [3026.0, 2, 5, 0.6, 0, 2]
+
+# number of schedules kept by loadInterventionSchedule
+MAX_CACHED_SCHEDULES = 32
+
+_schedules = OrderedDict()
+_schedules_lock = threading.Lock()
+
+
+def _readOnly(array):
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class InterventionSchedule:
+    '''
+    The campaigns in one coverage file, in the order of readPlatformData: by year
+    column, then by row of the file.
+
+    Attributes
+    ----------
+    time : array of float
+        year of each campaign, as in the coverage file
+    min_age, max_age : array
+        age range of each campaign, in years
+    coverage : array of float
+        coverage of each campaign
+    campaign : array of int
+        row of the campaign among the rows of its platform
+    platform : array of str
+        platform (MDA, Vaccine...) of each campaign
+    rows : dict
+        for each platform, its (min_age, max_age) rows of the file
+    '''
+    time: ndarray
+    min_age: ndarray
+    max_age: ndarray
+    coverage: ndarray
+    campaign: ndarray
+    platform: ndarray
+    rows: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_frame(cls, PlatCov):
+        '''
+        Schedule of a coverage data frame, as read from a coverage file by pd.read_csv.
+        '''
+        platforms = PlatCov['Platform'].to_numpy()
+        years = np.array([float(column) for column in PlatCov.columns[FIRST_YEAR_COLUMN:]])
+        coverage = PlatCov.iloc[:, FIRST_YEAR_COLUMN:].to_numpy(dtype=float)
+        minAge = PlatCov['min age'].to_numpy()
+        maxAge = PlatCov['max age'].to_numpy()
+        # row of each row of the file among the rows of its platform
+        rowInPlatform = PlatCov.groupby('Platform', sort=False).cumcount().to_numpy()
+
+        # the transpose puts the campaigns in order of year column, then row
+        column, row = np.nonzero(coverage.T > 0)
+        rows = {platform: (_readOnly(minAge[platforms == platform]), _readOnly(maxAge[platforms == platform]))
+                for platform in pd.unique(platforms)}
+        return cls(time=_readOnly(years[column]), min_age=_readOnly(minAge[row]), max_age=_readOnly(maxAge[row]),
+                   coverage=_readOnly(coverage[row, column]), campaign=_readOnly(rowInPlatform[row]),
+                   platform=_readOnly(platforms[row]), rows=rows)
+
+    def select(self, platform):
+        '''
+        Indices of the campaigns of platform.
+        '''
+        return np.where(self.platform == platform)[0]
+
+    def platformData(self, platform):
+        '''
+        MDAData or VaccData of platform, as returned by readPlatformData.
+        '''
+        campaigns = self.select(platform)
+        nRows = len(self.rows[platform][0]) if platform in self.rows else 0
+        PlatformData = [[float(self.time[c]), self.min_age[c], self.max_age[c], self.coverage[c],
+                         self.campaign[c], nRows] for c in campaigns]
+        # readPlatformData always returns at least two campaigns
+        while len(PlatformData) < 2:
+            PlatformData.append(list(NO_INTERVENTION))
+        return PlatformData
+
+    def ageRanges(self, platform):
+        '''
+        Age ranges of the rows of platform, as returned by getInterventionAgeRanges.
+        '''
+        minAge, maxAge = self.rows.get(platform, ([], []))
+        InterventionAgeRanges = np.zeros([len(minAge), 2], dtype=object)
+        InterventionAgeRanges[:, 0] = list(minAge)
+        InterventionAgeRanges[:, 1] = list(maxAge)
+        return InterventionAgeRanges
+
+    def dates(self, platform):
+        '''
+        Dates of the campaigns of platform, as returned by getInterventionDates.
+        '''
+        return list(interventionDates(self._times(platform)).astype(date))
+
+    def weeks(self, platform, Start_date, burnin):
+        '''
+        Simulation week of each campaign of platform, as returned by get_Intervention_times.
+        '''
+        return interventionWeeks(interventionDates(self._times(platform)), Start_date, burnin)
+
+    def _times(self, platform):
+        return np.array([row[0] for row in self.platformData(platform)])
+
+
+def interventionDates(times):
+    '''
+    First day of the month of each time in years, as an array of datetime64.
+    '''
+    times = np.asarray(times, dtype=float)
+    years = times.astype(int)
+    months = np.round(12 * (times - years)).astype(int)
+    return ((years - 1970) * 12 + months).astype('datetime64[M]').astype('datetime64[D]')
+
+
+def interventionWeeks(dates, Start_date, burnin):
+    '''
+    Simulation week of each date, counting from Start_date at week burnin.
+    '''
+    days = (np.asarray(dates, dtype='datetime64[D]') - np.datetime64(Start_date, 'D')).astype(int)
+    return burnin + (days / 7).astype(int)
+
+
+def loadInterventionSchedule(path):
+    '''
+    InterventionSchedule of the coverage file at path. The schedules of the
+    MAX_CACHED_SCHEDULES most recently used files are kept, and a file is read
+    again if it has been modified since it was last read.
+    '''
+    path = Path(path).resolve()
+    key = (str(path), os.stat(path).st_mtime_ns)
+    with _schedules_lock:
+        schedule = _schedules.get(key)
+        if schedule is not None:
+            _schedules.move_to_end(key)
+            return schedule
+    # the file is parsed without the lock, so threads reading different files don't wait for each other
+    schedule = InterventionSchedule.from_frame(pd.read_csv(path))
+    with _schedules_lock:
+        _schedules[key] = schedule
+        while len(_schedules) > MAX_CACHED_SCHEDULES:
+            _schedules.popitem(last=False)
+    return schedule
+
+
+def clearScheduleCache():
+    with _schedules_lock:
+        _schedules.clear()
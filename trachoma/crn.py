@@ -0,0 +1,152 @@
+import numpy as np
+
+"""
+Common random numbers for comparing scenarios.
+
+The differences between scenarios, e.g. in the prevalence in a given year, are
+estimated from draws run under each scenario with the same numpy_state. With one
+random stream for the whole simulation the runs of a draw under two scenarios
+share their random numbers only until the first MDA or vaccination that differs
+between them, after which every draw comes at a different point of the stream,
+so the difference between them is as variable as that of two unrelated runs.
+
+CommonRandomNumbers gives each stochastic process of the model its own stream
+in each week, seeded by (crn_seed, draw, process, week), so that the runs of a draw
+under different scenarios use the same random numbers for the same process in
+the same week, whatever happened before. The processes are
+
+    importation   who is imported, and their ages and periods of infection
+    infection     who is infected
+    demography    who dies, and the periods of infection of the newborns
+    compliance    treatment probabilities of newborns and imports, and their redraws
+    MDA           who is treated and cured by MDA
+    vaccination   who is vaccinated
+    survey        who is surveyed and tests positive
+
+Recovery follows from the periods of infection and disease drawn at birth or
+importation, so it has no stream of its own. Draws for people, e.g. of infection,
+are made for the whole population and indexed by person (see personUniforms),
+so that someone susceptible in both runs gets the same draw in both. Anything else,
+such as the initial state set up by run_single_simulation, is drawn from the
+CommonRandomNumbers itself, which is a np.random.RandomState.
+
+With a np.random.RandomState or np.random, streamFor returns it for every
+process, so the model draws its random numbers as before.
+
+contrastReport gives the difference between two scenarios, and how much the
+pairing of draws reduces its variance.
+"""
+
+# processes with a stream of their own
+PROCESSES = ('importation', 'infection', 'demography', 'compliance', 'MDA', 'vaccination', 'survey')
+
+
+class CommonRandomNumbers(np.random.RandomState):
+    '''
+    Random numbers of one draw, with a stream for each process in each week.
+
+    A CommonRandomNumbers can be pickled, e.g. to send it to a worker, with its
+    state and the streams of its current week.
+
+    Parameters
+    ----------
+    crn_seed : int
+        seed shared by the scenarios being compared
+    draw : int
+        index of the draw
+
+    Attributes
+    ----------
+    week : int
+        week of the simulation, set with setWeek
+    '''
+
+    def __init__(self, crn_seed, draw=0):
+        super().__init__(crn_seed)
+        self.crn_seed = crn_seed
+        self.draw = draw
+        self.week = 0
+        self._streams = {}
+
+    def setWeek(self, week):
+        '''
+        Start the streams of week.
+        '''
+        if week != self.week:
+            self.week = week
+            self._streams = {}
+
+    def stream(self, process):
+        '''
+        The random stream of process in the current week.
+        '''
+        if process not in self._streams:
+            key = (self.draw, PROCESSES.index(process), self.week)
+            sequence = np.random.SeedSequence(self.crn_seed, spawn_key=key)
+            self._streams[process] = np.random.RandomState(np.random.PCG64(sequence))
+        return self._streams[process]
+
+    def __reduce__(self):
+        # RandomState's own __reduce__ would rebuild a plain RandomState
+        return (type(self), (self.crn_seed, self.draw), (self.get_state(), self.week, self._streams))
+
+    def __setstate__(self, state):
+        randomState, self.week, self._streams = state
+        self.set_state(randomState)
+
+
+def streamFor(rng, process):
+    '''
+    The stream of process if rng is a CommonRandomNumbers, otherwise rng.
+    '''
+    if isinstance(rng, CommonRandomNumbers):
+        return rng.stream(process)
+    return rng
+
+
+def personUniforms(rng, process, people, N):
+    '''
+    A uniform random number for each of people, out of a population of N. With common
+    random numbers each person's number doesn't depend on who else is in people.
+    '''
+    if isinstance(rng, CommonRandomNumbers):
+        return rng.stream(process).uniform(size=N)[people]
+    return rng.uniform(size=len(people))
+
+
+def contrastReport(a, b):
+    '''
+    Difference between the outputs a and b of the same draws under two scenarios.
+
+    Parameters
+    ----------
+    a, b : array
+        an output of each draw under each scenario, or a 2d array with a column
+        per output (e.g. per year)
+
+    Returns
+    -------
+    dict
+        difference : mean of b - a
+        se : standard error of the difference, with the draws paired
+        se_independent : standard error had the scenarios been run with unrelated draws
+        variance_reduction : ratio of the variance of the difference with unrelated draws
+            to that with paired draws, which is how many times as many unrelated draws
+            would give the same standard error
+    '''
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if a.shape != b.shape:
+        raise ValueError('a and b must have an output for each of the same draws')
+    n = a.shape[0]
+    if n < 2:
+        raise ValueError('at least two draws are needed')
+    paired = np.var(b - a, axis=0, ddof=1)
+    independent = np.var(a, axis=0, ddof=1) + np.var(b, axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reduction = independent / paired
+    return {'difference': np.mean(b - a, axis=0),
+            'se': np.sqrt(paired / n),
+            'se_independent': np.sqrt(independent / n),
+            'variance_reduction': reduction,
+            'draws': n}
@@ -0,0 +1,259 @@
+"""
+Emulator of the outputs of the model, for screening IU and scenario combinations
+before running them in full.
+
+The emulator is a Gaussian process regression fitted to the outputs of runs
+which have already been done. Each run, of an IU under a scenario, is a row of
+a training table with the inputs (FEATURES: beta, baseline prevalence, the MDA
+schedule as its number of rounds and mean coverage, rho and the vaccine) and the
+outputs (the mean over its draws of the true prevalence in 1-9 year olds in each
+year, as columns prevalence_0, prevalence_1, ..., and the probability of
+elimination, as elimination_probability). trainingRow makes such a row from the
+DrawSummary of each draw of a run (see trachoma.reduction). The probability of
+elimination is that of there being no infection or disease at the last output
+time, as in trachoma.adaptive.trueElimination, which is what the simulations
+report.
+
+For a new combination the emulator predicts each output with a standard deviation,
+which is small near runs it has been trained on and large far from them, so the
+combinations where the standard deviation is large are those which still need to
+be simulated.
+
+The emulator is saved to an .npz file (with the extension added to the path if
+it hasn't one), and can be trained on new runs as they are
+done and used to screen combinations from the command line:
+
+    python -m trachoma.emulator train emulator.npz runs.csv [more_runs.csv ...]
+    python -m trachoma.emulator screen emulator.npz cells.csv -o flagged.csv --max-sd 0.05
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from trachoma.adaptive import trueElimination
+
+# inputs of the emulator
+FEATURES = ('beta', 'baseline_prevalence', 'mda_rounds', 'mda_coverage', 'rho', 'vacc_coverage',
+            'vacc_prob_block_transmission', 'vacc_waning_length')
+
+# log length scales and noise variances tried when fitting
+LENGTH_SCALES = np.log([0.25, 0.5, 1, 2, 4, 8])
+NOISE_VARIANCES = np.log([1e-6, 1e-4, 1e-3, 1e-2, 1e-1])
+
+
+def targetColumns(columns):
+    '''
+    The outputs emulated among columns of a training table.
+    '''
+    prevalence = sorted((c for c in columns if c.startswith('prevalence_')), key=lambda c: int(c.split('_')[1]))
+    return prevalence + [c for c in columns if c == 'elimination_probability']
+
+
+def trainingRow(features, summaries):
+    '''
+    Training row of a run from its inputs and the DrawSummary of each of its draws. The
+    probability of elimination is the fraction of draws with no infection or disease at
+    the last output time (see trachoma.adaptive.trueElimination).
+    '''
+    row = dict(features)
+    for year, prevalence in enumerate(np.mean([summary.NTDMC for summary in summaries], axis=0)):
+        row['prevalence_' + str(year)] = prevalence
+    row['elimination_probability'] = np.mean([trueElimination(summary)[-1] for summary in summaries])
+    return row
+
+
+def _npzPath(path):
+    # np.savez adds the extension if the path hasn't got it
+    path = os.fspath(path)
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+def _sqDistances(a, b, lengthScales):
+    a = a / lengthScales
+    b = b / lengthScales
+    return np.maximum((a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2 * a @ b.T, 0)
+
+
+class Emulator:
+    '''
+    Gaussian process emulator of the outputs of the model.
+
+    The inputs are scaled to unit standard deviation and the outputs to zero mean and unit
+    standard deviation. All the outputs share a squared exponential kernel with a length
+    scale for each input, and a noise variance, chosen to maximise the sum of their
+    marginal likelihoods.
+
+    Parameters
+    ----------
+    features : sequence
+        names of the inputs
+    targets : sequence
+        names of the outputs
+    '''
+
+    def __init__(self, features=FEATURES, targets=()):
+        self.features = list(features)
+        self.targets = list(targets)
+        self.X = np.zeros((0, len(self.features)))
+        self.Y = np.zeros((0, len(self.targets)))
+        self.logLengthScales = np.zeros(len(self.features))
+        self.logNoise = np.log(1e-4)
+
+    def add(self, table, optimise=True):
+        '''
+        Add the runs in the training table (a data frame with the features and targets as
+        columns) and refit. Runs with the same inputs as one already added replace it. If
+        optimise is False the kernel isn't fitted again, which is quicker for a few new runs.
+        '''
+        if len(self.targets) == 0:
+            self.targets = targetColumns(table.columns)
+        missing = [c for c in self.features + self.targets if c not in table.columns]
+        if missing:
+            raise ValueError(f'the training table has no columns {missing}')
+        X = table[self.features].to_numpy(dtype=float)
+        Y = table[self.targets].to_numpy(dtype=float)
+        if len(self.X) > 0:
+            X, Y = np.vstack([self.X, X]), np.vstack([self.Y, Y])
+        # keep the last of the runs with the same inputs
+        _, last = np.unique(X[::-1], axis=0, return_index=True)
+        keep = np.sort(len(X) - 1 - last)
+        self.X, self.Y = X[keep], Y[keep]
+        self.fit(optimise)
+        return self
+
+    def _scaled(self, X):
+        return (X - self._xMean) / self._xScale
+
+    def _logLikelihood(self, logLengthScales, logNoise):
+        K = np.exp(-0.5 * _sqDistances(self._x, self._x, np.exp(logLengthScales)))
+        K[np.diag_indices_from(K)] += np.exp(logNoise)
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, self._y))
+        return -0.5 * np.sum(self._y * alpha) - self._y.shape[1] * np.sum(np.log(np.diag(L)))
+
+    def fit(self, optimise=True):
+        '''
+        Fit the emulator to the runs added. If optimise is True the kernel is chosen by
+        coordinate search over LENGTH_SCALES and NOISE_VARIANCES.
+        '''
+        if len(self.X) == 0:
+            raise ValueError('the emulator has no runs to fit')
+        self._xMean = self.X.mean(axis=0)
+        self._xScale = np.where(self.X.std(axis=0) > 0, self.X.std(axis=0), 1)
+        self._yMean = self.Y.mean(axis=0)
+        self._yScale = np.where(self.Y.std(axis=0) > 0, self.Y.std(axis=0), 1)
+        self._x = self._scaled(self.X)
+        self._y = (self.Y - self._yMean) / self._yScale
+        if optimise:
+            best = self._logLikelihood(self.logLengthScales, self.logNoise)
+            for sweep in range(3):
+                improved = False
+                for d in range(len(self.features) + 1):
+                    for value in (NOISE_VARIANCES if d == len(self.features) else LENGTH_SCALES):
+                        logLengthScales, logNoise = self.logLengthScales.copy(), self.logNoise
+                        if d == len(self.features):
+                            logNoise = value
+                        else:
+                            logLengthScales[d] = value
+                        likelihood = self._logLikelihood(logLengthScales, logNoise)
+                        if likelihood > best:
+                            best, improved = likelihood, True
+                            self.logLengthScales, self.logNoise = logLengthScales, logNoise
+                if not improved:
+                    break
+        K = np.exp(-0.5 * _sqDistances(self._x, self._x, np.exp(self.logLengthScales)))
+        K[np.diag_indices_from(K)] += np.exp(self.logNoise)
+        self._L = np.linalg.cholesky(K)
+        self._alpha = np.linalg.solve(self._L.T, np.linalg.solve(self._L, self._y))
+        return self
+
+    def predict(self, table):
+        '''
+        Predicted outputs for the inputs in table, as data frames of the means and standard
+        deviations of the targets. Probabilities of elimination are kept between 0 and 1.
+        '''
+        x = self._scaled(table[self.features].to_numpy(dtype=float))
+        k = np.exp(-0.5 * _sqDistances(x, self._x, np.exp(self.logLengthScales)))
+        mean = k @ self._alpha * self._yScale + self._yMean
+        v = np.linalg.solve(self._L, k.T)
+        sd = np.sqrt(np.maximum(1 - (v ** 2).sum(axis=0), 0))[:, None] * self._yScale
+        mean = pd.DataFrame(mean, columns=self.targets, index=table.index)
+        if 'elimination_probability' in mean:
+            mean['elimination_probability'] = mean['elimination_probability'].clip(0, 1)
+        return mean, pd.DataFrame(sd, columns=self.targets, index=table.index)
+
+    def screen(self, table, max_sd):
+        '''
+        Predictions for the cells (e.g. IU and scenario) in table, with a column 'simulate'
+        which is True where the standard deviation of any output is more than max_sd.
+        '''
+        mean, sd = self.predict(table)
+        screened = table.copy()
+        for target in self.targets:
+            screened[target] = mean[target]
+            screened[target + '_sd'] = sd[target]
+        screened['simulate'] = (sd > max_sd).any(axis=1)
+        return screened
+
+    def save(self, path):
+        '''
+        Save the runs and kernel of the emulator to the .npz file path.
+        '''
+        np.savez(_npzPath(path), features=np.array(self.features), targets=np.array(self.targets), X=self.X, Y=self.Y,
+                 logLengthScales=self.logLengthScales, logNoise=self.logNoise)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Emulator saved with save.
+        '''
+        with np.load(_npzPath(path)) as data:
+            emulator = cls(list(data['features']), list(data['targets']))
+            emulator.X, emulator.Y = data['X'], data['Y']
+            emulator.logLengthScales, emulator.logNoise = data['logLengthScales'], float(data['logNoise'])
+        if len(emulator.X) > 0:
+            emulator.fit(optimise=False)
+        return emulator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    train = commands.add_parser('train', help='train the emulator on new runs, creating it if needed')
+    train.add_argument('model', help='path of the .npz file of the emulator')
+    train.add_argument('runs', nargs='+', help='CSV files of training rows')
+    train.add_argument('--features', nargs='+', default=list(FEATURES), help='inputs of a new emulator')
+    train.add_argument('--no-optimise', action='store_true', help="don't fit the kernel again")
+    screen = commands.add_parser('screen', help='predict the outputs of cells and flag those to simulate')
+    screen.add_argument('model', help='path of the .npz file of the emulator')
+    screen.add_argument('cells', help='CSV file with the inputs of each cell')
+    screen.add_argument('-o', '--output', help='CSV file to write the predictions to, by default standard output')
+    screen.add_argument('--max-sd', type=float, default=0.05,
+                        help='standard deviation of an output above which a cell is flagged')
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        if os.path.exists(_npzPath(args.model)):
+            emulator = Emulator.load(args.model)
+        else:
+            emulator = Emulator(args.features)
+        runs = pd.concat([pd.read_csv(path) for path in args.runs], ignore_index=True)
+        emulator.add(runs, optimise=not args.no_optimise).save(args.model)
+        print(f'{args.model}: {len(emulator.X)} runs, length scales '
+              f'{np.round(np.exp(emulator.logLengthScales), 3).tolist()}')
+    else:
+        emulator = Emulator.load(args.model)
+        screened = emulator.screen(pd.read_csv(args.cells), args.max_sd)
+        screened.to_csv(args.output if args.output else sys.stdout, index=False)
+        print(f"{int(screened['simulate'].sum())} of {len(screened)} cells need simulating", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,400 @@
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import trachoma.trachoma_functions as tf
+from trachoma.parameters import derived
+from trachoma.schedules import simulationSchedules
+from trachoma.vaccination import waningTable
+
+"""
+Deterministic mean-field counterpart of the individual-based model, giving the
+expected trajectory of an IU in a fraction of the time of a single draw.
+
+The state is the fraction of the population in each compartment, by vaccination
+stratum, age class (of ageWidth weeks, a quarter of a year by default) and
+number of infections (up to maxInfections, which few people reach). The
+compartments follow the states of a person in stepF_fixed:
+
+    S          susceptible, neither infected nor diseased
+    LATENT     infected but not yet diseased, in one stage for each week of
+               av_I_duration, for people who were (LATENT_D) and weren't (LATENT)
+               still diseased from their last infection when reinfected
+    ID         infected and diseased, with a bacterial load
+    D          diseased after clearing the infection
+    D_CURED    diseased after having the infection cured by MDA. These people
+               have no disease period, so stay diseased until reinfected
+
+The infection pressure on each age group is calculated by getGroupLambdas from
+the bacterial load of each compartment (bacterialLoad) and the per week beta and
+importation rate are those of simulationSchedules, so the mixing and schedules
+are the same as those of the simulation. People leave ID and D at a constant
+rate, one over the expected period given by ID_period_function and
+D_period_function over the distribution of the baseline periods. Each MDA cures
+MDA_Eff (half of it in babies) of the proportion cov of each age range treated,
+and each vaccination round moves cov of the people in its age range into a new
+stratum, whose protection against transmission wanes with the time since the round.
+
+The approximations are that people leave an age class at rate 1 / ageWidth, so
+the ages of a cohort spread out (more with wider classes, which lowers the
+prevalence in children), the ID and D periods are geometric rather than fixed,
+and there is no memory of a person's baseline periods or of who was treated
+before, so systematic non-compliance has no effect. Surveys aren't modelled, so
+the trajectory corresponds to simulations with doSurvey False.
+
+    trajectory = run_meanfield(None, params, timesim, burnin, demog, beta, MDA_times, MDAData,
+                               vacc_times, VaccData)
+    trajectory.ntdmc(burnin), meanFieldGap(trajectory, getResultsNTDMC(results, Start_date, burnin), burnin)
+"""
+
+# compartments, followed by the latent stages
+S, ID, D, D_CURED, LATENT = 0, 1, 2, 3, 4
+
+
+def _basePeriods(mean, distToUse):
+    '''
+    Baseline periods and their probabilities, as drawn in Set_inits.
+    '''
+    if distToUse == "Poisson":
+        bases = np.arange(1, int(mean + 10 * math.sqrt(mean)) + 10)
+        p = np.exp(bases * math.log(mean) - mean - np.array([math.lgamma(b + 1) for b in bases]))
+    else:
+        # rounded exponential periods, with periods of 0 made 1
+        bases = np.arange(1, int(20 * mean) + 2)
+        p = np.exp(-np.maximum(bases - 0.5, 0) / mean) - np.exp(-(bases + 0.5) / mean)
+        p[0] = 1 - math.exp(-1.5 / mean)
+    return bases.astype(float), p / p.sum()
+
+
+def expectedPeriods(params, distToUse="Poisson", maxInfections=20):
+    '''
+    Expected ID period of unvaccinated and vaccinated people, as an array of shape
+    (2, maxInfections + 1), and expected D period, for each number of infections.
+    '''
+    counts = np.arange(1, maxInfections + 1)
+    bases, p = _basePeriods(params['av_ID_duration'], distToUse)
+    periodID = np.zeros((2, maxInfections + 1))
+    for vaccinated in (0, 1):
+        vals = {'Ind_ID_period_base': np.repeat(bases, len(counts)), 'No_Inf': np.tile(counts, len(bases)),
+                'vaccinated': np.full(len(bases) * len(counts), bool(vaccinated))}
+        periods = tf.ID_period_function(np.arange(len(bases) * len(counts)), params, vals)
+        periodID[vaccinated, 1:] = p @ periods.reshape(len(bases), len(counts))
+    bases, p = _basePeriods(params['av_D_duration'], distToUse)
+    periods = tf.D_period_function(np.repeat(bases, len(counts)), np.tile(counts, len(bases)), params, None)
+    periodD = np.concatenate([[0], p @ periods.reshape(len(bases), len(counts))])
+    # nobody infected has had no infections, so these are only placeholders
+    periodID[:, 0], periodD[0] = periodID[:, 1], periodD[1]
+    return np.maximum(periodID, 1), np.maximum(periodD, 1)
+
+
+class MeanFieldModel:
+    '''
+    Constants of the mean-field model of params and demog.
+
+    Parameters
+    ----------
+    distToUse : str
+        distribution of the baseline periods, as for sim_Ind_MDA_Include_Survey
+    ageWidth : int
+        width of the age classes in weeks
+    maxInfections : int
+        largest number of infections kept track of
+    '''
+
+    def __init__(self, params, demog, distToUse="Poisson", ageWidth=13, maxInfections=20):
+        self.params, self.demog = params, demog
+        self.ageWidth = ageWidth
+        self.maxInfections = maxInfections
+        self.nAges = int(math.ceil(demog['max_age'] / ageWidth))
+        self.nLatent = max(1, int(round(params['av_I_duration'])))
+        self.nCompartments = LATENT + 2 * self.nLatent
+        self.ageLower = np.arange(self.nAges) * ageWidth
+        # age group of each class (young children, older children or adults) by its youngest age
+        limits = [derived(params, 'young_child_max_age'), derived(params, 'older_child_max_age')]
+        self.groups = np.searchsorted(limits, self.ageLower, side='right')
+        self.groupMatrix = np.eye(3)[self.groups]
+        counts = np.tile(np.arange(maxInfections + 1), 2)
+        vaccinated = np.repeat([False, True], maxInfections + 1)
+        self.load = tf.bacterialLoad(params, {'No_Inf': counts, 'T_ID': np.ones(len(counts)),
+                                              'vaccinated': vaccinated}).reshape(2, maxInfections + 1)
+        periodID, periodD = expectedPeriods(params, distToUse, maxInfections)
+        self.leaveID, self.leaveD = 1 / periodID, 1 / periodD
+        self.death = derived(demog, 'death_probability')
+        ages, proportions = derived(demog, 'import_ages'), derived(demog, 'import_age_probabilities')
+        self.equilibriumAges = np.bincount(np.minimum(ages // ageWidth, self.nAges - 1), weights=proportions,
+                                           minlength=self.nAges)
+        self.children = self.ageFractions(52, 10 * 52)
+        self.waning = waningTable(params['vacc_prob_block_transmission'], params['vacc_waning_length'])
+
+    def ageFractions(self, lower=None, upper=None, closed='left'):
+        '''
+        Fraction of each age class with lower <= age < upper, in weeks, or lower < age <= upper
+        if closed is 'right', taking the ages in a class to be equally common.
+        '''
+        lower = 0 if lower is None else lower + (closed == 'right')
+        upper = np.inf if upper is None else upper + (closed == 'right')
+        overlap = np.minimum(upper, self.ageLower + self.ageWidth) - np.maximum(lower, self.ageLower)
+        return np.clip(overlap, 0, self.ageWidth) / self.ageWidth
+
+    def protection(self, state):
+        '''
+        Reduction in the infection pressure on each vaccination stratum of state.
+        '''
+        weeks = np.array([state.week - w if w is not None else len(self.waning) for w in state.vaccinationWeeks])
+        return np.where(weeks < len(self.waning), self.waning[np.minimum(weeks, len(self.waning) - 1)], 0)
+
+
+@dataclass
+class MeanFieldState:
+    '''
+    State of the mean-field model.
+
+    Attributes
+    ----------
+    X : array
+        fraction of the population in each compartment, vaccination stratum, age class
+        and number of infections
+    vaccinationWeeks : list
+        week of the vaccination round of each stratum, None for the unvaccinated
+    week : int
+        next week to simulate
+    '''
+    X: np.ndarray
+    vaccinationWeeks: list = field(default_factory=lambda: [None])
+    week: int = 0
+
+    def copy(self):
+        return MeanFieldState(self.X.copy(), list(self.vaccinationWeeks), self.week)
+
+    def diseased(self, model):
+        '''
+        Fraction of the population diseased in each age class.
+        '''
+        X = self.X
+        return X[[ID, D, D_CURED]].sum(axis=(0, 1, 3)) + X[LATENT + model.nLatent:].sum(axis=(0, 1, 3))
+
+    def infected(self, model):
+        '''
+        Fraction of the population infected in each age class.
+        '''
+        return self.X[ID].sum(axis=(0, 2)) + self.X[LATENT:].sum(axis=(0, 1, 3))
+
+    def ageSizes(self):
+        return self.X.sum(axis=(0, 1, 3))
+
+
+def initialState(model):
+    '''
+    State of a population made by Set_inits and Seed_infection: ages in equilibrium,
+    1% infected and at the start of their latent period.
+    '''
+    X = np.zeros((model.nCompartments, 1, model.nAges, model.maxInfections + 1))
+    X[S, 0, :, 0] = 0.99 * model.equilibriumAges
+    X[LATENT, 0, :, 1] = 0.01 * model.equilibriumAges
+    return MeanFieldState(X)
+
+
+def populationState(vals, model):
+    '''
+    State of the population vals, as returned by Set_inits or a previous simulation.
+    Everyone vaccinated is put in one stratum, vaccinated their mean time since
+    vaccination ago.
+    '''
+    nLatent = model.nLatent
+    N = len(vals['IndI'])
+    IndI, IndD = vals['IndI'] == 1, vals['IndD'] == 1
+    latent = IndI & (vals['T_latent'] > 0)
+    stage = np.clip(nLatent - vals['T_latent'], 0, nLatent - 1).astype(int)
+    compartment = np.select([latent, IndI, IndD & (vals['T_D'] > 0), IndD],
+                            [LATENT + stage + nLatent * IndD, ID, D, D_CURED], S)
+    vaccinated = np.asarray(vals['vaccinated'], dtype=bool)
+    ages = np.minimum(np.asarray(vals['Age']) // model.ageWidth, model.nAges - 1).astype(int)
+    counts = np.minimum(vals['No_Inf'], model.maxInfections).astype(int)
+    vaccinationWeeks = [None]
+    if np.any(vaccinated):
+        vaccinationWeeks.append(-int(round(np.mean(vals['time_since_vaccinated'][vaccinated]))))
+    X = np.zeros((model.nCompartments, len(vaccinationWeeks), model.nAges, model.maxInfections + 1))
+    np.add.at(X, (compartment, vaccinated.astype(int), ages, counts), 1 / N)
+    return MeanFieldState(X, vaccinationWeeks)
+
+
+def _infect(X):
+    # move people up one infection, keeping those at the most infections there
+    infected = np.zeros_like(X)
+    infected[..., 1:] = X[..., :-1]
+    infected[..., -1] += X[..., -1]
+    return infected
+
+
+def stepMeanField(state, model, bet, importation_rate=0):
+    '''
+    Expected transitions in a week without MDA, as stepF_fixed.
+    '''
+    X, nLatent = state.X, model.nLatent
+    vaccinated = np.minimum(np.arange(X.shape[1]), 1)
+    if importation_rate > 0:
+        # imported people replace people chosen at random, and are infected and diseased
+        meanInfections = X.sum(axis=(0, 1, 2)) @ np.arange(model.maxInfections + 1)
+        X *= 1 - importation_rate
+        X[ID, 0, :, min(max(1, round(meanInfections)), model.maxInfections)] += (importation_rate *
+                                                                                  model.equilibriumAges)
+
+    # infection pressure on each stratum and age class
+    loads = np.einsum('vak,vk->a', X[ID], model.load[vaccinated])
+    N = model.params['N']
+    A = np.array(tf.getGroupLambdas(model.params, bet, loads @ model.groupMatrix * N,
+                                    state.ageSizes() @ model.groupMatrix * N))
+    lambdas = (1 - model.protection(state))[:, None] * A[model.groups][None, :]
+    infectS = (1 - np.exp(-lambdas))[..., None]
+    # the infection pressure on people who are diseased is halved
+    infectD = (1 - np.exp(-0.5 * lambdas))[..., None]
+
+    leaveID = model.leaveID[vaccinated][:, None, :]
+    newX = np.empty_like(X)
+    infectedS = X[S] * infectS
+    remainingD = X[D] * (1 - infectD)
+    newX[S] = X[S] - infectedS + remainingD * model.leaveD
+    newX[ID] = X[ID] * (1 - leaveID) + X[LATENT + nLatent - 1] + X[LATENT + 2 * nLatent - 1]
+    newX[D] = remainingD * (1 - model.leaveD) + X[ID] * leaveID
+    newX[D_CURED] = X[D_CURED] * (1 - infectD)
+    newX[LATENT] = _infect(infectedS)
+    newX[LATENT + 1:LATENT + nLatent] = X[LATENT:LATENT + nLatent - 1]
+    newX[LATENT + nLatent] = _infect((X[D] + X[D_CURED]) * infectD)
+    newX[LATENT + nLatent + 1:] = X[LATENT + nLatent:LATENT + 2 * nLatent - 1]
+
+    # ageing and deaths, with everyone who dies replaced by a newborn
+    newX *= 1 - model.death
+    ageing = newX / model.ageWidth
+    newX -= ageing
+    newX[:, :, 1:] += ageing[:, :, :-1]
+    newX[S, 0, 0, 0] += 1 - newX.sum()
+    state.X = newX
+    state.week += 1
+    return state
+
+
+def mdaMeanField(state, model, ageStart, ageEnd, cov):
+    '''
+    Expected effect of an MDA of the ages ageStart to ageEnd in years with coverage cov,
+    as MDA_timestep_Age_range.
+    '''
+    eff = model.params['MDA_Eff']
+    if ageStart * 52 <= 26:
+        # babies are treated at half the efficacy
+        cure = cov * eff * (0.5 * model.ageFractions(upper=27) + model.ageFractions(26, ageEnd * 52, 'right'))
+    else:
+        cure = cov * eff * model.ageFractions(ageStart * 52, ageEnd * 52, 'right')
+    X, nLatent = state.X, model.nLatent
+    cure = cure[None, :, None]
+    curedLatent = X[LATENT:] * cure
+    curedID = X[ID] * cure
+    X[LATENT:] -= curedLatent
+    X[ID] -= curedID
+    # people who were diseased before their infection stay diseased
+    X[S] += curedLatent[:nLatent].sum(axis=0)
+    X[D_CURED] += curedLatent[nLatent:].sum(axis=0) + curedID
+    return state
+
+
+def vaccinateMeanField(state, model, ageStart, ageEnd, cov):
+    '''
+    Expected effect of vaccinating the ages ageStart to ageEnd in years with coverage cov,
+    as doVaccAgeRange. The people vaccinated are moved to a new stratum, and strata
+    vaccinated so long ago that they aren't protected are merged.
+    '''
+    vaccinated = state.X * (cov * model.ageFractions(ageStart * 52, ageEnd * 52))[None, None, :, None]
+    state.X = np.concatenate([state.X - vaccinated, vaccinated.sum(axis=1, keepdims=True)], axis=1)
+    state.vaccinationWeeks.append(state.week)
+    waned = [v for v, w in enumerate(state.vaccinationWeeks)
+             if w is not None and state.week - w >= len(model.waning)]
+    if len(waned) > 1:
+        state.X[:, waned[0]] = state.X[:, waned].sum(axis=1)
+        keep = [v for v in range(len(state.vaccinationWeeks)) if v not in waned[1:]]
+        state.X = state.X[:, keep]
+        state.vaccinationWeeks = [state.vaccinationWeeks[v] for v in keep]
+    return state
+
+
+@dataclass
+class MeanFieldTrajectory:
+    '''
+    Expected trajectory returned by run_meanfield.
+
+    Attributes
+    ----------
+    prevalence : array
+        true prevalence of disease in 1-9 year olds after each week, as
+        vals['True_Prev_Disease_children_1_9'] of a simulation
+    infections : array
+        true prevalence of infection in 1-9 year olds after each week
+    state : MeanFieldState
+        state at the end, which can be continued with run_meanfield
+    model : MeanFieldModel
+    '''
+    prevalence: np.ndarray
+    infections: np.ndarray
+    state: MeanFieldState
+    model: MeanFieldModel
+
+    def ntdmc(self, burnin):
+        '''
+        Prevalence at the end of the burnin and every 52 weeks after, as getDrawNTDMC.
+        '''
+        return tf.getDrawNTDMC({'True_Prev_Disease_children_1_9': self.prevalence}, burnin)
+
+
+def run_meanfield(pickleData, params, timesim, burnin, demog, beta, MDA_times, MDAData, vacc_times, VaccData,
+                  distToUse="Poisson", ageWidth=13, maxInfections=20, state=None):
+    '''
+    Expected trajectory of simulations with the same arguments as run_single_simulation
+    (with doSurvey False).
+
+    Parameters
+    ----------
+    pickleData : dict
+        starting population, or None for one made by Set_inits and Seed_infection
+    state : MeanFieldState
+        state to start from instead of pickleData, e.g. that of a previous trajectory
+    ageWidth, maxInfections :
+        as for MeanFieldModel
+
+    Returns
+    -------
+    MeanFieldTrajectory
+    '''
+    model = MeanFieldModel(params, demog, distToUse, ageWidth, maxInfections)
+    if state is not None:
+        state = state.copy()
+        state.week = 0
+    elif pickleData is not None:
+        state = populationState(pickleData, model)
+    else:
+        state = initialState(model)
+    schedules = simulationSchedules(params, beta, timesim, burnin)
+    prevalence, infections = np.zeros(timesim), np.zeros(timesim)
+    for i in range(timesim):
+        for r in np.flatnonzero(MDA_times == i):
+            mdaMeanField(state, model, MDAData[r][1], MDAData[r][2], MDAData[r][3])
+        for r in np.flatnonzero(vacc_times == i):
+            vaccinateMeanField(state, model, VaccData[r][1], VaccData[r][2], VaccData[r][3])
+        stepMeanField(state, model, schedules['beta'][i], schedules['importation_rate'][i])
+        children = state.ageSizes() @ model.children
+        prevalence[i] = state.diseased(model) @ model.children / children
+        infections[i] = state.infected(model) @ model.children / children
+    return MeanFieldTrajectory(prevalence=prevalence, infections=infections, state=state, model=model)
+
+
+def meanFieldGap(trajectory, ntdmc, burnin):
+    '''
+    Mean over the draws of the NTDMC output of simulations (from getResultsNTDMC or
+    mergeNTDMC) in each year, the mean-field prevalence and the difference between them.
+    A large difference shows that the outcome of an IU depends on chance events, such
+    as fade-out, which the mean-field model can't capture, so that it needs simulating.
+    '''
+    draws = ntdmc[[c for c in ntdmc.columns if str(c).startswith('draw_')]].to_numpy(dtype=float)
+    meanField = trajectory.ntdmc(burnin)[:len(draws)]
+    stochastic = draws.mean(axis=1)[:len(meanField)]
+    return pd.DataFrame({'Time': ntdmc['Time'].to_numpy()[:len(meanField)], 'stochastic': stochastic,
+                         'meanfield': meanField, 'difference': stochastic - meanField})
@@ -0,0 +1,210 @@
+import dataclasses
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+import numpy as np
+
+"""
+Compiled model parameters and demography.
+
+The simulation functions read their parameters from dictionaries by key, and
+recompute constants derived from them, such as 1 / min_ID or the probability of
+dying each week, every time they are called. ModelParams and Demography are
+immutable versions of these dictionaries which check the values once, when
+they are made with from_dict, and hold the derived constants alongside them.
+
+Both are read-only mappings, so they can be passed anywhere a params or demog
+dictionary is used, and can be shared between threads and sent to other
+processes. Functions which use a derived constant get it with derived(), which
+looks it up on a compiled object, or calculates it from a dictionary, so they
+work with either.
+
+    params = ModelParams.from_dict(params_dict)
+    demog = Demography.from_dict(demog_dict)
+    params['min_ID'], params.inv_min_ID, derived(params_dict, 'inv_min_ID')
+
+Keys which aren't model parameters (such as MDA_Cov or nweeks_year) are kept,
+and can be read by key, but aren't checked.
+"""
+
+# parameters which have to be in the range [0, 1]
+PROBABILITIES = ('epsilon', 'MDA_Eff', 'TestSensitivity', 'TestSpecificity', 'vacc_prob_block_transmission',
+                 'vacc_reduce_bacterial_load', 'vacc_reduce_duration', 'importation_rate',
+                 'importation_reduction_rate')
+
+# parameters which have to be positive
+POSITIVE = ('av_ID_duration', 'min_ID', 'av_D_duration', 'min_D', 'vacc_waning_length', 'youngChildMaxAge',
+            'olderChildMaxAge')
+
+
+def _importAges(demog):
+    # ages of imported people, and their proportions in a population in equilibrium
+    ages = np.arange(1, 1 + demog['max_age'])
+    propAges = np.empty(len(ages))
+    propAges[:-1] = np.exp(-ages[:-1] / demog['mean_age']) - np.exp(-ages[1:] / demog['mean_age'])
+    propAges[-1] = 1 - np.sum(propAges[:-1])
+    return ages, propAges
+
+
+# how each derived constant is calculated from the parameters or demography
+DERIVED = {
+    'inv_min_ID': lambda p: 1 / p['min_ID'],
+    'inv_min_D': lambda p: 1 / p['min_D'],
+    'phi_plus_1': lambda p: p['phi'] + 1,
+    'young_child_max_age': lambda p: p.get('youngChildMaxAge', 9) * 52,
+    'older_child_max_age': lambda p: p.get('olderChildMaxAge', 15) * 52,
+    'death_probability': lambda d: 1 - np.exp(- d['tau']),
+    'import_ages': lambda d: _importAges(d)[0],
+    'import_age_probabilities': lambda d: _importAges(d)[1],
+}
+
+
+def derived(params, name):
+    '''
+    Derived constant name of params or demog, which can be a dictionary or a
+    ModelParams or Demography.
+    '''
+    if isinstance(params, (ModelParams, Demography)):
+        return getattr(params, name)
+    return DERIVED[name](params)
+
+
+class _CompiledMapping(Mapping):
+    '''
+    Read-only mapping of the input fields and extra keys of a frozen dataclass.
+    Derived constants are attributes, but not keys.
+    '''
+    __slots__ = ()
+    # names of the input fields, in order and as a set, set for each subclass by _compiled
+    _input_names = ()
+    _inputs = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._inputs:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __iter__(self):
+        yield from self._input_names
+        yield from self.extra
+
+    def __len__(self):
+        return len(self._inputs) + len(self.extra)
+
+    def __reduce__(self):
+        # rebuilt from the input values, so the derived constants are recalculated
+        return (type(self).from_dict, (dict(self),))
+
+    def replace(self, **changes):
+        '''
+        Copy with some values changed.
+        '''
+        return type(self).from_dict(dict(self, **changes))
+
+    def _set_derived(self):
+        for f in dataclasses.fields(self):
+            if not f.init:
+                value = DERIVED[f.name](self)
+                if isinstance(value, np.ndarray):
+                    value.setflags(write=False)
+                object.__setattr__(self, f.name, value)
+
+    @classmethod
+    def from_dict(cls, values):
+        required = {f.name for f in dataclasses.fields(cls) if f.name in cls._inputs
+                    and f.default is dataclasses.MISSING}
+        missing = sorted(required - set(values))
+        if len(missing) > 0:
+            raise ValueError(f'{cls.__name__} is missing {", ".join(missing)}')
+        return cls(**{key: value for key, value in values.items() if key in cls._inputs},
+                   extra=MappingProxyType({key: value for key, value in values.items() if key not in cls._inputs}))
+
+
+def _compiled(cls):
+    cls._input_names = tuple(f.name for f in dataclasses.fields(cls) if f.init and f.name != 'extra')
+    cls._inputs = frozenset(cls._input_names)
+    return cls
+
+
+@_compiled
+@dataclass(frozen=True, eq=False)
+class ModelParams(_CompiledMapping):
+    '''
+    Model parameters, made from a params dictionary with ModelParams.from_dict.
+    '''
+    N: int
+    av_ID_duration: float
+    inf_red: float
+    min_ID: float
+    av_D_duration: float
+    min_D: float
+    dis_red: float
+    v_1: float
+    v_2: float
+    phi: float
+    epsilon: float
+    MDA_Eff: float
+    n_inf_sev: int
+    TestSensitivity: float
+    TestSpecificity: float
+    SecularTrendIndicator: int
+    SecularTrendYearlyBetaDecrease: float
+    vacc_prob_block_transmission: float
+    vacc_reduce_bacterial_load: float
+    vacc_reduce_duration: float
+    vacc_waning_length: float
+    importation_rate: float
+    importation_reduction_rate: float
+    # bacterial load of someone on their first infection, and its decrease with each infection
+    b1: float = 1
+    ep2: float = 0.114
+    # in years
+    youngChildMaxAge: float = 9
+    olderChildMaxAge: float = 15
+    extra: Mapping = field(default_factory=lambda: MappingProxyType({}))
+
+    inv_min_ID: float = field(init=False)
+    inv_min_D: float = field(init=False)
+    phi_plus_1: float = field(init=False)
+    # in weeks
+    young_child_max_age: float = field(init=False)
+    older_child_max_age: float = field(init=False)
+
+    def __post_init__(self):
+        if int(self.N) != self.N or self.N <= 0:
+            raise ValueError(f'N must be a positive integer, not {self.N}')
+        for name in PROBABILITIES:
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f'{name} must be between 0 and 1, not {getattr(self, name)}')
+        for name in POSITIVE:
+            if not getattr(self, name) > 0:
+                raise ValueError(f'{name} must be positive, not {getattr(self, name)}')
+        if self.youngChildMaxAge >= self.olderChildMaxAge:
+            raise ValueError('youngChildMaxAge must be less than olderChildMaxAge')
+        self._set_derived()
+
+
+@_compiled
+@dataclass(frozen=True, eq=False)
+class Demography(_CompiledMapping):
+    '''
+    Demography, made from a demog dictionary with Demography.from_dict.
+    '''
+    tau: float
+    max_age: int
+    mean_age: float
+    extra: Mapping = field(default_factory=lambda: MappingProxyType({}))
+
+    death_probability: float = field(init=False)
+    import_ages: np.ndarray = field(init=False)
+    import_age_probabilities: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        if not self.tau >= 0:
+            raise ValueError(f'tau must not be negative, not {self.tau}')
+        if int(self.max_age) != self.max_age or self.max_age <= 0:
+            raise ValueError(f'max_age must be a positive integer, not {self.max_age}')
+        if not self.mean_age > 0:
+            raise ValueError(f'mean_age must be positive, not {self.mean_age}')
+        self._set_derived()
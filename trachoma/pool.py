@@ -0,0 +1,207 @@
+import inspect
+import numbers
+import os
+import pickle
+import tempfile
+import uuid
+from collections import OrderedDict
+
+from joblib.externals.loky.process_executor import ProcessPoolExecutor
+
+import trachoma.trachoma_functions as tf
+from trachoma.arena import run_into_arena
+from trachoma.reduction import run_and_summarise
+
+"""
+A long-lived pool of worker processes for running many draws of many scenarios.
+
+joblib's Parallel sends every argument of run_single_simulation with every task,
+so the same params, demog, intervention data, output times and starting
+populations are pickled once per draw. A SimulationPool instead writes this
+static context to a temporary file once per IU or scenario, and each worker
+loads it the first time it is needed and keeps it cached, so a task is only
+(context, draw index, beta, seed). The workers are kept alive between calls,
+keeping imported modules warm, and BLAS/OpenMP are limited to one thread per
+worker so that n workers don't start n * cores threads. The pool has its own
+executor, separate from the reusable one joblib's Parallel uses, so both can be
+used at the same time.
+
+    with SimulationPool(n_workers=4) as pool:
+        for IU in IUs:
+            with pool.context(pickleData=..., params=..., timesim=..., ...) as context:
+                results = pool.run(context, betas, seeds)
+"""
+
+# environment variables read by the BLAS and OpenMP libraries numpy may be linked against
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                   'NUMEXPR_NUM_THREADS', 'BLIS_NUM_THREADS')
+
+# number of contexts kept in memory by each worker
+MAX_CACHED_CONTEXTS = 2
+
+_LOKY_HAS_ENV = 'env' in inspect.signature(ProcessPoolExecutor).parameters
+
+# contexts cached by this worker process, most recently used last
+_contexts = OrderedDict()
+
+
+def _init_worker(threads):
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    # the environment variables only apply to libraries which haven't been loaded yet
+    threadpool_limits(threads)
+
+
+def _load_context(path):
+    if path in _contexts:
+        _contexts.move_to_end(path)
+        return _contexts[path]
+    with open(path, 'rb') as f:
+        context = pickle.load(f)
+    _contexts[path] = context
+    while len(_contexts) > MAX_CACHED_CONTEXTS:
+        _contexts.popitem(last=False)
+    return context
+
+
+def _run_task(path, index, beta, seed, summary=None, arena=None):
+    context = dict(_load_context(path))
+    pickleData = context.pop('pickleData')
+    if isinstance(pickleData, (list, tuple)):
+        pickleData = pickleData[index]
+    numpy_state = tf.seed_to_state(int(seed)) if isinstance(seed, numbers.Integral) else seed
+    kwargs = dict(pickleData=pickleData, beta=beta, index=index, numpy_state=numpy_state, **context)
+    if arena is not None:
+        return run_into_arena(arena, **kwargs)
+    if summary is not None:
+        return run_and_summarise(summary, **kwargs)
+    return tf.run_single_simulation(**kwargs)
+
+
+class SimulationContext:
+    '''
+    The static arguments of run_single_simulation for one scenario, saved to a
+    temporary file which the workers load. Close it (or use it as a context
+    manager) to remove the file.
+    '''
+
+    def __init__(self, directory=None, **kwargs):
+        fd, self.path = tempfile.mkstemp(prefix='trachoma_context_' + uuid.uuid4().hex[:8] + '_', suffix='.p',
+                                         dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(kwargs, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SimulationPool:
+    '''
+    Pool of worker processes running run_single_simulation.
+
+    Parameters
+    ----------
+    n_workers : int
+        number of worker processes, defaults to the number of cores
+    threads_per_worker : int
+        number of BLAS/OpenMP threads each worker may use
+    idle_timeout : float
+        seconds after which idle workers are shut down. They are restarted
+        (and reload their contexts) when needed.
+    '''
+
+    def __init__(self, n_workers=None, threads_per_worker=1, idle_timeout=300):
+        self.n_workers = n_workers or os.cpu_count()
+        self.threads_per_worker = threads_per_worker
+        self.idle_timeout = idle_timeout
+        self._executor = None
+
+    @property
+    def executor(self):
+        # started on first use. Workers shut down after idle_timeout are restarted by the executor
+        if self._executor is None:
+            kwargs = dict(max_workers=self.n_workers, timeout=self.idle_timeout, initializer=_init_worker,
+                          initargs=(self.threads_per_worker,))
+            if _LOKY_HAS_ENV:
+                kwargs['env'] = {var: str(self.threads_per_worker) for var in THREAD_ENV_VARS}
+            self._executor = ProcessPoolExecutor(**kwargs)
+        return self._executor
+
+    def context(self, pickleData, params, timesim, burnin, demog, MDA_times, MDAData, vacc_times, VaccData,
+                outputTimes, doSurvey, doIHMEOutput, directory=None, **kwargs):
+        '''
+        Save the arguments of run_single_simulation which are the same for every
+        draw of a scenario. pickleData can be one population for all draws, or a
+        list with one population per draw index. kwargs are passed on to
+        run_single_simulation.
+
+        Returns
+        -------
+        SimulationContext
+        '''
+        return SimulationContext(directory=directory, pickleData=pickleData, params=params, timesim=timesim,
+                                 burnin=burnin, demog=demog, MDA_times=MDA_times, MDAData=MDAData,
+                                 vacc_times=vacc_times, VaccData=VaccData, outputTimes=outputTimes,
+                                 doSurvey=doSurvey, doIHMEOutput=doIHMEOutput, **kwargs)
+
+    def run(self, context, betas, seeds, indices=None, summary=None, arena=None):
+        '''
+        Run one draw per beta.
+
+        Parameters
+        ----------
+        context : SimulationContext
+            from SimulationPool.context
+        betas : sequence of float
+            beta for each draw
+        seeds : sequence
+            for each draw, an integer seed or a numpy random state (as from seed_to_state)
+        indices : sequence of int
+            draw index of each beta, used to choose the starting population.
+            Defaults to 0, 1, 2...
+        summary, arena :
+            OutputSpec or OutputArena, as for run_simulations
+
+        Returns
+        -------
+        list
+            (vals, results), or a DrawSummary if summary or arena is given, for
+            each draw, in the order of betas
+        '''
+        if context.path is None:
+            raise ValueError('The context has been closed')
+        indices = range(len(betas)) if indices is None else indices
+        futures = [self.executor.submit(_run_task, context.path, int(index), beta, seed, summary, arena)
+                   for index, beta, seed in zip(indices, betas, seeds)]
+        results = [future.result() for future in futures]
+        if arena is not None:
+            return arena.summaries(results)
+        return results
+
+    def close(self):
+        '''
+        Shut the workers down.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
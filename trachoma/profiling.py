@@ -0,0 +1,190 @@
+import threading
+import time
+import tracemalloc
+
+"""
+Opt-in instrumentation of the phases of a simulation.
+
+A PhaseProfiler is passed to sim_Ind_MDA_Include_Survey (or run_single_simulation
+with profile=True), which wraps each phase of the weekly loop in profiler.phase(name).
+The resulting report is a plain dictionary so it can be returned from joblib workers
+and combined across draws with merge_reports.
+
+When no profiler is given the simulation uses NULL_PROFILER, whose phases do nothing.
+
+tracemalloc is process-global, so only one PhaseProfiler at a time can trace memory.
+Simulations profiled at the same time in threads of one process must use
+PhaseProfiler(trace_memory=False), which only records timings.
+"""
+
+# the PhaseProfiler tracing memory, if any
+_tracing_lock = threading.Lock()
+_tracing_profiler = None
+
+PHASES = ('infection', 'transitions', 'demography', 'MDA', 'vaccination', 'surveys', 'snapshots', 'metrics')
+
+
+class _NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullProfiler:
+    '''
+    Profiler used when profiling is switched off. Every phase is the same
+    do-nothing context manager so the cost is a single method call.
+    '''
+    enabled = False
+    _phase = _NullPhase()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def phase(self, name):
+        return self._phase
+
+    def report(self):
+        return None
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class _Phase:
+
+    __slots__ = ('profiler', 'name', 'start', 'start_memory')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.trace_memory:
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stats = self.profiler.stats[self.name]
+        stats['time'] += elapsed
+        stats['calls'] += 1
+        if self.profiler.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - self.start_memory
+            stats['peak_memory'] = max(stats['peak_memory'], peak)
+        return False
+
+
+class PhaseProfiler:
+    '''
+    Record the cumulative wall time, number of calls and peak memory of each
+    phase of a simulation.
+
+    Parameters
+    ----------
+    trace_memory : bool
+        If True, use tracemalloc to record the peak memory allocated inside each
+        phase (in bytes). This slows the simulation down noticeably, so it can be
+        switched off when only timings are wanted. Requires Python 3.9 or later.
+        Only one PhaseProfiler can trace memory at a time, and start raises a
+        RuntimeError if another is already doing so.
+    '''
+    enabled = True
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory and hasattr(tracemalloc, 'reset_peak')
+        self.stats = {name: {'time': 0.0, 'calls': 0, 'peak_memory': 0} for name in PHASES}
+        self._phases = {name: _Phase(self, name) for name in PHASES}
+        self._started_tracing = False
+        self._start_time = None
+        self._wall_time = 0.0
+
+    def start(self):
+        global _tracing_profiler
+        if self.trace_memory:
+            with _tracing_lock:
+                if _tracing_profiler is not None and _tracing_profiler is not self:
+                    raise RuntimeError('another PhaseProfiler is tracing memory, and tracemalloc is process-global; '
+                                       'profile simulations run at the same time in threads with '
+                                       'trace_memory=False')
+                _tracing_profiler = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        if self._start_time is not None:
+            self._wall_time += time.perf_counter() - self._start_time
+            self._start_time = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        global _tracing_profiler
+        with _tracing_lock:
+            if _tracing_profiler is self:
+                _tracing_profiler = None
+
+    def phase(self, name):
+        try:
+            return self._phases[name]
+        except KeyError:
+            self.stats[name] = {'time': 0.0, 'calls': 0, 'peak_memory': 0}
+            self._phases[name] = _Phase(self, name)
+            return self._phases[name]
+
+    def report(self):
+        '''
+        Returns
+        -------
+        dict
+            'phases' maps each phase to its time (seconds), calls and peak_memory (bytes),
+            'wall_time' is the time between start and stop, and 'draws' is 1.
+        '''
+        return {
+            'phases': {name: dict(stats) for name, stats in self.stats.items()},
+            'wall_time': self._wall_time,
+            'draws': 1,
+        }
+
+
+def merge_reports(reports):
+    '''
+    Combine the reports of several draws (possibly run on different workers).
+    Times and calls are summed, and the peak memory is the largest peak of any draw.
+    Reports which are None (profiling switched off) are ignored.
+    '''
+    merged = {'phases': {}, 'wall_time': 0.0, 'draws': 0}
+    for report in reports:
+        if report is None:
+            continue
+        merged['wall_time'] += report['wall_time']
+        merged['draws'] += report['draws']
+        for name, stats in report['phases'].items():
+            total = merged['phases'].setdefault(name, {'time': 0.0, 'calls': 0, 'peak_memory': 0})
+            total['time'] += stats['time']
+            total['calls'] += stats['calls']
+            total['peak_memory'] = max(total['peak_memory'], stats['peak_memory'])
+    return merged
+
+
+def format_report(report):
+    '''
+    Format a report as a table with phases sorted by the time spent in them.
+    '''
+    phase_total = sum(stats['time'] for stats in report['phases'].values())
+    lines = [f"{'phase':<12} {'time (s)':>10} {'share':>7} {'calls':>10} {'peak memory (MB)':>17}"]
+    for name, stats in sorted(report['phases'].items(), key=lambda item: -item[1]['time']):
+        share = stats['time'] / phase_total if phase_total > 0 else 0
+        lines.append(f"{name:<12} {stats['time']:>10.3f} {share:>7.1%} {stats['calls']:>10d} "
+                     f"{stats['peak_memory'] / 1e6:>17.3f}")
+    lines.append(f"{report['draws']} draw(s), wall time {report['wall_time']:.3f} s")
+    return '\n'.join(lines)
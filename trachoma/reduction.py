@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy import ndarray
+
+import trachoma.trachoma_functions as tf
+
+"""
+Reduce the output of a simulation to the columns needed for the IHME, IPM and
+NTDMC outputs inside the worker which ran it.
+
+run_single_simulation returns the full final state of the population and a
+snapshot of every individual at each output time, all of which has to be
+pickled and sent back to the parent process when draws are run in parallel.
+run_and_summarise instead returns a DrawSummary holding one small array per
+output (the draw's column of the output data frame) and the MDA, vaccination
+and survey histograms, which the parent then merges with mergeIHME, mergeIPM
+and mergeNTDMC.
+
+The merged outputs are the same as those of combineIHME_MDA_SurveyData,
+getResultsIPM and getResultsNTDMC, except for ObservedTF, which is sampled in
+the worker after the simulation has finished rather than in the parent, so uses
+different random numbers.
+"""
+
+# keys of vals holding the histograms used by getMDAInfo, getVaccInfo and getSurveyInfo
+INTERVENTION_KEYS = ('n_treatments', 'n_treatments_population', 'n_vaccinated', 'n_vaccinated_population',
+                     'n_surveys', 'n_surveys_population')
+
+
+@dataclass
+class OutputSpec:
+    '''
+    Which outputs to compute in the workers.
+
+    Parameters
+    ----------
+    outputYear : sequence
+        years of the output times
+    burnin : int
+        burnin in weeks, used for the NTDMC output
+    MDAAgeRanges, VaccAgeRanges : array
+        age ranges from getInterventionAgeRanges. If MDAAgeRanges is None the IPM
+        output isn't computed
+    IHME : bool
+        whether to compute the IHME output
+    aggregateObservedTF : bool
+        sample ObservedTF per age bin (see sampleObservedTF)
+    '''
+    outputYear: list
+    burnin: int
+    MDAAgeRanges: Optional[ndarray] = None
+    VaccAgeRanges: Optional[ndarray] = None
+    IHME: bool = True
+    aggregateObservedTF: bool = False
+
+
+@dataclass
+class DrawSummary:
+    n_years: int
+    NTDMC: ndarray
+    IHME: Optional[ndarray] = None
+    IPM: Optional[ndarray] = None
+    interventions: dict = field(default_factory=dict)
+    phase_profile: Optional[dict] = None
+    elimination: Optional[ndarray] = None
+    burnin_weeks: Optional[int] = None
+
+    @property
+    def nbytes(self):
+        '''
+        Size of the arrays held by the summary.
+        '''
+        arrays = [self.NTDMC, self.IHME, self.IPM, self.elimination] + [v for d in self.interventions.values() for v in d.values()]
+        return sum(np.asarray(a).nbytes for a in arrays if a is not None)
+
+
+def summariseDraw(vals, results, params, demog, spec, rng=np.random):
+    '''
+    Reduce the output of run_single_simulation for one draw to a DrawSummary.
+    ObservedTF is sampled with rng.
+    '''
+    max_age = demog['max_age'] // 52 # max_age in weeks
+    summary = DrawSummary(n_years=len(results),
+                          NTDMC=tf.getDrawNTDMC(vals, spec.burnin),
+                          interventions={key: vals[key] for key in INTERVENTION_KEYS if key in vals},
+                          phase_profile=vals.get('phase_profile'),
+                          elimination=np.array([result.elimination for result in results]),
+                          burnin_weeks=vals.get('Burnin_weeks'))
+    if spec.IHME:
+        summary.IHME = tf.getDrawIHME(results, params, max_age, spec.aggregateObservedTF, rng)
+    if spec.MDAAgeRanges is not None:
+        VaccAgeRanges = spec.VaccAgeRanges if spec.VaccAgeRanges is not None else []
+        summary.IPM = tf.getDrawIPM(results, len(spec.MDAAgeRanges), len(VaccAgeRanges))
+    return summary
+
+
+def run_and_summarise(spec, **kwargs):
+    '''
+    Run run_single_simulation with kwargs and return the DrawSummary of its output.
+    '''
+    vals, results = tf.run_single_simulation(**kwargs)
+    rng = kwargs.get('rng')
+    return summariseDraw(vals, results, kwargs['params'], kwargs['demog'], spec, np.random if rng is None else rng)
+
+
+def _interventionResults(summaries):
+    # getMDAInfo, getVaccInfo and getSurveyInfo only read the first element of each result
+    return [(summary.interventions,) for summary in summaries]
+
+
+def mergeIHME(summaries: List[DrawSummary], demog, spec, Start_date, sim_params):
+    '''
+    Equivalent of combineIHME_MDA_SurveyData for the summaries of several draws.
+    '''
+    max_age = demog['max_age'] // 52 # max_age in weeks
+    n_years = summaries[0].n_years if len(summaries) > 0 else 0
+    IHME = tf.collateIHME([summary.IHME for summary in summaries], spec.outputYear, n_years, max_age)
+    results = _interventionResults(summaries)
+    MDA = tf.getMDAInfo(results, Start_date, sim_params, demog)
+    Vacc = tf.getVaccInfo(results, Start_date, sim_params, demog)
+    Survey = tf.getSurveyInfo(results, Start_date, sim_params, demog)
+    for extra in [MDA, Vacc, Survey]:
+        if len(extra) > 0:
+            IHME = pd.concat([IHME, extra], ignore_index = True)
+    return IHME
+
+
+def mergeIPM(summaries: List[DrawSummary], spec):
+    '''
+    Equivalent of getResultsIPM for the summaries of several draws.
+    '''
+    n_years = summaries[0].n_years if len(summaries) > 0 else 0
+    VaccAgeRanges = spec.VaccAgeRanges if spec.VaccAgeRanges is not None else []
+    return tf.collateIPM([summary.IPM for summary in summaries], spec.outputYear, n_years,
+                         spec.MDAAgeRanges, VaccAgeRanges)
+
+
+def mergeNTDMC(summaries: List[DrawSummary], Start_date):
+    '''
+    Equivalent of getResultsNTDMC for the summaries of several draws.
+    '''
+    return tf.collateNTDMC([summary.NTDMC for summary in summaries], Start_date)
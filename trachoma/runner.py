@@ -0,0 +1,135 @@
+import functools
+import inspect
+import os
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+
+import trachoma.trachoma_functions as tf
+from trachoma.arena import run_into_arena
+from trachoma.reduction import run_and_summarise
+from trachoma.telemetry import make_telemetry
+
+"""
+Helpers for running many draws of run_single_simulation in parallel and
+writing the collated outputs, with optional telemetry. If an OutputSpec is
+given, the outputs of each draw are reduced in the worker (see trachoma.reduction),
+and if an OutputArena is given they are written straight to shared memory
+(see trachoma.arena).
+"""
+
+# joblib >= 1.3 can return results as they are completed, which lets us report the queue depth
+_JOBLIB_HAS_GENERATOR = 'return_as' in inspect.signature(Parallel).parameters
+
+# joblib backend used for each value of the backend argument of run_simulations
+BACKENDS = {'processes': 'loky', 'threads': 'threading'}
+
+
+def run_simulations(pickleData, params, timesim, burnin, demog, betas, MDA_times, MDAData, vacc_times, VaccData,
+                    outputTimes, doSurvey, doIHMEOutput, numpy_states, n_jobs=-1, telemetry=None, summary=None,
+                    arena=None, backend='processes', first_draw=0, **kwargs):
+    '''
+    Run one simulation per beta in betas with run_single_simulation, using joblib.
+
+    Parameters
+    ----------
+    pickleData : dict or list of dict
+        starting population, either one shared by all draws or one per draw
+    betas : sequence of float
+        beta for each draw
+    numpy_states : list
+        numpy random state for each draw
+    n_jobs : int
+        number of joblib workers
+    backend : str
+        'processes' to run the draws in separate processes, or 'threads' to run
+        them in threads of this process, each with its own np.random.RandomState.
+        Threads avoid starting processes and pickling the inputs and outputs, which
+        for small populations can take as long as the simulations themselves.
+        Both give the same results for the same numpy_states. As tracemalloc is
+        process-global, draws profiled (profile=True) in threads only record the
+        time of each phase, not its peak memory.
+    telemetry :
+        path, logger, function or Telemetry object (see trachoma.telemetry). The
+        simulations send task_start/progress/task_end events, and the parent sends
+        queue events with the number of draws still outstanding.
+    summary : OutputSpec
+        if given, each worker returns a DrawSummary of its draw with the outputs
+        in summary, instead of the full output of run_single_simulation. These
+        are merged with mergeIHME, mergeIPM and mergeNTDMC.
+    arena : OutputArena
+        if given, each worker writes its outputs to the arena and returns only
+        its MDA, vaccination and survey histograms. The DrawSummary returned for
+        each draw is a view of the arena, so can only be used until it is closed.
+    first_draw : int
+        index of the first draw, passed to run_single_simulation as index with
+        that of each draw, e.g. for running the draws in batches
+    kwargs :
+        passed on to run_single_simulation, e.g. crn_seed to run the draws with common
+        random numbers (see trachoma.crn) for comparing scenarios
+
+    Returns
+    -------
+    list
+        (vals, results), or a DrawSummary if summary or arena is given, for
+        each draw, in the order of betas
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {sorted(BACKENDS)}, not {backend!r}")
+    telemetry = make_telemetry(telemetry)
+    n_sims = len(betas)
+    threads = backend == 'threads'
+    if threads and kwargs.get('profile'):
+        kwargs['profile'] = 'time'
+
+    def population(i):
+        return pickleData[i] if isinstance(pickleData, (list, tuple)) else pickleData
+
+    if arena is not None:
+        simulate = functools.partial(run_into_arena, arena)
+    elif summary is not None:
+        simulate = functools.partial(run_and_summarise, summary)
+    else:
+        simulate = tf.run_single_simulation
+
+    tasks = (delayed(simulate)(pickleData=population(i), params=params, timesim=timesim, burnin=burnin,
+                               demog=demog, beta=betas[i], MDA_times=MDA_times, MDAData=MDAData,
+                               vacc_times=vacc_times, VaccData=VaccData, outputTimes=outputTimes,
+                               doSurvey=doSurvey, doIHMEOutput=doIHMEOutput, index=first_draw + i, numpy_state=numpy_states[i],
+                               telemetry=telemetry if telemetry.enabled else None,
+                               rng=np.random.RandomState() if threads else None, **kwargs)
+             for i in range(n_sims))
+    parallel_kwargs = dict(n_jobs=n_jobs, backend=BACKENDS[backend])
+
+    start = time.perf_counter()
+    telemetry.emit('queue', queue_depth=n_sims, completed=0, n_jobs=n_jobs)
+    if _JOBLIB_HAS_GENERATOR and telemetry.enabled:
+        results = []
+        last_emit = start
+        for result in Parallel(return_as='generator', **parallel_kwargs)(tasks):
+            results.append(result)
+            now = time.perf_counter()
+            if now - last_emit >= telemetry.min_interval or len(results) == n_sims:
+                last_emit = now
+                telemetry.emit('queue', queue_depth=n_sims - len(results), completed=len(results),
+                               n_jobs=n_jobs, elapsed=now - start)
+    else:
+        results = Parallel(**parallel_kwargs)(tasks)
+        telemetry.emit('queue', queue_depth=0, completed=n_sims, n_jobs=n_jobs,
+                       elapsed=time.perf_counter() - start)
+    if arena is not None:
+        return arena.summaries(results)
+    return results
+
+
+def write_output(df, path, telemetry=None, **kwargs):
+    '''
+    Write a collated output data frame to CSV, sending a 'write' event with the
+    number of bytes written and the time taken.
+    '''
+    telemetry = make_telemetry(telemetry)
+    start = time.perf_counter()
+    df.to_csv(path, index=False, **kwargs)
+    telemetry.emit('write', path=str(path), rows=len(df), bytes=os.path.getsize(path),
+                   elapsed=time.perf_counter() - start)
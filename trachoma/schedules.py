@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+Parameters which vary over time, as arrays with one value per week.
+
+Rather than updating a parameter inside the simulation loop (such as reducing
+the importation rate every 52 weeks), its value in every week is calculated
+before the simulation starts, and the loop reads element i in week i.
+simulationSchedules builds the schedules of beta and the importation rate used
+by sim_Ind_MDA_Include_Survey, from the parameters which change them over time.
+
+The arrays are read-only, so the schedules of draws with the same parameters
+are built once and shared by the draws, and the threads, of a process (see
+simulationSchedules).
+"""
+
+# number of sets of schedules kept by simulationSchedules
+MAX_CACHED_SCHEDULES = 64
+
+_schedules = OrderedDict()
+_schedules_lock = threading.Lock()
+
+
+def _readOnly(array):
+    array.setflags(write=False)
+    return array
+
+
+def constantSchedule(value, n_weeks):
+    '''
+    value in every week.
+    '''
+    return _readOnly(np.full(n_weeks, value, dtype=float))
+
+
+def exponentialDecaySchedule(initial, factor, n_weeks, period=52, start_week=0):
+    '''
+    initial, multiplied by factor at start_week and every period weeks after.
+
+    The value after k reductions is calculated as initial * factor * ... * factor
+    with k multiplications, which is what multiplying a running value by factor
+    every period weeks gives.
+    '''
+    weeks = np.arange(n_weeks)
+    n_reductions = np.where(weeks >= start_week, (weeks - start_week) // period + 1, 0)
+    values = np.cumprod(np.concatenate([[initial], np.full(n_reductions.max(initial=0), factor)]))
+    return _readOnly(values[n_reductions].astype(float))
+
+
+def secularTrendSchedule(bet, n_weeks, burnin, yearlyDecrease):
+    '''
+    beta decreasing by yearlyDecrease of its value at the start of every year
+    after the burnin, linearly over each year, as in SecularTrendBetaDecrease.
+    '''
+    simbeta = bet * np.ones(n_weeks)
+    i = np.arange(52 + 1)
+    for j in range(round(burnin / 52), round(n_weeks / 52)):
+        start = j * 52
+        bet1 = simbeta[start]
+        year = bet1 - (yearlyDecrease * bet1 * i / 52)
+        simbeta[start:start + len(i)] = year[:n_weeks - start]
+    return _readOnly(simbeta)
+
+
+def simulationSchedules(params, bet, timesim, burnin):
+    '''
+    Per week beta and importation rate of a simulation.
+
+    Returns
+    -------
+    dict
+        'beta' (timesim + 1 weeks, see SecularTrendBetaDecrease) and
+        'importation_rate' (timesim weeks, reduced by importation_reduction_rate
+        every 52 weeks, starting in the first week)
+    '''
+    key = (float(bet), timesim, burnin, params['SecularTrendIndicator'], params['SecularTrendYearlyBetaDecrease'],
+           params['importation_rate'], params['importation_reduction_rate'])
+    with _schedules_lock:
+        schedules = _schedules.get(key)
+        if schedules is not None:
+            _schedules.move_to_end(key)
+            return schedules
+    if params['SecularTrendIndicator'] == 1:
+        beta = secularTrendSchedule(bet, timesim + 1, burnin, params['SecularTrendYearlyBetaDecrease'])
+    else:
+        beta = constantSchedule(bet, timesim + 1)
+    schedules = {
+        'beta': beta,
+        'importation_rate': exponentialDecaySchedule(params['importation_rate'],
+                                                     params['importation_reduction_rate'], timesim),
+    }
+    with _schedules_lock:
+        _schedules[key] = schedules
+        while len(_schedules) > MAX_CACHED_SCHEDULES:
+            _schedules.popitem(last=False)
+    return schedules
@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import trachoma.trachoma_functions as tf
+from trachoma.telemetry import make_telemetry
+
+"""
+Estimate the probability of rare events by multilevel splitting.
+
+Events such as resurgence after two surveys have been passed happen in few
+draws, so a plain Monte Carlo estimate of their probability needs thousands of
+draws. Multilevel splitting instead defines increasing levels of a progress
+function of the state of a simulation, e.g. the number of people infected after
+the second survey has been passed, the last of which is the event. Starting
+from n_trajectories simulations, each stage runs its trajectories until their
+progress reaches the next level, or the simulation ends. The fraction which reach
+the level estimates the probability of reaching it from the previous one, and the
+next stage continues n_trajectories copies of the trajectories which reached it,
+chosen at random, each with new random numbers (see trachoma_functions.forkSimulation).
+The product of the fractions is an unbiased estimate of the probability of the event.
+Its standard error is estimated from independent replicates of the whole procedure.
+
+The trajectories are simulations started with initSimulation and run week by
+week with advanceSimulation, so they have the surveys, MDA and vaccination of
+sim_Ind_MDA_Include_Survey, and a progress function has the whole state of the
+simulation (see initSimulation) to work with.
+"""
+
+
+def infectedAfterSurveysPassed(sim):
+    '''
+    Progress towards resurgence: the number of people infected once two surveys in a row
+    have been passed, and -1 before.
+    '''
+    if sim['surveyPass'] < 2:
+        return -1
+    return np.count_nonzero(sim['vals']['IndI'])
+
+
+def prevalenceChildren(sim):
+    '''
+    Progress of the true prevalence of disease in 1-9 year olds in the last week simulated.
+    '''
+    return sim['prevalence'][-1] if len(sim['prevalence']) > 0 else 0
+
+
+@dataclass
+class SplittingEstimate:
+    '''
+    Probability of reaching the last level estimated by run_splitting.
+
+    Attributes
+    ----------
+    probability : float
+        mean of the estimates of the replicates
+    se : float
+        standard error of probability
+    estimates : array
+        estimate of each replicate
+    stage_probabilities : array
+        mean over the replicates of the fraction of trajectories reaching each level
+    '''
+    probability: float
+    se: float
+    estimates: np.ndarray
+    stage_probabilities: np.ndarray = field(default_factory=lambda: np.zeros(0))
+
+
+def _reachLevel(sim, progress, level, horizon):
+    '''
+    Run sim a week at a time until its progress reaches level, returning whether it did
+    by week horizon.
+    '''
+    while True:
+        if progress(sim) >= level:
+            return True
+        if sim['week'] >= horizon:
+            return False
+        tf.advanceSimulation(sim, sim['week'] + 1)
+
+
+def _newRandomState(sequence):
+    return np.random.RandomState(np.random.MT19937(sequence))
+
+
+def run_splitting(pickleData, params, timesim, burnin, demog, beta, MDA_times, MDAData, vacc_times, VaccData,
+                  doSurvey, progress, levels, n_trajectories=100, replicates=10, seed=0, distToUse="Poisson",
+                  telemetry=None):
+    '''
+    Estimate the probability that progress reaches levels[-1] during a simulation by
+    multilevel splitting.
+
+    Parameters
+    ----------
+    pickleData : dict
+        starting population of every trajectory
+    beta : float
+        beta of the simulations
+    progress : function
+        function of the state of a simulation (see initSimulation) returning a number,
+        e.g. infectedAfterSurveysPassed
+    levels : sequence
+        increasing levels of progress, the last of which is the event. Levels that most
+        trajectories reaching the previous level go on to reach, but not all, give the
+        most precise estimates
+    n_trajectories : int
+        number of trajectories run in each stage
+    replicates : int
+        number of independent replicates, from which the standard error is estimated
+    seed : int
+        seed of the random numbers of all the trajectories
+    telemetry :
+        as for run_single_simulation. A 'splitting' event is sent after each stage
+
+    Returns
+    -------
+    SplittingEstimate
+    '''
+    if replicates < 2:
+        raise ValueError('at least two replicates are needed to estimate the standard error')
+    if np.any(np.diff(levels) <= 0):
+        raise ValueError('levels must be increasing')
+    telemetry = make_telemetry(telemetry)
+    estimates = np.zeros(replicates)
+    fractions = np.zeros((replicates, len(levels)))
+    outputTimes = np.array([timesim + 10])
+    for r, sequence in enumerate(np.random.SeedSequence(seed).spawn(replicates)):
+        starts = sequence.spawn(n_trajectories)
+        trajectories = []
+        for start in starts:
+            rng = _newRandomState(start)
+            numpy_state = rng.get_state()
+            vals, simParams, simDemog = tf.prepareSimulation(pickleData, params, demog, MDAData, numpy_state, rng)
+            trajectories.append(tf.initSimulation(simParams, vals, timesim, burnin, simDemog, beta, MDA_times,
+                                                  MDAData, vacc_times, VaccData, outputTimes, doSurvey, False,
+                                                  numpy_state, distToUse, rng=rng))
+        choose = _newRandomState(sequence.spawn(1)[0])
+        estimate = 1.0
+        for k, level in enumerate(levels):
+            if k > 0:
+                # continue copies of the trajectories which reached the last level, with new random numbers
+                parents = choose.randint(len(trajectories), size=n_trajectories)
+                trajectories = [tf.forkSimulation(trajectories[parent], _newRandomState(child))
+                                for parent, child in zip(parents, sequence.spawn(n_trajectories))]
+            trajectories = [sim for sim in trajectories if _reachLevel(sim, progress, level, timesim)]
+            fractions[r, k] = len(trajectories) / n_trajectories
+            estimate *= fractions[r, k]
+            telemetry.emit('splitting', replicate=r, level=level, fraction=fractions[r, k])
+            if len(trajectories) == 0:
+                break
+        estimates[r] = estimate
+    return SplittingEstimate(probability=float(np.mean(estimates)),
+                             se=float(np.std(estimates, ddof=1) / np.sqrt(replicates)),
+                             estimates=estimates, stage_probabilities=fractions.mean(axis=0))
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import socket
+import time
+
+"""
+Structured progress and throughput events, written as JSON lines.
+
+A Telemetry object wraps a sink, which can be a FileSink (one JSON object per
+line, appended, so several worker processes can share a file), a CallbackSink
+(any function taking the event dictionary) or a LoggerSink (one log record per
+event). make_telemetry builds the right sink from a path, a function or a logger.
+
+Progress events from inside the simulation loop are throttled. The clock is only
+read every check_every weeks, and an event is only written if at least
+min_interval seconds have passed since the last one, so the cost in the weekly
+loop is a single modulo.
+"""
+
+
+def current_rss():
+    '''
+    Resident set size of this process in bytes, or None if it can't be read.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class FileSink:
+    '''
+    Append each event as a line of JSON to the file at path.
+    '''
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def __call__(self, event):
+        line = json.dumps(event, default=_to_json) + '\n'
+        with open(self.path, 'a') as f:
+            f.write(line)
+
+
+class CallbackSink:
+    '''
+    Pass each event dictionary to callback.
+    '''
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, event):
+        self.callback(event)
+
+
+class LoggerSink:
+    '''
+    Log each event as a JSON string with the given logger and level.
+    '''
+
+    def __init__(self, logger, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, event):
+        self.logger.log(self.level, json.dumps(event, default=_to_json))
+
+
+def _to_json(value):
+    # numpy scalars and arrays
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class Telemetry:
+    '''
+    Emit events to a sink.
+
+    Parameters
+    ----------
+    sink : callable
+        called with each event dictionary
+    min_interval : float
+        minimum number of seconds between two progress events of the same task
+    check_every : int
+        number of simulated weeks between two checks of the clock
+    context : dict
+        fields added to every event, e.g. the draw index
+    '''
+
+    enabled = True
+
+    def __init__(self, sink, min_interval=10.0, check_every=52, **context):
+        self.sink = sink
+        self.min_interval = min_interval
+        self.check_every = check_every
+        self.context = context
+        self._task_start = None
+        self._last_time = None
+        self._last_week = 0
+
+    def bind(self, **context):
+        '''
+        Returns a new Telemetry writing to the same sink with extra context fields.
+        '''
+        return Telemetry(self.sink, self.min_interval, self.check_every, **{**self.context, **context})
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': time.time(), 'host': socket.gethostname(), 'pid': os.getpid()}
+        record.update(self.context)
+        record.update(fields)
+        self.sink(record)
+
+    def task_start(self, **fields):
+        self._task_start = self._last_time = time.perf_counter()
+        self._last_week = 0
+        self.emit('task_start', rss=current_rss(), **fields)
+
+    def progress(self, week, total_weeks):
+        '''
+        Called every simulated week. Writes a progress event with the throughput
+        since the last progress event and an estimate of the time remaining.
+        '''
+        if week % self.check_every != 0 or self._last_time is None or week == self._last_week:
+            return
+        now = time.perf_counter()
+        if now - self._last_time < self.min_interval:
+            return
+        weeks_per_second = (week - self._last_week) / (now - self._last_time)
+        overall = week / (now - self._task_start) if now > self._task_start else 0.0
+        eta = (total_weeks - week) / overall if overall > 0 else None
+        self._last_time = now
+        self._last_week = week
+        self.emit('progress', week=week, total_weeks=total_weeks, fraction=week / total_weeks,
+                  weeks_per_second=weeks_per_second, elapsed=now - self._task_start, eta=eta, rss=current_rss())
+
+    def task_end(self, weeks, **fields):
+        elapsed = time.perf_counter() - self._task_start if self._task_start is not None else None
+        weeks_per_second = weeks / elapsed if elapsed else None
+        self.emit('task_end', weeks=weeks, elapsed=elapsed, weeks_per_second=weeks_per_second,
+                  rss=current_rss(), **fields)
+
+
+class NullTelemetry:
+    '''
+    Telemetry used when no sink is given. Every method does nothing.
+    '''
+
+    enabled = False
+
+    def bind(self, **context):
+        return self
+
+    def emit(self, event, **fields):
+        pass
+
+    def task_start(self, **fields):
+        pass
+
+    def progress(self, week, total_weeks):
+        pass
+
+    def task_end(self, weeks, **fields):
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+def make_telemetry(target=None, **kwargs):
+    '''
+    Build a Telemetry object from a path (JSON-lines file), a logging.Logger,
+    a function taking the event dictionary, or an existing Telemetry object.
+    If target is None, NULL_TELEMETRY is returned.
+    '''
+    if target is None:
+        return NULL_TELEMETRY
+    if isinstance(target, (Telemetry, NullTelemetry)):
+        return target
+    if isinstance(target, logging.Logger):
+        return Telemetry(LoggerSink(target), **kwargs)
+    if isinstance(target, (str, os.PathLike)):
+        return Telemetry(FileSink(target), **kwargs)
+    if callable(target):
+        return Telemetry(CallbackSink(target), **kwargs)
+    raise TypeError(f"Can't make a telemetry sink from {target!r}")
@@ -10,6 +10,16 @@ from dataclasses import dataclass
 from typing import Callable, List, Optional
 from pathlib import Path
 
+from trachoma.cohorts import CohortIndex, ageCount, ageHistogram, ageMask, ageMembers, ageOf, ageYearHistogram, syncAges
+from trachoma.compliance import complianceQuantiles, treatmentProbabilities
+from trachoma.crn import CommonRandomNumbers, personUniforms, streamFor
+from trachoma.coverage import interventionDates, interventionWeeks, loadInterventionSchedule
+from trachoma.parameters import Demography, ModelParams, derived
+from trachoma.schedules import secularTrendSchedule, simulationSchedules
+from trachoma.vaccination import VaccinationStamps
+from trachoma.profiling import NULL_PROFILER, PhaseProfiler, merge_reports
+from trachoma.telemetry import NULL_TELEMETRY, make_telemetry
+
 DEFAULT_DATA_PATH = Path(__file__).parent / "data" / "coverage"
 
 """
@@ -74,58 +84,17 @@ def _validate_data_path(data_path):
 
 
 def readPlatformData(coverageFileName, Platform, data_path=None):
-    PlatCov = pd.read_csv(
-        _validate_data_path(data_path) / coverageFileName
-    )
-    PlatformRows = np.where(PlatCov.Platform == Platform)[0]
-    if(len(PlatformRows) >0):
-        PlatCov = PlatCov.iloc[PlatformRows, :]
-         # we want to find which is the first year specified in the coverage data, along with which
-         # column of the data set this corresponds to
-        fy = 10000
-        fy_index = 7
-        for i in range(len(PlatCov.columns)):
-            if type(PlatCov.columns[i]) == int:
-                fy = min(fy, PlatCov.columns[i])
-                fy_index = min(fy_index, i)
-    
-        count = 0
-        minAgeIndex = np.where(PlatCov.columns == "min age")[0][0]
-        maxAgeIndex = np.where(PlatCov.columns == "max age")[0][0]
-        for i in range(fy_index, len(PlatCov.columns)):
-            dd = PlatCov.iloc[:, i]
-            PlatformS = np.where(dd>0)[0]
-            if len(PlatformS)>0:
-                for k in range(len(PlatformS)):
-                    j = PlatformS[k]
-                    if count == 0:
-                        PlatformData = [[float(PlatCov.columns[i]), PlatCov.iloc[j, minAgeIndex], PlatCov.iloc[j, maxAgeIndex], PlatCov.iloc[j, i], j,  PlatCov.shape[0]]]
-                        count += 1
-                    else:
-                        PlatformData.append([float(PlatCov.columns[i]), PlatCov.iloc[j, minAgeIndex], PlatCov.iloc[j, maxAgeIndex], PlatCov.iloc[j, i], j,  PlatCov.shape[0]])
-                        count +=1
-        if count == 1:
-            PlatformData.append([3026.0, 2, 5, 0.6, 0, 2])
-        if count == 0:
-            PlatformData = [[3026.0, 2, 5, 0.6, 0, 2]]
-            PlatformData.append([3026.0, 2, 5, 0.6, 0, 2])
-    else:
-        PlatformData = [[3026.0, 2, 5, 0.6, 0, 2],
-                   [3026.0, 2, 5, 0.6, 0, 2]]
-    return PlatformData
+    '''
+    MDA or vaccination data of Platform in a coverage file: a list with, for each campaign,
+    its year, minimum and maximum age, coverage, row among the rows of Platform and the number
+    of rows of Platform. The file is only read the first time (see trachoma.coverage).
+    '''
+    schedule = loadInterventionSchedule(_validate_data_path(data_path) / coverageFileName)
+    return schedule.platformData(Platform)
                
 
 def getInterventionDates(InterventionData):
-    for i in range(len(InterventionData)):
-        d = InterventionData[i][0]
-        y = int(d)
-        m = round(12*(d - int(d))) + 1
-        day = 1
-        if i == 0:
-            Intervention_dates = [date(y, m, day)]
-        else:
-            Intervention_dates.append(date(y, m, day))
-    return Intervention_dates
+    return list(interventionDates([row[0] for row in InterventionData]).astype(date))
  
 
 
@@ -141,7 +110,7 @@ def getOutputTimes(outputTimes):
             modOutputTimes.append(date(y, m, day))
     return modOutputTimes
 
-def vaccinate_population(vals = None, params = None):
+def vaccinate_population(vals = None, params = None, rng = np.random):
     '''
     Vaccinate population according to coverage provided in `params`
 
@@ -160,89 +129,108 @@ def vaccinate_population(vals = None, params = None):
 
     '''
     # randomly vaccinated population according to coverage
-    index_vaccinated = np.random.rand(params['N']) < params['vacc_coverage']
+    index_vaccinated = streamFor(rng, 'vaccination').rand(params['N']) < params['vacc_coverage']
     vals['vaccinated'][index_vaccinated] = True
     vals['time_since_vaccinated'][index_vaccinated] = 0
+    if 'vaccination' in vals:
+        vals['vaccination'].vaccinate(np.flatnonzero(index_vaccinated))
 
     return vals
 
-def stepF_fixed(vals, params, demog, bet, distToUse = "Poisson"):
+def stepF_fixed(vals, params, demog, bet, distToUse = "Poisson", profiler = NULL_PROFILER, rng = np.random,
+                importation_rate = None):
 
     '''
     Step function i.e. transitions in each time non-MDA timestep.
+    importation_rate is the current importation rate, by default params['importation_rate'].
     '''
+    if importation_rate is None:
+        importation_rate = params['importation_rate']
+
+    with profiler.phase('demography'):
+        #Step 0: do importation of infection 
+        import_indivs = np.where(streamFor(rng, 'importation').uniform(size = params['N']) < importation_rate)[0]
+        if len(import_indivs) > 0:
+            vals = Import_individual(vals, import_indivs, params, demog, distToUse, rng)
+
+    with profiler.phase('infection'):
+        # Step 1: Identify individuals available for infection.
+        # Susceptible individuals available for infection.
+        Ss = np.where(vals['IndI'] == 0)[0]
+        # we only care about bacterial load when we use it to calculate infection probabilities.
+        # This is done in the getlambdaStep function, so update the bacterial loads before calling this function
+        vals['bact_load'] = bacterialLoad(params = params, vals = vals)
+        # Step 2: Calculate infection pressure from previous time step and choose infected individuals
+        # Susceptible individuals acquiring new infections. This gives a lambda
+        # for each individual dependent on age and disease status.
+        lambda_step = 1 - np.exp(- getlambdaStep(params=params, Age=vals['Age'], bact_load=vals['bact_load'],
+        IndD=vals['IndD'], vaccinated=vals['vaccinated'],time_since_vaccinated=vals['time_since_vaccinated'],
+        bet=bet, demog=demog, protection=vaccineProtection(vals, params), cohorts=vals.get('cohorts')))
+        # New infections
+        newInf = Ss[personUniforms(rng, 'infection', Ss, params['N']) < lambda_step[Ss]]
+
+    with profiler.phase('transitions'):
+        # Step 3: Identify transitions
+        newDis = np.where(vals['T_latent'] == 1)[0]  # Designated latent period for that individual is about to expire
+        newClearInf = np.where(vals['T_ID'] == 1)[0]  # Designated infectious period for that individual is about to expire
+        newClearDis = np.where(vals['T_D'] == 1)[0]  # Designated diseased period for that individual is about to expire
+        newInfectious = np.where(np.logical_and(vals['IndI']==1,vals['T_latent']==1))[0] # Only individuals who have avoided MDA become infectious at end of latent
+
+        # Step 4: reduce counters
+        # Those in latent period should count down with each timestep.
+        vals['T_latent'][vals['T_latent'] > 0] -= 1
+        # Those infected should count down with each timestep
+        vals['T_ID'][vals['T_ID'] > 0] -= 1
+        # Those diseased should count down with each timestep
+        vals['T_D'][vals['T_D'] > 0] -= 1
+
+        # Step 5: implement transitions
+        # Transition: become diseased (and infected)
+        vals['IndD'][newDis] = 1  # if they've become diseased they become D=1
+        vals['T_ID'][newDis] = ID_period_function(newDis, params=params, vals = vals)
+        #vals['T_D'][newDis] = 0  # SS Added to prevent transition of doom.
+        # Transition: Clear infection
+        vals['IndI'][newClearInf] = 0  # clear infection they become I=0
+        # When individual clears infection, their diseased only is set
+        vals['T_D'][newClearInf] = D_period_function(Ind_D_period_base=vals['Ind_D_period_base'][newClearInf],
+        No_Inf=vals['No_Inf'][newClearInf], params=params, Age = ageOf(vals, newClearInf))
+        # Transition: Clear disease
+        vals['IndD'][newClearDis] = 0  # clear disease they become D=0
+
+        # Step 6: implement infections
+        # Transition: become infected
+        vals['IndI'][newInf] = 1  # if they've become infected, become I=1
+        # When individual becomes infected, set their latent period;
+        # this is how long they remain in category I (infected but not diseased)
+        vals['T_latent'][newInf] = vals['Ind_latent'][newInf]
+        # New infected can be D and have nonzero T_D/T_ID
+        vals['T_D'][newInf] = 0
+        vals['T_ID'][newInf] = 0
+
+        # Tracking infection history
+        vals['No_Inf'][newInf] += 1
+
+    with profiler.phase('vaccination'):
+        # update vaccination history
+        if 'vaccination' in vals:
+            vals['vaccination'].advance()
+        else:
+            vals['time_since_vaccinated'][np.where(vals['vaccinated'])] += 1
+
+    with profiler.phase('demography'):
+        # Update age, all age by 1w at each timestep, and resetting all "reset indivs" age to zero
+        # Reset_indivs - Identify individuals who die in this timestep, either reach max age or random death rate
+        # With a CohortIndex ages are counted from birth weeks, and vals['Age'] is only brought up to date when read
+        if 'cohorts' in vals:
+            vals['cohorts'].advance()
+        else:
+            vals['Age'] += 1
+        reset_indivs = Reset(Age=vals['Age'], demog=demog, params=params, rng=streamFor(rng, 'demography'),
+                             cohorts=vals.get('cohorts'))
 
-    #Step 0: do importation of infection 
-    import_indivs = np.where(np.random.uniform(size = params['N']) < params['importation_rate'])[0]
-    if len(import_indivs) > 0:
-        vals = Import_individual(vals, import_indivs, params, demog, distToUse)
-
-    # Step 1: Identify individuals available for infection.
-    # Susceptible individuals available for infection.
-    Ss = np.where(vals['IndI'] == 0)[0]
-    # we only care about bacterial load when we use it to calculate infection probabilities.
-    # This is done in the getlambdaStep function, so update the bacterial loads before calling this function
-    vals['bact_load'] = bacterialLoad(params = params, vals = vals)
-    # Step 2: Calculate infection pressure from previous time step and choose infected individuals
-    # Susceptible individuals acquiring new infections. This gives a lambda
-    # for each individual dependent on age and disease status.
-    lambda_step = 1 - np.exp(- getlambdaStep(params=params, Age=vals['Age'], bact_load=vals['bact_load'],
-    IndD=vals['IndD'], vaccinated=vals['vaccinated'],time_since_vaccinated=vals['time_since_vaccinated'],
-    bet=bet, demog=demog))
-    # New infections
-    newInf = Ss[np.random.uniform(size=len(Ss)) < lambda_step[Ss]]
-
-    # Step 3: Identify transitions
-    newDis = np.where(vals['T_latent'] == 1)[0]  # Designated latent period for that individual is about to expire
-    newClearInf = np.where(vals['T_ID'] == 1)[0]  # Designated infectious period for that individual is about to expire
-    newClearDis = np.where(vals['T_D'] == 1)[0]  # Designated diseased period for that individual is about to expire
-    newInfectious = np.where(np.logical_and(vals['IndI']==1,vals['T_latent']==1))[0] # Only individuals who have avoided MDA become infectious at end of latent
-
-    # Step 4: reduce counters
-    # Those in latent period should count down with each timestep.
-    vals['T_latent'][vals['T_latent'] > 0] -= 1
-    # Those infected should count down with each timestep
-    vals['T_ID'][vals['T_ID'] > 0] -= 1
-    # Those diseased should count down with each timestep
-    vals['T_D'][vals['T_D'] > 0] -= 1
-
-    # Step 5: implement transitions
-    # Transition: become diseased (and infected)
-    vals['IndD'][newDis] = 1  # if they've become diseased they become D=1
-    vals['T_ID'][newDis] = ID_period_function(newDis, params=params, vals = vals)
-    #vals['T_D'][newDis] = 0  # SS Added to prevent transition of doom.
-    # Transition: Clear infection
-    vals['IndI'][newClearInf] = 0  # clear infection they become I=0
-    # When individual clears infection, their diseased only is set
-    vals['T_D'][newClearInf] = D_period_function(Ind_D_period_base=vals['Ind_D_period_base'][newClearInf],
-    No_Inf=vals['No_Inf'][newClearInf], params=params, Age = vals['Age'][newClearInf])
-    # Transition: Clear disease
-    vals['IndD'][newClearDis] = 0  # clear disease they become D=0
-
-    # Step 6: implement infections
-    # Transition: become infected
-    vals['IndI'][newInf] = 1  # if they've become infected, become I=1
-    # When individual becomes infected, set their latent period;
-    # this is how long they remain in category I (infected but not diseased)
-    vals['T_latent'][newInf] = vals['Ind_latent'][newInf]
-    # New infected can be D and have nonzero T_D/T_ID
-    vals['T_D'][newInf] = 0
-    vals['T_ID'][newInf] = 0
-
-    # Tracking infection history
-    vals['No_Inf'][newInf] += 1
-
-    # update vaccination history
-    vals['time_since_vaccinated'][np.where(vals['vaccinated'])] += 1
-
-    # Update age, all age by 1w at each timestep, and resetting all "reset indivs" age to zero
-    # Reset_indivs - Identify individuals who die in this timestep, either reach max age or random death rate
-    vals['Age'] += 1
-    reset_indivs = Reset(Age=vals['Age'], demog=demog, params=params)
-
-    # Resetting new parameters for all new individuals created
-    if(len(reset_indivs) > 0):
-        vals = Reset_vals(vals, reset_indivs, params, distToUse)
+        # Resetting new parameters for all new individuals created
+        if(len(reset_indivs) > 0):
+            vals = Reset_vals(vals, reset_indivs, params, distToUse, rng)
     
     #me = 2
     #print(vals['Age'][me],vals['No_Inf'][me],vals['bact_load'][me],':',vals['IndI'][me],vals['IndD'][me],vals['T_latent'][me],vals['T_ID'][me],vals['T_D'][me])
@@ -251,27 +239,54 @@ def stepF_fixed(vals, params, demog, bet, distToUse = "Poisson"):
 
 
 def get_Intervention_times(Intervention_dates, Start_date, burnin):
-    Intervention_times = []
-    for i in range(0, len(Intervention_dates)):
-        Intervention_times.append(burnin + int((Intervention_dates[i] - Start_date).days/7))
-    return np.array(Intervention_times)
+    return interventionWeeks(np.array(Intervention_dates, dtype='datetime64[D]'), Start_date, burnin)
 
 
 
 def getlambdaStep(params, Age, bact_load, IndD, bet, demog,
-    vaccinated,time_since_vaccinated):
+    vaccinated,time_since_vaccinated, protection = None, cohorts = None):
 
-    y_children = np.where(np.logical_and(Age >= 0, Age < 9 * 52))[0]  # Young children
-    o_children = np.where(np.logical_and(Age >= 9 * 52, Age < 15 * 52))[0]  # Older children
-    adults = np.where(Age >= 15 * 52)[0]  # Adults
+    groups = getAgeGroups(Age, params, cohorts)
+    loadSums, groupSizes = getGroupLoads(bact_load, groups)
+    A = getGroupLambdas(params, bet, loadSums, groupSizes)
+    return getIndividualLambdas(params, A, groups, IndD, vaccinated, time_since_vaccinated, protection)
 
-    totalLoad = np.array([np.sum(bact_load[y_children]) / len(y_children),
-    np.sum(bact_load[o_children]) / len(o_children), np.sum(bact_load[adults]) / len(adults)])
-    prevLambda = bet * (params['v_1'] * totalLoad + params['v_2'] * (totalLoad ** (params['phi'] + 1)))
+def getAgeGroups(Age, params, cohorts = None):
+    '''
+    Indices of young children, older children and adults, the three age groups which mix.
+    If a CohortIndex of the population is given as cohorts, the groups are slices of its
+    order, rather than found by comparing Age.
+    '''
+    youngChildMaxAge = derived(params, 'young_child_max_age')
+    olderChildMaxAge = derived(params, 'older_child_max_age')
+    if cohorts is not None:
+        return (cohorts.members(0, youngChildMaxAge, ordered=False),
+                cohorts.members(youngChildMaxAge, olderChildMaxAge, ordered=False),
+                cohorts.members(olderChildMaxAge, ordered=False))
+    y_children = np.where(np.logical_and(Age >= 0, Age < youngChildMaxAge))[0]  # Young children
+    o_children = np.where(np.logical_and(Age >= youngChildMaxAge, Age < olderChildMaxAge))[0]  # Older children
+    adults = np.where(Age >= olderChildMaxAge)[0]  # Adults
+    return y_children, o_children, adults
+
+def getGroupLoads(bact_load, groups):
+    '''
+    Total bacterial load and number of people in each age group. These can be
+    added up over parts of the population before calling getGroupLambdas.
+    '''
+    loadSums = np.array([np.sum(bact_load[group]) for group in groups])
+    groupSizes = np.array([len(group) for group in groups])
+    return loadSums, groupSizes
 
-    a = len(y_children)/params['N']
-    b = len(o_children)/params['N']
-    c = len(adults)/params['N']
+def getGroupLambdas(params, bet, loadSums, groupSizes):
+    '''
+    Infection pressure on each age group, from the total bacterial load and size of each group.
+    '''
+    totalLoad = loadSums / groupSizes
+    prevLambda = bet * (params['v_1'] * totalLoad + params['v_2'] * (totalLoad ** derived(params, 'phi_plus_1')))
+
+    a = groupSizes[0]/params['N']
+    b = groupSizes[1]/params['N']
+    c = groupSizes[2]/params['N']
     epsm = 1 - params['epsilon']
     eps =  params['epsilon']
     # this was previously incorrectly specified in the python code, due to social mixing being wrong
@@ -283,64 +298,80 @@ def getlambdaStep(params, Age, bact_load, IndD, bet, demog,
         prevLambda[0]*a*epsm + prevLambda[1]*b * epsm + eps * prevLambda[1] + prevLambda[2]*epsm*c,
         prevLambda[0]*a*epsm + prevLambda[1]*epsm*b + prevLambda[2]*c * epsm + eps * prevLambda[2],
     ]
-    returned = np.ones(params['N'])
+    return A
+
+def getIndividualLambdas(params, A, groups, IndD, vaccinated, time_since_vaccinated, protection = None):
+    '''
+    Infection pressure on each person given the infection pressure on each age group.
+    protection is the people protected by the vaccine and the reduction in the infection
+    pressure on each of them, as returned by vaccineProtection. If it isn't given it is
+    calculated from vaccinated and time_since_vaccinated.
+    '''
+    y_children, o_children, adults = groups
+    returned = np.ones(len(IndD))
     returned[y_children] = A[0]
     returned[o_children] = A[1]
     returned[adults] = A[2]
 
-    # add reduction in lambda according to who has been vaccinated
-    prob_reduction = params["vacc_prob_block_transmission"]
+    if protection is None and np.any(vaccinated):
+        # add reduction in lambda according to who has been vaccinated
+        prob_reduction = params["vacc_prob_block_transmission"]
 
-    # add impact of waning using a linear slope. After waning period assumed vaccine has zero impact.
-    prob_reduction = prob_reduction * (- time_since_vaccinated / params["vacc_waning_length"] + 1)
-    prob_reduction = np.maximum(prob_reduction,0)
+        # add impact of waning using a linear slope. After waning period assumed vaccine has zero impact.
+        prob_reduction = prob_reduction * (- time_since_vaccinated / params["vacc_waning_length"] + 1)
+        prob_reduction = np.maximum(prob_reduction,0)
 
-    returned[vaccinated] = (1 - prob_reduction[vaccinated]) * returned[vaccinated]
+        returned[vaccinated] = (1 - prob_reduction[vaccinated]) * returned[vaccinated]
+    elif protection is not None:
+        protected, prob_reduction = protection
+        returned[protected] = (1 - prob_reduction) * returned[protected]
 
     # the factor of (0.5 + 0.5 * (1 - IndD)) reduces the infections pressure on people who are already diseased by 50%.
     return returned  * (0.5 + 0.5 * (1 - IndD))
 
-def Reset(Age, demog, params):
+def Reset(Age, demog, params, rng = np.random, cohorts = None):
 
     '''
     Function to identify individuals who either die due
     to background mortality, or who reach max age.
+    If a CohortIndex of the population is given as cohorts, it is used to find those over max age.
     '''
+    deaths = rng.uniform(size=len(Age)) < derived(demog, 'death_probability')
+    if cohorts is None:
+        return np.where(np.logical_or(deaths, Age > demog['max_age']))[0]
+    return np.union1d(np.where(deaths)[0], cohorts.members(demog['max_age'], closed='right'))
 
-    return np.where(np.logical_or(np.random.uniform(size=params['N']) < 1 - np.exp(- demog['tau']), Age > demog['max_age']))[0]
-
-def doMDAAgeRange(vals, params, ageStart, ageEnd):
+def doMDAAgeRange(vals, params, ageStart, ageEnd, rng = np.random):
     '''
     Decide who is cured during MDA based on treatment probabilities
     and probability of clearance given treated.
     '''
-    Age = vals['Age'] 
     cured_babies = []
     cured_older = []
     treated_babies = []
     treated_older = []
     if ageStart*52 <= 26:
-        babies = np.where(Age <= 26)[0]
-        treated_babies = babies[np.where(np.random.uniform(size=len(babies)) < vals['treatProbability'][babies])[0]]
-        cured_babies = treated_babies[np.random.uniform(size=len(treated_babies)) < (params['MDA_Eff'] * 0.5)]
+        babies = ageMembers(vals, upper=27)
+        treated_babies = babies[np.where(rng.uniform(size=len(babies)) < vals['treatProbability'][babies])[0]]
+        cured_babies = treated_babies[rng.uniform(size=len(treated_babies)) < (params['MDA_Eff'] * 0.5)]
 
-        older = np.where(np.logical_and(Age > 26, Age <= ageEnd *52))[0]
-        treated_older = older[np.where(np.random.uniform(size=len(older)) < vals['treatProbability'][older])[0]]
-        cured_older = treated_older[np.random.uniform(size=len(treated_older)) < (params['MDA_Eff'])]
+        older = ageMembers(vals, 26, ageEnd * 52, closed='right')
+        treated_older = older[np.where(rng.uniform(size=len(older)) < vals['treatProbability'][older])[0]]
+        cured_older = treated_older[rng.uniform(size=len(treated_older)) < (params['MDA_Eff'])]
     else:
-        older = np.where(np.logical_and(Age > ageStart * 52, Age <= ageEnd *52))[0]
-        treated_older = older[np.where(np.random.uniform(size=len(older)) < vals['treatProbability'][older])[0]]
-        cured_older = treated_older[np.random.uniform(size=len(treated_older)) < (params['MDA_Eff'])]
+        older = ageMembers(vals, ageStart * 52, ageEnd * 52, closed='right')
+        treated_older = older[np.where(rng.uniform(size=len(older)) < vals['treatProbability'][older])[0]]
+        cured_older = treated_older[rng.uniform(size=len(treated_older)) < (params['MDA_Eff'])]
     return np.append(cured_babies, cured_older), np.append(treated_babies, treated_older)
 
-def MDA_timestep_Age_range(vals, params, ageStart, ageEnd, t, label, demog):
+def MDA_timestep_Age_range(vals, params, ageStart, ageEnd, t, label, demog, rng = np.random):
 
     '''
     This is time step in which MDA occurs
     '''
     mda_t = t + label * 0.0001
     # Id who is treated and cured
-    cured_people, treated_people = doMDAAgeRange(vals = vals, params=params, ageStart = ageStart, ageEnd = ageEnd)
+    cured_people, treated_people = doMDAAgeRange(vals = vals, params=params, ageStart = ageStart, ageEnd = ageEnd, rng = rng)
 
     # Set treated/cured indivs infection status and bacterial load to 0
     vals['IndI'][cured_people.astype(int)] = 0       # clear infection they become I=0
@@ -348,66 +379,133 @@ def MDA_timestep_Age_range(vals, params, ageStart, ageEnd, t, label, demog):
     vals['T_ID'][cured_people.astype(int)] = 0 # reset time in ID compartment
     vals['T_latent'][cured_people.astype(int)] = 0 # reset time in latent compartment
 
-    treatedAges, _ = np.histogram(
-                            vals["Age"][treated_people.astype(int)]/52, 
-                            bins=np.arange(int(demog['max_age']/52) + 1))
+    treatedAges = ageYearHistogram(vals, int(demog['max_age']/52), treated_people.astype(int))
     vals["n_treatments"][
             str(mda_t) + ", MDA (campaign " + str(label) + ")"
         ] = treatedAges
         
-    n_people_by_age, _ = np.histogram(
-            vals["Age"]/52,
-            bins=np.arange(0, int(demog['max_age']/52)+ 1),
-        )
+    n_people_by_age = ageYearHistogram(vals, int(demog['max_age']/52))
     vals["n_treatments_population"][
             str(mda_t) + ", MDA (campaign " + str(label) + ")"
         ] = n_people_by_age
     
     return vals, len(treated_people)
 
-def vacc_timestep_Age_range(params, vals, vacc_round, VaccData, t, demog):
+def doMDACampaigns(vals, params, campaigns, rng = np.random):
+    '''
+    Decide who is treated and cured by each of the MDA campaigns done in the same week,
+    given as (ageStart, ageEnd, cov, label, systematic_non_compliance) as returned by
+    get_MDA_params. The treatment probabilities are redrawn before a campaign whose
+    coverage or systematic non-compliance differ from those of the previous one, and
+    someone in the age range of more than one campaign can be treated by each of them.
+
+    The random numbers are drawn in the same order as doing the campaigns one after the
+    other with doMDAAgeRange, so the results are the same, except with common random
+    numbers (see trachoma.crn), when everyone has a draw from the MDA stream.
+
+    Returns
+    -------
+    cured : array
+        everyone cured by any of the campaigns
+    treated : list of arrays
+        people treated by each campaign
+    '''
+    cured, treated = [], []
+    for ageStart, ageEnd, cov, label, systematic_non_compliance in campaigns:
+        check_if_we_need_to_redraw_probability_of_treatment(cov, systematic_non_compliance, vals, rng)
+        treatProbability = vals['treatProbability']
+        if isinstance(rng, CommonRandomNumbers):
+            # everyone has a treatment and a cure draw, so that each person's draws don't depend on who else is in
+            # the age range or was treated
+            draws = rng.stream('MDA')
+            treatDraws = draws.uniform(size=len(treatProbability))
+            cureDraws = draws.uniform(size=len(treatProbability))
+            babies = ageMembers(vals, upper=27) if ageStart*52 <= 26 else np.zeros(0, dtype=np.int64)
+            older = ageMembers(vals, max(ageStart * 52, 26), ageEnd * 52, closed='right')
+            treatedBabies = babies[treatDraws[babies] < treatProbability[babies]]
+            treatedOlder = older[treatDraws[older] < treatProbability[older]]
+            cured.append(treatedBabies[cureDraws[treatedBabies] < params['MDA_Eff'] * 0.5])
+            cured.append(treatedOlder[cureDraws[treatedOlder] < params['MDA_Eff']])
+            treated.append(np.concatenate([treatedBabies, treatedOlder]))
+        elif ageStart*52 <= 26:
+            # babies are treated at half the efficacy
+            babies = ageMembers(vals, upper=27)
+            older = ageMembers(vals, 26, ageEnd * 52, closed='right')
+            treatedBabies = babies[rng.uniform(size=len(babies)) < treatProbability[babies]]
+            # the draws for curing the babies and treating the older people are consecutive, so are drawn together
+            draws = rng.uniform(size=len(treatedBabies) + len(older))
+            cured.append(treatedBabies[draws[:len(treatedBabies)] < params['MDA_Eff'] * 0.5])
+            treatedOlder = older[draws[len(treatedBabies):] < treatProbability[older]]
+            treated.append(np.concatenate([treatedBabies, treatedOlder]))
+            cured.append(treatedOlder[rng.uniform(size=len(treatedOlder)) < params['MDA_Eff']])
+        else:
+            older = ageMembers(vals, ageStart * 52, ageEnd * 52, closed='right')
+            treatedOlder = older[rng.uniform(size=len(older)) < treatProbability[older]]
+            treated.append(treatedOlder)
+            cured.append(treatedOlder[rng.uniform(size=len(treatedOlder)) < params['MDA_Eff']])
+    return np.unique(np.concatenate(cured)), treated
+
+def MDA_campaigns_Age_range(vals, params, campaigns, t, demog, rng = np.random):
+
+    '''
+    MDA for all the campaigns in a week, as with MDA_timestep_Age_range for each of them
+    (after check_if_we_need_to_redraw_probability_of_treatment). campaigns are as in
+    doMDACampaigns. Returns vals and the number of people treated by each campaign.
+    '''
+    cured_people, treated_people = doMDACampaigns(vals, params, campaigns, rng)
+
+    # the treatment of each campaign clears the same states, so everyone cured is updated once
+    vals['IndI'][cured_people] = 0
+    vals['bact_load'][cured_people] = 0
+    vals['T_ID'][cured_people] = 0
+    vals['T_latent'][cured_people] = 0
+
+    nYears = int(demog['max_age']/52)
+    for (ageStart, ageEnd, cov, label, snc), treated in zip(campaigns, treated_people):
+        mda_t = t + label * 0.0001
+        vals["n_treatments"][str(mda_t) + ", MDA (campaign " + str(label) + ")"] = ageYearHistogram(vals, nYears, treated)
+        vals["n_treatments_population"][str(mda_t) + ", MDA (campaign " + str(label) + ")"] = ageYearHistogram(vals, nYears)
+    return vals, [len(treated) for treated in treated_people]
+
+def vacc_timestep_Age_range(params, vals, vacc_round, VaccData, t, demog, rng = np.random):
 
     '''
     This is time step in which MDA occurs
     '''
 
     # Do vaccination for this vaccine round
-    vals = doVaccAgeRange(params, vals, vacc_round, VaccData, t, demog)
+    vals = doVaccAgeRange(params, vals, vacc_round, VaccData, t, demog, rng)
     
    
     return vals
 
 
-def doVaccAgeRange(params, vals, vacc_round, VaccData, t, demog):
+def doVaccAgeRange(params, vals, vacc_round, VaccData, t, demog, rng = np.random):
 
     '''
     Decide who is vaccinated based coverage and age range    
     '''
     label = VaccData[vacc_round][4]
     vacc_t = t + label * 0.0001
-    Age = vals['Age']
     ageStart = VaccData[vacc_round][1]
     ageEnd = VaccData[vacc_round][2]
-    ageRange = np.logical_and(Age >= ageStart * 52, Age < ageEnd *52)
-    index_vaccinated = np.random.rand(params['N']) < VaccData[vacc_round][3]
-    vaccInAgeRange = np.logical_and(ageRange, index_vaccinated)
+    ageRange = ageMembers(vals, ageStart * 52, ageEnd * 52, ordered = False)
+    index_vaccinated = streamFor(rng, 'vaccination').rand(params['N']) < VaccData[vacc_round][3]
+    vaccInAgeRange = ageRange[index_vaccinated[ageRange]]
     vals['vaccinated'][vaccInAgeRange] = True
     vals['time_since_vaccinated'][vaccInAgeRange] = 0
-    vals['nDosesVacc'][VaccData[vacc_round][-2]] += np.count_nonzero(vaccInAgeRange)
+    if 'vaccination' in vals:
+        vals['vaccination'].vaccinate(vaccInAgeRange)
+    vals['nDosesVacc'][VaccData[vacc_round][-2]] += len(vaccInAgeRange)
     vals['numVacc'][VaccData[vacc_round][-2]] += 1
-    vals['coverageVacc'][VaccData[vacc_round][-2]] += np.count_nonzero(vaccInAgeRange)/np.count_nonzero(ageRange)
+    vals['coverageVacc'][VaccData[vacc_round][-2]] += len(vaccInAgeRange)/len(ageRange)
 
-    vaccAges, _ = np.histogram(
-                            vals["Age"][vaccInAgeRange]/52, 
-                            bins=np.arange(int(demog['max_age']/52) + 1))
+    vaccAges = ageYearHistogram(vals, int(demog['max_age']/52), vaccInAgeRange)
     vals["n_vaccinated"][
             str(vacc_t) + ", Vaccination (campaign " + str(label) + ")"
         ] = vaccAges
         
-    n_people_by_age, _ = np.histogram(
-            vals["Age"]/52,
-            bins=np.arange(0, int(demog['max_age']/52)+ 1),
-        )
+    n_people_by_age = ageYearHistogram(vals, int(demog['max_age']/52))
     vals["n_vaccinated_population"][
             str(vacc_t) + ", Vaccination (campaign " + str(label) + ")"
         ] = n_people_by_age
@@ -435,7 +533,8 @@ def ID_period_function(newDis, params, vals):
     '''
     Ind_ID_period_base  =vals['Ind_ID_period_base'][newDis]
     No_Inf = vals['No_Inf'][newDis]
-    id_periods = 1/((1/Ind_ID_period_base - 1/params['min_ID']) * np.exp(-params['inf_red'] * (No_Inf - 1)) + 1/params['min_ID'])
+    inv_min_ID = derived(params, 'inv_min_ID')
+    id_periods = 1/((1/Ind_ID_period_base - inv_min_ID) * np.exp(-params['inf_red'] * (No_Inf - 1)) + inv_min_ID)
 
     # If vaccinated reduce bacterial load by a fixed proportion
     prob_reduction = params["vacc_reduce_duration"]
@@ -455,9 +554,20 @@ def D_period_function(Ind_D_period_base, No_Inf, params, Age):
     '''
     ag = 0.00179
     aq = 0.0368
-    T_D = np.round(1/((1/Ind_D_period_base - 1/params['min_D']) * np.exp(- params['dis_red'] * (No_Inf - 1)) + 1/params['min_D']))
+    inv_min_D = derived(params, 'inv_min_D')
+    T_D = np.round(1/((1/Ind_D_period_base - inv_min_D) * np.exp(- params['dis_red'] * (No_Inf - 1)) + inv_min_D))
     return T_D
 
+def vaccineProtection(vals, params):
+    '''
+    The people protected by the vaccine against transmission and the reduction in the
+    infection pressure on each of them, from the VaccinationStamps in vals['vaccination'].
+    None if there aren't any stamps.
+    '''
+    if 'vaccination' in vals:
+        return vals['vaccination'].protection(params)
+    return None
+
 def bacterialLoad(params,vals):
 
     '''
@@ -477,8 +587,8 @@ def bacterialLoad(params,vals):
         array of bacterial loads subsetted by newInfectious
     '''
     No_Inf = vals['No_Inf']
-    b1 = 1
-    ep2 = 0.114
+    b1 = params.get('b1', 1)
+    ep2 = params.get('ep2', 0.114)
     # we can calculate the bacterial load for everyone and then just see which
     # people have active infection and then multiply by an indicator of this.
     # the following line finds the people who have an active infection
@@ -487,7 +597,7 @@ def bacterialLoad(params,vals):
     
     # If vaccinated reduce bacterial load by a fixed proportion
     prob_reduction = params["vacc_reduce_bacterial_load"]
-    vaccinated = vals['vaccinated']
+    vaccinated = vals['vaccination'].people if 'vaccination' in vals else vals['vaccinated']
 
     bacterial_loads[vaccinated] = (1 - prob_reduction) * bacterial_loads[vaccinated]
 
@@ -495,7 +605,7 @@ def bacterialLoad(params,vals):
 
 
 
-def drawTreatmentProbabilities(n, cov, snc):
+def drawTreatmentProbabilities(n, cov, snc, rng = np.random):
 
     """
     Draw the treatment probabilities for the value of coverage and snc given.
@@ -510,11 +620,26 @@ def drawTreatmentProbabilities(n, cov, snc):
     elif(snc > 0):
         alpha = cov * (1-snc)/snc
         beta = (1-cov)*(1-snc)/snc
-        return np.random.beta(alpha, beta, n)
+        return rng.beta(alpha, beta, n)
     return np.ones(n) * cov 
 
 
-def editTreatProbability(vals, cov, snc):
+def newTreatmentProbabilities(vals, indices, rng = np.random):
+
+    """
+    Treatment probabilities of people who have just been born or imported. In compliance quantile
+    mode (see trachoma.compliance) they are given new compliance quantiles, otherwise the
+    probabilities are drawn from the beta distribution.
+    """
+
+    if 'compliance_quantile' in vals:
+        vals['compliance_quantile'][indices] = rng.uniform(size=len(indices))
+        return treatmentProbabilities(vals['compliance_quantile'][indices], vals['MDA_coverage'],
+                                      vals['systematic_non_compliance'])
+    return drawTreatmentProbabilities(len(indices), vals['MDA_coverage'], vals['systematic_non_compliance'], rng)
+
+
+def editTreatProbability(vals, cov, snc, rng = np.random):
 
     """
     Choose new values for treatment probability (e.g. for when coverage or snc change)
@@ -523,50 +648,49 @@ def editTreatProbability(vals, cov, snc):
     I.e. if previously you were the most likely person to get treated, you still will be after this
     """
 
-    if snc > 0:
+    if 'compliance_quantile' in vals:
+        # the probabilities follow from each person's compliance quantile, so nothing is drawn
+        vals['treatProbability'] = treatmentProbabilities(vals['compliance_quantile'], cov, snc)
+    elif snc > 0:
         # Draw probabilities from the beta distribution
-        treatProbabilities = drawTreatmentProbabilities(len(vals['IndI']), cov, snc)
+        treatProbabilities = drawTreatmentProbabilities(len(vals['IndI']), cov, snc, rng)
         # Sort these values so that they are in ascending order so they can later be matched with people
         treatProbabilities.sort()
 
-        # Store the current value of the treatProbability 
-        oldTreatProbabilities = vals['treatProbability']
-
-        # Sort the indices array based on the values in oldTreatProbabilities
-        indices = np.argsort(oldTreatProbabilities)
+        # Sort the indices array based on the values in the current treatProbability
+        indices = np.argsort(vals['treatProbability'])
         # Assign the newly drawn treatment probabilities to the appropriate individuals
-        for rank, person_index in enumerate(indices):
-            vals['treatProbability'][person_index] = treatProbabilities[rank]
+        vals['treatProbability'][indices] = treatProbabilities
     else:
         vals['treatProbability'] = np.ones(len(vals['IndI'])) * cov
 
 
-def Set_inits(params, demog, sim_params, MDAData, numpy_state, distToUse = "Poisson"):
+def Set_inits(params, demog, sim_params, MDAData, numpy_state, distToUse = "Poisson", rng = np.random):
 
     '''
     Set initial values.
     '''
 
-    np.random.set_state(numpy_state)
+    rng.set_state(numpy_state)
     MDA_coverage = 0
     treatProbability = np.full(shape=params['N'], fill_value=np.nan, dtype=float)
     systematic_non_compliance = params['rho']
     if distToUse == "Poisson":
-        Ind_ID_period_base=np.random.poisson(lam=params['av_ID_duration'], size=params['N'])
+        Ind_ID_period_base=rng.poisson(lam=params['av_ID_duration'], size=params['N'])
 
             # Individual's baseline diseased period (first infection)
-        Ind_D_period_base=np.random.poisson(lam=params['av_D_duration'], size=params['N'])
+        Ind_D_period_base=rng.poisson(lam=params['av_D_duration'], size=params['N'])
     else:
-        Ind_ID_period_base= np.round(np.random.exponential(scale=params['av_ID_duration'], size=params['N']))
+        Ind_ID_period_base= np.round(rng.exponential(scale=params['av_ID_duration'], size=params['N']))
 
             # Individual's baseline diseased period (first infection)
-        Ind_D_period_base= np.round(np.random.exponential(scale=params['av_D_duration'], size=params['N']))
+        Ind_D_period_base= np.round(rng.exponential(scale=params['av_D_duration'], size=params['N']))
         Ind_ID_period_base[Ind_ID_period_base == 0] = 1
         Ind_D_period_base[Ind_D_period_base == 0] = 1
 
     if (len(MDAData) > 0):
         MDA_coverage = MDAData[0][3]
-        treatProbability = drawTreatmentProbabilities(params['N'], MDA_coverage, systematic_non_compliance)
+        treatProbability = drawTreatmentProbabilities(params['N'], MDA_coverage, systematic_non_compliance, rng)
     vals = dict(
 
         # Individual's infected status
@@ -600,7 +724,7 @@ def Set_inits(params, demog, sim_params, MDAData, numpy_state, distToUse = "Pois
         bact_load=np.zeros(params['N']),
 
         # Age distribution
-        Age=init_ages(params=params, demog=demog, numpy_state=numpy_state),
+        Age=init_ages(params=params, demog=demog, numpy_state=numpy_state, rng=rng),
 
         # Number of MDA rounds
         N_MDA=sim_params['N_MDA'],
@@ -627,14 +751,28 @@ def Set_inits(params, demog, sim_params, MDAData, numpy_state, distToUse = "Pois
 
     return vals
 
-def Reset_vals(vals, reset_indivs, params, distToUse = "Poisson"):
+def Reset_vals(vals, reset_indivs, params, distToUse = "Poisson", rng = np.random):
 
     '''
     Set initial values.
     '''
+    maxID = np.max(vals['ids'])
+    vals = Reset_state(vals, reset_indivs, params, distToUse, rng)
+    new_ids = np.arange(maxID + 1, maxID + len(reset_indivs) + 1)
+    vals['ids'][reset_indivs] = new_ids
+    return vals
+
+def Reset_state(vals, reset_indivs, params, distToUse = "Poisson", rng = np.random):
+
+    '''
+    Reset the state of individuals who have died and been replaced by newborns,
+    apart from their ids.
+    '''
     numResetIndivs = len(reset_indivs)
-    maxID = max(vals['ids'])
+    draws = streamFor(rng, 'demography')
     vals['Age'][reset_indivs] = 0
+    if 'cohorts' in vals:
+        vals['cohorts'].update(reset_indivs, vals['Age'])
     vals['IndI'][reset_indivs] = 0
     vals['IndD'][reset_indivs] = 0
     vals['No_Inf'][reset_indivs] = 0
@@ -643,59 +781,61 @@ def Reset_vals(vals, reset_indivs, params, distToUse = "Poisson"):
     vals['T_D'][reset_indivs] = 0
     vals['vaccinated'][reset_indivs] = False
     vals['time_since_vaccinated'][reset_indivs] = 0
+    if 'vaccination' in vals:
+        vals['vaccination'].remove(reset_indivs)
     if distToUse == "Poisson":
-        vals['Ind_ID_period_base'][reset_indivs] = np.random.poisson(lam=params['av_ID_duration'], size=numResetIndivs)
-        vals['Ind_D_period_base'][reset_indivs] = np.random.poisson(lam=params['av_D_duration'], size=numResetIndivs)
+        vals['Ind_ID_period_base'][reset_indivs] = draws.poisson(lam=params['av_ID_duration'], size=numResetIndivs)
+        vals['Ind_D_period_base'][reset_indivs] = draws.poisson(lam=params['av_D_duration'], size=numResetIndivs)
     else:
-        ID_periods = np.round(np.random.exponential(scale=params['av_ID_duration'], size=numResetIndivs))
+        ID_periods = np.round(draws.exponential(scale=params['av_ID_duration'], size=numResetIndivs))
         ID_periods[ID_periods == 0] = 1
         vals['Ind_ID_period_base'][reset_indivs] = ID_periods
-        D_periods = np.round(np.random.exponential(scale=params['av_D_duration'], size=numResetIndivs))
+        D_periods = np.round(draws.exponential(scale=params['av_D_duration'], size=numResetIndivs))
         D_periods[D_periods == 0] = 1
         vals['Ind_D_period_base'][reset_indivs] = D_periods
     
     vals['bact_load'][reset_indivs] = 0
-    vals['treatProbability'][reset_indivs] = drawTreatmentProbabilities(numResetIndivs, vals['MDA_coverage'], vals['systematic_non_compliance']),
-    new_ids = np.arange(maxID + 1, maxID + numResetIndivs + 1)
-    vals['ids'][reset_indivs] = new_ids
+    vals['treatProbability'][reset_indivs] = newTreatmentProbabilities(vals, reset_indivs, streamFor(rng, 'compliance'))
     return vals
 
-def Import_individual(vals, import_indivs, params, demog, distToUse = "Poisson"):
+def Import_individual(vals, import_indivs, params, demog, distToUse = "Poisson", rng = np.random):
     '''
     When someone is imported, we assume that they are infected and diseased and some random proportion
     of time through their infection period. We will assume that they are at the average number of infecteds
     for the whole population in order to draw these times too.
     '''
-    ages = np.arange(1, 1 + demog['max_age'])
-
     # ensure the population is in equilibrium
-    propAges = np.empty(len(ages))
-    propAges[:-1] = np.exp(-ages[:-1] / demog['mean_age']) - np.exp(-ages[1:] / demog['mean_age'])
-    propAges[-1] = 1 - np.sum(propAges[:-1])
+    ages = derived(demog, 'import_ages')
+    propAges = derived(demog, 'import_age_probabilities')
     numImportIndivs = len(import_indivs)
-    vals['Age'][import_indivs] = np.random.choice(a=ages, size=numImportIndivs, replace=True, p=propAges)
+    draws = streamFor(rng, 'importation')
+    vals['Age'][import_indivs] = draws.choice(a=ages, size=numImportIndivs, replace=True, p=propAges)
+    if 'cohorts' in vals:
+        vals['cohorts'].update(import_indivs, vals['Age'])
 
     vals['IndI'][import_indivs] = 1
     vals['IndD'][import_indivs] = 1
     vals['No_Inf'][import_indivs] = max(1, round(np.mean(vals['No_Inf'])))
     if distToUse == "Poisson":
-        vals['Ind_ID_period_base'][import_indivs] = np.random.poisson(lam=params['av_ID_duration'], size=numImportIndivs)
-        vals['Ind_D_period_base'][import_indivs] = np.random.poisson(lam=params['av_D_duration'], size=numImportIndivs)
+        vals['Ind_ID_period_base'][import_indivs] = draws.poisson(lam=params['av_ID_duration'], size=numImportIndivs)
+        vals['Ind_D_period_base'][import_indivs] = draws.poisson(lam=params['av_D_duration'], size=numImportIndivs)
     else:
-        ID_periods = np.round(np.random.exponential(scale=params['av_ID_duration'], size=numImportIndivs))
+        ID_periods = np.round(draws.exponential(scale=params['av_ID_duration'], size=numImportIndivs))
         ID_periods[ID_periods == 0] = 1
         vals['Ind_ID_period_base'][import_indivs] = ID_periods
-        D_periods = np.round(np.random.exponential(scale=params['av_D_duration'], size=numImportIndivs))
+        D_periods = np.round(draws.exponential(scale=params['av_D_duration'], size=numImportIndivs))
         D_periods[D_periods == 0] = 1
         vals['Ind_D_period_base'][import_indivs] = D_periods
     vals['T_latent'][import_indivs] = 0
-    vals['T_ID'][import_indivs] = ID_period_function(import_indivs, params, vals) * np.random.uniform()
+    vals['T_ID'][import_indivs] = ID_period_function(import_indivs, params, vals) * draws.uniform()
     vals['T_D'][import_indivs] = 0
     vals['vaccinated'][import_indivs] = False
     vals['time_since_vaccinated'][import_indivs] = 0
+    if 'vaccination' in vals:
+        vals['vaccination'].remove(import_indivs)
 
     vals['bact_load'] = bacterialLoad(params, vals)
-    vals['treatProbability'][import_indivs] = drawTreatmentProbabilities(numImportIndivs, vals['MDA_coverage'], vals['systematic_non_compliance'])
+    vals['treatProbability'][import_indivs] = newTreatmentProbabilities(vals, import_indivs, streamFor(rng, 'compliance'))
     return vals
 
 
@@ -800,7 +940,7 @@ def Check_and_init_vaccination_state(params,vals):
 
     return vals
 
-def Check_and_init_MDA_treatment_state(params, vals, MDAData, numpy_state):
+def Check_and_init_MDA_treatment_state(params, vals, MDAData, numpy_state, rng = np.random):
     '''
     Check if "treatProbability","MDA_coverage" and "sytematic_non_compliance" keys are in `vals`. If they are
     not then initialize for population
@@ -818,7 +958,7 @@ def Check_and_init_MDA_treatment_state(params, vals, MDAData, numpy_state):
     dict 
         vals dictionary modified with vaccination state
     '''
-    np.random.set_state(numpy_state)
+    rng.set_state(numpy_state)
     if not set(["treatProbability","MDA_coverage", "systematic_non_compliance"]).issubset(vals.keys()):
         MDA_coverage = 0
         treatProbability = np.full(shape=params['N'], fill_value=np.nan, dtype=float)
@@ -826,20 +966,30 @@ def Check_and_init_MDA_treatment_state(params, vals, MDAData, numpy_state):
         vals["treatProbability"] = treatProbability
         if (len(MDAData) > 0):
             MDA_coverage = MDAData[0][3]
-            vals["treatProbability"] = drawTreatmentProbabilities(params['N'], MDA_coverage, systematic_non_compliance)
+            vals["treatProbability"] = drawTreatmentProbabilities(params['N'], MDA_coverage, systematic_non_compliance, rng)
         vals["MDA_coverage"] = MDA_coverage
         vals["systematic_non_compliance"] = systematic_non_compliance
 
     return vals
 
-def init_ages(params, demog, numpy_state):
+def Check_and_init_compliance_quantiles(vals, rng = np.random):
+    '''
+    Switch the population to compliance quantile mode (see trachoma.compliance) if it isn't already,
+    giving everyone the quantile of their current treatment probability.
+    '''
+    if "compliance_quantile" not in vals:
+        vals["compliance_quantile"] = complianceQuantiles(vals["treatProbability"], vals["MDA_coverage"],
+                                                          vals["systematic_non_compliance"], rng)
+    return vals
+
+def init_ages(params, demog, numpy_state, rng = np.random):
 
     '''
     Initialise age distribution
     Note: ages are in weeks.
     '''
 
-    np.random.set_state(numpy_state)
+    rng.set_state(numpy_state)
 
     ages = np.arange(1, 1 + demog['max_age'])
 
@@ -848,18 +998,14 @@ def init_ages(params, demog, numpy_state):
     propAges[:-1] = np.exp(-ages[:-1] / demog['mean_age']) - np.exp(-ages[1:] / demog['mean_age'])
     propAges[-1] = 1 - np.sum(propAges[:-1])
 
-    return np.random.choice(a=ages, size=params['N'], replace=True, p=propAges)
+    return rng.choice(a=ages, size=params['N'], replace=True, p=propAges)
 
 
 
 def SecularTrendBetaDecrease(timesim, burnin, bet, params):
-    simbeta = bet * np.ones(timesim + 1)
     if params['SecularTrendIndicator'] == 1:
-        for j in range(round(burnin/52),round(len(simbeta)/52)):
-            bet1 = simbeta[j * 52] 
-            for i in range(52+1):
-                simbeta[(j * 52) + i] = bet1 - (params['SecularTrendYearlyBetaDecrease'] * bet1 * i/52)
-    return simbeta
+        return secularTrendSchedule(bet, timesim + 1, burnin, params['SecularTrendYearlyBetaDecrease']).copy()
+    return bet * np.ones(timesim + 1)
 
 
 def numMDAsBeforeNextSurvey(surveyPrev):
@@ -884,9 +1030,9 @@ def get_MDA_params(MDAData, MDA_round_current, vals):
     systematic_non_compliance = vals['systematic_non_compliance']
     return ageStart, ageEnd, cov, label, systematic_non_compliance
 
-def check_if_we_need_to_redraw_probability_of_treatment(cov, systematic_non_compliance, vals):
+def check_if_we_need_to_redraw_probability_of_treatment(cov, systematic_non_compliance, vals, rng = np.random):
     if(cov != vals['MDA_coverage'])| (systematic_non_compliance != vals['systematic_non_compliance']):
-        editTreatProbability(vals, cov, systematic_non_compliance)
+        editTreatProbability(vals, cov, systematic_non_compliance, streamFor(rng, 'compliance'))
         vals['MDA_coverage'] = cov
         vals['systematic_non_compliance'] = systematic_non_compliance
     return vals
@@ -895,21 +1041,67 @@ def update_MDA_information_for_output(MDAData, MDA_round_current, num_treated_pe
     nDoses[MDAData[MDA_round_current][-2]] += num_treated_people
                     # increment number of MDAs
     numMDA[MDAData[MDA_round_current][-2]] += 1
-    coverage[MDAData[MDA_round_current][-2]] += num_treated_people / np.count_nonzero((vals['Age'] > ageStart * 52) & (vals['Age'] <= ageEnd * 52))
+    coverage[MDAData[MDA_round_current][-2]] += num_treated_people / ageCount(vals, ageStart * 52, ageEnd * 52, closed='right')
     return nDoses, numMDA, coverage
 
 def sim_Ind_MDA_Include_Survey(params, vals, timesim, burnin,
                                demog, bet, MDA_times, MDAData,
                                vacc_times, VaccData, outputTimes, 
-                               doSurvey, doIHMEOutput, numpy_state, distToUse  = "Poisson"):
+                               doSurvey, doIHMEOutput, numpy_state, distToUse  = "Poisson",
+                               profiler = NULL_PROFILER, telemetry = NULL_TELEMETRY, rng = np.random,
+                               adaptive_burnin = None):
 
     '''
     Function to run a single simulation with MDA at time points determined by function MDA_times.
     Output is true prevalence of infection/disease in children aged 1-9.
+
+    If a PhaseProfiler is given as profiler, the time, number of calls and peak memory
+    of each phase of the simulation are recorded in it.
+    If a Telemetry object is given as telemetry, throttled progress events are sent to it.
+    Random numbers are drawn from rng, which can be a np.random.RandomState or the np.random module,
+    or a trachoma.crn.CommonRandomNumbers, whose streams are keyed by the week of this simulation.
+    If a trachoma.burnin.AdaptiveBurnin is given as adaptive_burnin, the burnin is stopped once
+    the population is at equilibrium and the rest of it skipped (see advanceBurnin).
+    While it runs, vals['cohorts'] holds a trachoma.cohorts.CohortIndex of the population and
+    vals['vaccination'] a trachoma.vaccination.VaccinationStamps, in place of updating
+    vals['Age'] and vals['time_since_vaccinated'] every week. vals['Age'] is brought up to
+    date for the outputs and at the end (see trachoma.cohorts.syncAges).
+
+    The simulation is started by initSimulation, run week by week by advanceSimulation
+    and its outputs made by finaliseSimulation, which can be used to run part of a
+    simulation, or to continue copies of it (see forkSimulation).
+    '''
+    sim = initSimulation(params, vals, timesim, burnin, demog, bet, MDA_times, MDAData, vacc_times, VaccData,
+                         outputTimes, doSurvey, doIHMEOutput, numpy_state, distToUse, profiler, telemetry, rng)
+    if adaptive_burnin is not None:
+        advanceBurnin(sim, adaptive_burnin)
+    advanceSimulation(sim, timesim)
+    return finaliseSimulation(sim)
+
+
+def initSimulation(params, vals, timesim, burnin, demog, bet, MDA_times, MDAData, vacc_times, VaccData, outputTimes,
+                   doSurvey, doIHMEOutput, numpy_state, distToUse = "Poisson", profiler = NULL_PROFILER,
+                   telemetry = NULL_TELEMETRY, rng = np.random):
+
+    '''
+    Start a simulation as sim_Ind_MDA_Include_Survey does, up to its first week. Returns the
+    state of the simulation as a dict, holding vals and everything else which carries
+    over from week to week, with the next week to simulate as 'week'.
     '''
     outputTimes2 = copy.deepcopy(outputTimes)
     # when we are resuming previous simulations we use the provided random state
-    np.random.set_state(numpy_state)
+    rng.set_state(numpy_state)
+    if isinstance(rng, CommonRandomNumbers):
+        rng.setWeek(0)
+    # index of the population by birth week, to find people by age without comparing everyone's age
+    if np.issubdtype(vals['Age'].dtype, np.integer):
+        vals['cohorts'] = CohortIndex(vals['Age'])
+    # week of vaccination of everyone vaccinated, so that the times since vaccination don't have to be updated every
+    # week. Times since vaccination which aren't whole weeks are updated every week as before
+    try:
+        vals['vaccination'] = VaccinationStamps(vals['vaccinated'], vals['time_since_vaccinated'])
+    except ValueError:
+        pass
 
     #vacc_time = params['vacc_time']
     prevalence = []
@@ -922,7 +1114,8 @@ def sim_Ind_MDA_Include_Survey(params, vals, timesim, burnin,
     nMDAWholePop = 0
     numMDAForSurvey = -1
     if doSurvey:
-        surveyPrev, vals = returnSurveyPrev(vals, params['TestSensitivity'], params['TestSpecificity'], demog, 0, params['surveyCoverage'])
+        with profiler.phase('surveys'):
+            surveyPrev, vals = returnSurveyPrev(vals, params['TestSensitivity'], params['TestSpecificity'], demog, 0, params['surveyCoverage'], rng)
 
         # get a value for the number of MDAs to do before the next survey
         numMDAForSurvey = nMDAWholePop + numMDAsBeforeNextSurvey(surveyPrev)
@@ -954,47 +1147,81 @@ def sim_Ind_MDA_Include_Survey(params, vals, timesim, burnin,
     # no survey occurred in a year. Without this, we are likely to get outputs with different
     # number of rows in them for different simulations, as there may be different numbers of 
     # surveys based on the dynamics.
-    betas = SecularTrendBetaDecrease(timesim, burnin, bet, params)
+    # beta and the importation rate in each week
+    schedules = simulationSchedules(params, bet, timesim, burnin)
+    betas = schedules['beta']
+    importation_rates = schedules['importation_rate']
+
+    return dict(params=params, vals=vals, timesim=timesim, burnin=burnin, demog=demog, MDA_times=MDA_times,
+                MDAData=MDAData, vacc_times=vacc_times, VaccData=VaccData, doSurvey=doSurvey,
+                doIHMEOutput=doIHMEOutput, distToUse=distToUse, profiler=profiler, telemetry=telemetry, rng=rng,
+                betas=betas, importation_rates=importation_rates, prevalence=prevalence,
+                infections=infections, max_age=max_age, yearly_threshold_infs=yearly_threshold_infs,
+                surveyPass=surveyPass, surveyTime=surveyTime, nMDAWholePop=nMDAWholePop,
+                numMDAForSurvey=numMDAForSurvey, outputTimes2=outputTimes2, nextOutputTime=nextOutputTime,
+                results=results, nDoses=nDoses, coverage=coverage, numMDA=numMDA, prevNMDA=prevNMDA,
+                doneSurveyThisYear=doneSurveyThisYear, week=0)
 
-    for i in range( timesim):
-        if i % 52 == 0:
-            params['importation_rate'] *= params['importation_reduction_rate']
 
+def advanceSimulation(sim, until):
+
+    '''
+    Run the simulation sim (from initSimulation) up to the week until.
+    '''
+    params, vals, demog, rng = sim['params'], sim['vals'], sim['demog'], sim['rng']
+    timesim, burnin, distToUse = sim['timesim'], sim['burnin'], sim['distToUse']
+    MDA_times, MDAData, vacc_times, VaccData = sim['MDA_times'], sim['MDAData'], sim['vacc_times'], sim['VaccData']
+    doSurvey, doIHMEOutput, profiler, telemetry = sim['doSurvey'], sim['doIHMEOutput'], sim['profiler'], sim['telemetry']
+    betas, importation_rates, max_age = sim['betas'], sim['importation_rates'], sim['max_age']
+    prevalence, infections, yearly_threshold_infs = sim['prevalence'], sim['infections'], sim['yearly_threshold_infs']
+    outputTimes2, results = sim['outputTimes2'], sim['results']
+    # the state of the schedule of surveys and the counts of MDAs for the outputs, which are updated below
+    surveyPass, surveyTime, doneSurveyThisYear = sim['surveyPass'], sim['surveyTime'], sim['doneSurveyThisYear']
+    nMDAWholePop, numMDAForSurvey, nextOutputTime = sim['nMDAWholePop'], sim['numMDAForSurvey'], sim['nextOutputTime']
+    nDoses, coverage, numMDA, prevNMDA = sim['nDoses'], sim['coverage'], sim['numMDA'], sim['prevNMDA']
+
+    for i in range(sim['week'], until):
+        telemetry.progress(i, timesim)
+        if isinstance(rng, CommonRandomNumbers):
+            rng.setWeek(i)
         if ((i+1) % 52) == 0:
             # if we are after the burnin and haven't done a survey this year, then do a survey with 0 coverage
             # so that it is stored in the output later.
             if doneSurveyThisYear == False and i > burnin:
-                surveyPrev, vals = returnSurveyPrev(vals, params['TestSensitivity'], params['TestSpecificity'], demog, i/52, 0)
+                with profiler.phase('surveys'):
+                    surveyPrev, vals = returnSurveyPrev(vals, params['TestSensitivity'], params['TestSpecificity'], demog, i/52, 0, rng)
             doneSurveyThisYear = False
 
         if doIHMEOutput and i == nextOutputTime:
+            with profiler.phase('snapshots'):
+                # has the disease truly eliminated in the population
+                true_elimination = 1 if (sum(vals['IndI']) + sum(vals['IndD'])) == 0 else 0
+                # append the results to results variable
+                syncAges(vals)
+                results.append(outputResult(copy.deepcopy(vals), i, nDoses, coverage, numMDA-prevNMDA, 
+                                            vals['nSurvey'] - vals['prevNSurvey'], surveyPass, true_elimination,
+                                            vals['numVacc'] - vals['prevNVacc'], vals['nDosesVacc'] , vals['coverageVacc']))
+                # when will next Endgame output time be
+                nextOutputTime = min(outputTimes2)
+                # change next output time location in the all output variable to be after the end of the simulation
+                # then the next output will be done at the correct time
+                w = np.where(outputTimes2 == nextOutputTime)
+                outputTimes2[w] = timesim + 10
+                # save current num surveys, num MDAS as previous num surveys/MDAs, so next output we can tell how many were performed
+                # since last output
+                vals['prevNSurvey'] = copy.deepcopy(vals['nSurvey']) 
+                prevNMDA = copy.deepcopy(numMDA)
+                vals['prevNVacc'] = copy.deepcopy(vals['numVacc']) 
+                # set coverage and nDoses to 0, so that if these are non-zero, we know that they occured since last output
+                nDoses = np.zeros(MDAData[0][-1], dtype=object)
+                coverage = np.zeros(MDAData[0][-1], dtype=object)
             
-            # has the disease truly eliminated in the population
-            true_elimination = 1 if (sum(vals['IndI']) + sum(vals['IndD'])) == 0 else 0
-            # append the results to results variable
-            results.append(outputResult(copy.deepcopy(vals), i, nDoses, coverage, numMDA-prevNMDA, 
-                                        vals['nSurvey'] - vals['prevNSurvey'], surveyPass, true_elimination,
-                                        vals['numVacc'] - vals['prevNVacc'], vals['nDosesVacc'] , vals['coverageVacc']))
-            # when will next Endgame output time be
-            nextOutputTime = min(outputTimes2)
-            # change next output time location in the all output variable to be after the end of the simulation
-            # then the next output will be done at the correct time
-            w = np.where(outputTimes2 == nextOutputTime)
-            outputTimes2[w] = timesim + 10
-            # save current num surveys, num MDAS as previous num surveys/MDAs, so next output we can tell how many were performed
-            # since last output
-            vals['prevNSurvey'] = copy.deepcopy(vals['nSurvey']) 
-            prevNMDA = copy.deepcopy(numMDA)
-            vals['prevNVacc'] = copy.deepcopy(vals['numVacc']) 
-            # set coverage and nDoses to 0, so that if these are non-zero, we know that they occured since last output
-            nDoses = np.zeros(MDAData[0][-1], dtype=object)
-            coverage = np.zeros(MDAData[0][-1], dtype=object)
-            
-            vals['nDosesVacc'] = np.zeros(VaccData[0][-1], dtype=object)
-            vals['coverageVacc'] = np.zeros(VaccData[0][-1], dtype=object)
+                vals['nDosesVacc'] = np.zeros(VaccData[0][-1], dtype=object)
+                vals['coverageVacc'] = np.zeros(VaccData[0][-1], dtype=object)
             
         if doSurvey and i == surveyTime:    
-            surveyPrev, vals = returnSurveyPrev(vals, params['TestSensitivity'], params['TestSpecificity'], demog, i/52, params['surveyCoverage'])
+            with profiler.phase('surveys'):
+                surveyPrev, vals = returnSurveyPrev(vals, params['TestSensitivity'], params['TestSpecificity'], demog, i/52, params['surveyCoverage'], rng)
             doneSurveyThisYear = True
             # if the prevalence is <= 5%, then we have passed the survey and won't do any more MDA
             if surveyPrev <= 0.05:
@@ -1017,6 +1244,7 @@ def sim_Ind_MDA_Include_Survey(params, vals, timesim, burnin,
         
         if i in MDA_times:
             MDA_round = np.where(MDA_times == i)[0]
+            campaigns = []
             for l in range(len(MDA_round)):
                 MDA_round_current = MDA_round[l]
                 # we want to get the data corresponding to this MDA from the MDAdata
@@ -1027,72 +1255,156 @@ def sim_Ind_MDA_Include_Survey(params, vals, timesim, burnin,
                 # then class this as a whole population MDA and hence increment the nMDAWholePop by 1
                 if ((ageEnd - ageStart) >= 20) and cov > 0:
                     nMDAWholePop += 1    
-                # if cov or systematic non compliance have changed we need to re-draw the treatment probabilities
-                # check if these have changed here, and if they have, then we re-draw the probabilities
-                vals = check_if_we_need_to_redraw_probability_of_treatment(cov, systematic_non_compliance, vals)
-                # do the MDA for the age range specified by ageStart and ageEnd
-                vals, num_treated_people = MDA_timestep_Age_range(vals, params, ageStart, ageEnd, i/52, label, demog)
-                # keep track of doses and coverage of the MDA to be output later.
-                nDoses, numMDA, coverage = update_MDA_information_for_output(MDAData, MDA_round_current, num_treated_people,
-                                                                                vals, ageStart, ageEnd, nDoses, numMDA, coverage)
+                campaigns.append((ageStart, ageEnd, cov, label, systematic_non_compliance))
                 if nMDAWholePop == numMDAForSurvey and surveyPass < 2:
                     surveyTime = i + 25
+            # do all the MDAs of this week for the age ranges specified by ageStart and ageEnd. If cov or systematic
+            # non compliance change from one to the next we need to re-draw the treatment probabilities, which is done
+            # before each of them
+            with profiler.phase('MDA'):
+                vals, num_treated_people = MDA_campaigns_Age_range(vals, params, campaigns, i/52, demog, rng)
+                # keep track of doses and coverage of the MDA to be output later.
+                for MDA_round_current, campaign, num_treated in zip(MDA_round, campaigns, num_treated_people):
+                    nDoses, numMDA, coverage = update_MDA_information_for_output(MDAData, MDA_round_current, num_treated,
+                                                                                    vals, campaign[0], campaign[1], nDoses, numMDA, coverage)
                 
                 
         if i in vacc_times:
       
             vacc_round = np.where(vacc_times == i)[0]
-            if(len(vacc_round) == 1):
-                vacc_round = vacc_round[0]
-                vals = vacc_timestep_Age_range(params, vals, vacc_round, VaccData, i/52, demog)
-                
-            else:
-                for l in range(len(vacc_round)):
-                    vacc_round2 = copy.deepcopy(vacc_round[l])
-                    vals = vacc_timestep_Age_range(params, vals, vacc_round2, VaccData, i/52, demog)
+            with profiler.phase('vaccination'):
+                if(len(vacc_round) == 1):
+                    vacc_round = vacc_round[0]
+                    vals = vacc_timestep_Age_range(params, vals, vacc_round, VaccData, i/52, demog, rng)
+                    
+                else:
+                    for l in range(len(vacc_round)):
+                        vacc_round2 = copy.deepcopy(vacc_round[l])
+                        vals = vacc_timestep_Age_range(params, vals, vacc_round2, VaccData, i/52, demog, rng)
                    
             #vals = vaccinate_population(vals = vals, params = params)
         #else:  removed and deleted one indent in the line below to correct mistake.
         #if np.logical_and(i == surveyTime, surveyPass==0):     
        
-        vals = stepF_fixed(vals=vals, params=params, demog=demog, bet=betas[i], distToUse = distToUse)
-
-        children_ages_1_9 = np.logical_and(vals['Age'] < 10 * 52, vals['Age'] >= 52)
-        n_children_ages_1_9 = np.count_nonzero(children_ages_1_9)
-        n_true_diseased_children_1_9 = np.count_nonzero(vals['IndD'][children_ages_1_9])
-        n_true_infected_children_1_9 = np.count_nonzero(vals['IndI'][children_ages_1_9])
-        prevalence.append(n_true_diseased_children_1_9 / n_children_ages_1_9)
-        infections.append(n_true_infected_children_1_9 / n_children_ages_1_9)
-
-        large_infection_count = (vals['No_Inf'] > params['n_inf_sev'])
-        # Cast weights to integer to be able to count
-        a, _ = np.histogram(vals['Age'], bins=max_age, weights=large_infection_count.astype(int))
-        yearly_threshold_infs[i, :] = a / params['N']
+        vals = stepF_fixed(vals=vals, params=params, demog=demog, bet=betas[i], distToUse = distToUse,
+                           profiler = profiler, rng = rng, importation_rate = importation_rates[i])
+
+        with profiler.phase('metrics'):
+            children_ages_1_9 = ageMembers(vals, 52, 10 * 52, ordered = False)
+            n_children_ages_1_9 = len(children_ages_1_9)
+            n_true_diseased_children_1_9 = np.count_nonzero(vals['IndD'][children_ages_1_9])
+            n_true_infected_children_1_9 = np.count_nonzero(vals['IndI'][children_ages_1_9])
+            prevalence.append(n_true_diseased_children_1_9 / n_children_ages_1_9)
+            infections.append(n_true_infected_children_1_9 / n_children_ages_1_9)
+
+            large_infection_count = (vals['No_Inf'] > params['n_inf_sev'])
+            # Cast weights to integer to be able to count
+            a = ageHistogram(vals, max_age, weights=large_infection_count.astype(int))
+            yearly_threshold_infs[i, :] = a / params['N']
         # check if time to save variables to make Endgame outputs
         
 
             
+    sim.update(vals=vals, surveyPass=surveyPass, surveyTime=surveyTime, doneSurveyThisYear=doneSurveyThisYear,
+               nMDAWholePop=nMDAWholePop, numMDAForSurvey=numMDAForSurvey, nextOutputTime=nextOutputTime,
+               nDoses=nDoses, coverage=coverage, numMDA=numMDA, prevNMDA=prevNMDA)
+    sim['week'] = max(sim['week'], until)
+
+
+def advanceBurnin(sim, adaptive_burnin):
+
+    '''
+    Run the burnin of the simulation sim (from initSimulation) until it is stopped by
+    adaptive_burnin, a trachoma.burnin.AdaptiveBurnin, then skip the rest of it, so that
+    sim carries on from the end of the nominal burnin, or the first MDA, vaccination,
+    survey or output before it. The prevalence and infections of the weeks skipped are NaN.
+    Returns the number of weeks of burnin run, which is also returned in vals['Burnin_weeks']
+    by finaliseSimulation, with the number of weeks skipped in vals['Burnin_skipped_weeks'].
+    '''
+    # weeks of the first of the events after this week
+    events = [np.asarray(times) for times in (sim['MDA_times'], sim['vacc_times'], [sim['nextOutputTime']])]
+    if sim['doSurvey']:
+        events.append(np.asarray([sim['surveyTime']]))
+    events = np.concatenate([times[times >= sim['week']] for times in events])
+    end = int(min([sim['burnin']] + list(events)))
+    limit = end if adaptive_burnin.max_weeks is None else min(end, adaptive_burnin.max_weeks)
+    detector = adaptive_burnin.detector()
+    reason = 'max_weeks'
+    while sim['week'] < limit:
+        advanceSimulation(sim, sim['week'] + 1)
+        vals = sim['vals']
+        if (not np.any(vals['IndI']) and not np.any(vals['IndD'])
+                and not np.any(sim['importation_rates'][sim['week']:end])):
+            # nobody can be infected again before the end of the burnin
+            reason = 'extinct'
+            break
+        if detector.add([sim['prevalence'][-1], np.mean(vals['bact_load'])]):
+            reason = 'stationary'
+            break
+    weeks = sim['week']
+    sim['prevalence'].extend([np.nan] * (end - weeks))
+    sim['infections'].extend([np.nan] * (end - weeks))
+    sim['week'] = end
+    sim['burnin_weeks'] = weeks
+    sim['burnin_skipped_weeks'] = end - weeks
+    sim['telemetry'].emit('burnin', weeks=weeks, skipped=end - weeks, reason=reason)
+    return weeks
+
+
+def finaliseSimulation(sim):
+
+    '''
+    Outputs of the simulation sim, as returned by sim_Ind_MDA_Include_Survey.
+    '''
+    vals, rng = sim['vals'], sim['rng']
+    yearly_threshold_infs, prevalence, infections = sim['yearly_threshold_infs'], sim['prevalence'], sim['infections']
     vals['Yearly_threshold_infs'] = yearly_threshold_infs
     vals['True_Prev_Disease_children_1_9'] = prevalence # save the prevalence in children aged 1-9
     vals['True_Infections_Disease_children_1_9'] = infections # save the infections in children aged 1-9
-    vals['State'] = np.random.get_state() # save the state of the simulations
+    vals['State'] = rng.get_state() # save the state of the simulations
+    if 'burnin_weeks' in sim:
+        vals['Burnin_weeks'] = sim['burnin_weeks'] # length of an adaptive burnin
+        vals['Burnin_skipped_weeks'] = sim['burnin_skipped_weeks']
+    syncAges(vals)
+    vals.pop('cohorts', None)
+    if 'vaccination' in vals:
+        vals.pop('vaccination').write(vals['time_since_vaccinated'])
+
+    return vals, sim['results']
 
-    return vals, results
 
+def forkSimulation(sim, rng = None):
+
+    '''
+    Copy of the simulation sim (from initSimulation) which can be run separately from it.
+    The copy draws its random numbers from rng, by default a copy of the random state of
+    sim, in which case both continue the same way.
+    '''
+    fork = dict(sim)
+    for key in ['vals', 'prevalence', 'infections', 'yearly_threshold_infs', 'outputTimes2', 'results', 'nDoses',
+                'coverage', 'numMDA', 'prevNMDA']:
+        fork[key] = copy.deepcopy(sim[key])
+    if rng is None:
+        rng = np.random.RandomState()
+        rng.set_state(sim['rng'].get_state())
+    fork['rng'] = rng
+    return fork
 
 
 
-def returnSurveyPrev(vals, TestSensitivity, TestSpecificity, demog, t, surveyCoverage = 1):
+
+def returnSurveyPrev(vals, TestSensitivity, TestSpecificity, demog, t, surveyCoverage = 1, rng = np.random):
     '''
     Function to run a return the tested prevalence of 1-9 year olds.
     This includes sensitivity and specificity of the test.
     Will be used in surveying to decide if we should do MDA, and how many MDAs before next test
     '''
+    rng = streamFor(rng, 'survey')
     # survey 1-9 year olds
-    children_ages_1_9 = np.logical_and(vals['Age'] < 10 * 52, vals['Age'] >= 52)
+    children_ages_1_9 = ageMask(vals, 52, 10 * 52)
 
     # Draw random uniform numbers between 0 and 1 for each individual
-    random_draw = np.random.uniform(0, 1, size = len(vals['Age']))
+    random_draw = rng.uniform(0, 1, size = len(vals['Age']))
 
     # Combine conditions: children ages 1-9 and random draw below surveyCoverage
     surveyed_children  = np.logical_and(children_ages_1_9, random_draw < surveyCoverage)
@@ -1104,17 +1416,11 @@ def returnSurveyPrev(vals, TestSensitivity, TestSpecificity, demog, t, surveyCov
     NonDiseased = surveyed_children.sum() - Diseased
 
     # perform test with given sensitivity and specificity to get test positives
-    positive = int(np.random.binomial(n=Diseased, size=1, p = TestSensitivity)) + int(np.random.binomial(n=NonDiseased, size=1, p = 1- TestSpecificity)) 
+    positive = int(rng.binomial(n=Diseased, size=1, p = TestSensitivity)) + int(rng.binomial(n=NonDiseased, size=1, p = 1- TestSpecificity)) 
     if t > 0:
-        n_surveys_by_age, _ = np.histogram(
-                    vals['Age'][surveyed_children]/52,
-                    bins=np.arange(0, int(demog['max_age']/52) + 1),
-                )
+        n_surveys_by_age = ageYearHistogram(vals, int(demog['max_age']/52), surveyed_children)
         
-        n_people_by_age, _ = np.histogram(
-                    vals['Age']/52,
-                    bins=np.arange(0, int(demog['max_age']/52) + 1),
-                )
+        n_people_by_age = ageYearHistogram(vals, int(demog['max_age']/52))
         # add this to the SD n survey population dict
         vals["n_surveys_population"][
                     str(t) + ", surveys"
@@ -1134,113 +1440,170 @@ def getResultsNTDMC(results, Start_date, burnin):
     '''
     Function to collate results for NTDMC
     '''
+    return collateNTDMC([getDrawNTDMC(res[0], burnin) for res in results], Start_date)
 
-    
-    for i in range(len(results)):
-        d = copy.deepcopy(results[i][0])
-        prevs = np.array(d['True_Prev_Disease_children_1_9']) 
-        start = burnin # get prevalence from the end of the burnin onwards
-        step = 52 # step forward 52 weeks
-        chosenPrevs = prevs[start::step] 
+
+def getDrawNTDMC(vals, burnin):
+    '''
+    NTDMC output column of a single draw: the prevalence in 1-9 year olds
+    at the end of the burnin and every 52 weeks afterwards.
+    '''
+    prevs = np.array(vals['True_Prev_Disease_children_1_9'])
+    start = burnin # get prevalence from the end of the burnin onwards
+    step = 52 # step forward 52 weeks
+    return prevs[start::step]
+
+
+def collateNTDMC(columns, Start_date):
+    '''
+    Put the NTDMC columns of several draws (from getDrawNTDMC) in a data frame.
+    '''
+    for i, chosenPrevs in enumerate(columns):
         if i == 0:
-           df = pd.DataFrame(0, range(len(chosenPrevs)), columns= range(len(results)+4))
+           df = pd.DataFrame(0, range(len(chosenPrevs)), columns= range(len(columns)+4))
            df = df.rename(columns={0: "Time", 1: "age_start", 2: "age_end", 3: "measure"}) 
            df.iloc[:, 0] = range(Start_date.year, Start_date.year + len(chosenPrevs))
            df.iloc[:, 1] = np.repeat(1, len(chosenPrevs))
            df.iloc[:, 2] = np.repeat(9, len(chosenPrevs))
            df.iloc[:, 3] = np.repeat("prevalence", len(chosenPrevs))
         df.iloc[:,i+4] = chosenPrevs
-    for i in range(len(results)):
+    for i in range(len(columns)):
         df = df.rename(columns={i+4: "draw_"+ str(i)}) 
     return df
 
-def getResultsIHME(results, demog, params, outputYear):
+
+def _drawColumn(values, length):
+    '''
+    Pad the values of one draw with zeros to length. The column is stored as
+    integers if every value is a whole number, and as floats otherwise, which
+    is what pandas does when the values are set one at a time in a column of zeros.
+    '''
+    column = np.zeros(length)
+    column[:len(values)] = values
+    if np.all(np.mod(column, 1) == 0):
+        return column.astype(np.int64)
+    return column
+
+
+def sampleObservedTF(Age, IndD, bins, params, rng = np.random):
+    '''
+    Sample the number of people in each age bin who would be observed with TF
+    in a survey, drawing Binomial(diseased in bin, sensitivity) true positives
+    and Binomial(non-diseased in bin, 1 - specificity) false positives.
+    This has the same distribution as testing each person separately but only
+    needs two draws per age bin.
+
+    Parameters
+    ----------
+    Age : array
+        ages in weeks
+    IndD : array
+        disease indicator
+    bins : int or array
+        bins as passed to np.histogram(Age, bins=bins). The edges are always
+        computed from the whole population so they match the other measures.
+
+    Returns
+    -------
+    array
+        observed number of positives in each bin
+    '''
+    edges = np.histogram_bin_edges(Age, bins=bins)
+    diseased, _ = np.histogram(Age, bins=edges, weights=(IndD == 1).astype(int))
+    diseased = diseased.astype(int)
+    nonDiseased, _ = np.histogram(Age, bins=edges, weights=(IndD == 0).astype(int))
+    nonDiseased = nonDiseased.astype(int)
+    return (rng.binomial(n=diseased, p=params['TestSensitivity']) +
+            rng.binomial(n=nonDiseased, p=1 - params['TestSpecificity']))
+
+
+def getResultsIHME(results, demog, params, outputYear, aggregateObservedTF=False):
     '''
     Function to collate results for IHME
+
+    If aggregateObservedTF is True the ObservedTF measure is sampled per age bin
+    with sampleObservedTF rather than by testing each person separately.
     '''
     max_age = demog['max_age'] // 52 # max_age in weeks
+    columns = [getDrawIHME(res[1], params, max_age, aggregateObservedTF) for res in results]
+    return collateIHME(columns, outputYear, len(results[0][1]) if len(results) > 0 else 0, max_age)
 
-    df = pd.DataFrame(0, range(len(outputYear)*4*60 + len(outputYear)*2 ), columns= range(len(results)+4))
-    df = df.rename(columns={0: "Time", 1: "age_start", 2: "age_end", 3: "measure"}) 
-    
-    for i in range(len(results)):
-        ind = 0
-        d = copy.deepcopy(results[i][1])
-        for j in range(len(d)):
-            year = outputYear[j]
-            large_infection_count = (d[j].NoInf > params['n_inf_sev'])
-            infection_count = (d[j].IndI > 0)
+
+def getDrawIHME(d, params, max_age, aggregateObservedTF=False, rng=np.random):
+    '''
+    IHME output column of a single draw, from the list of Result snapshots d.
+    For each snapshot there are max_age rows each of TruePrevalence, ObservedTF,
+    heavyInfections and number, then nSurvey and surveyPass.
+    '''
+    column = np.zeros(len(d) * (4 * max_age + 2))
+    ind = 0
+    for j in range(len(d)):
+        large_infection_count = (d[j].NoInf > params['n_inf_sev'])
+        infection_count = (d[j].IndI > 0)
+        Age = d[j].Age
+        if aggregateObservedTF:
+            observedDis = sampleObservedTF(Age, d[j].IndD, max_age, params, rng)
+        else:
             Diseased = np.where(d[j].IndD == 1)
             NonDiseased = np.where(d[j].IndD == 0)
-            pos = np.zeros(len(d[j].Age), dtype = object)
+            pos = np.zeros(len(Age), dtype = int)
             if(len(Diseased) > 0):
-                TruePositive = np.random.binomial(n=1, size=len(Diseased[0]), p = params['TestSensitivity'])
+                TruePositive = rng.binomial(n=1, size=len(Diseased[0]), p = params['TestSensitivity'])
                 pos[Diseased] = TruePositive
             if(len(NonDiseased) > 0):
-                FalsePositive = np.random.binomial(n=1, size=len(NonDiseased[0]), p = 1- params['TestSpecificity'])
+                FalsePositive = rng.binomial(n=1, size=len(NonDiseased[0]), p = 1- params['TestSpecificity'])
                 pos[NonDiseased] = FalsePositive
-            
- 
-            Age = d[j].Age
-            # Cast weights to integer to be able to count
-            manyInfs, _ = np.histogram(Age, bins=max_age, weights=large_infection_count.astype(int))
-            Infs, _ = np.histogram(Age, bins=max_age, weights=infection_count.astype(int))
-            nums, _ = np.histogram(Age, bins=max_age)
-            observedDis, _ = np.histogram(Age, bins=max_age, weights=pos.astype(int))
-            k = np.where(nums == 0)
-            nums[k] = 1
-            if i == 0:
-                df.iloc[range(ind, ind+max_age), 0] = np.repeat(year,max_age)
-                df.iloc[range(ind, ind+max_age), 1] = range(0, max_age)
-                df.iloc[range(ind, ind+max_age), 2] = range(1, max_age + 1)
-                df.iloc[range(ind, ind+max_age), 3] = np.repeat("TruePrevalence", max_age)
-                df.iloc[range(ind, ind+max_age), i+4] = Infs/nums
-                ind += max_age
-                df.iloc[range(ind, ind+max_age), 0] = np.repeat(year,max_age)
-                df.iloc[range(ind, ind+max_age), 1] = range(0, max_age)
-                df.iloc[range(ind, ind+max_age), 2] = range(1, max_age + 1)
-                df.iloc[range(ind, ind+max_age), 3] = np.repeat("ObservedTF", max_age)
-                df.iloc[range(ind, ind+max_age), i+4] = observedDis/nums
-                ind += max_age
-                df.iloc[range(ind, ind+max_age), 0] = np.repeat(year,max_age)
-                df.iloc[range(ind, ind+max_age), 1] = range(0, max_age)
-                df.iloc[range(ind, ind+max_age), 2] = range(1, max_age + 1)
-                df.iloc[range(ind, ind+max_age), 3] = np.repeat("heavyInfections", max_age)
-                df.iloc[range(ind, ind+max_age), i+4] = manyInfs/nums
-                ind += max_age
-                nums[k] = 0
+            observedDis, _ = np.histogram(Age, bins=max_age, weights=pos)
+
+        # Cast weights to integer to be able to count
+        manyInfs, _ = np.histogram(Age, bins=max_age, weights=large_infection_count.astype(int))
+        Infs, _ = np.histogram(Age, bins=max_age, weights=infection_count.astype(int))
+        nums, _ = np.histogram(Age, bins=max_age)
+        k = np.where(nums == 0)
+        nums[k] = 1
+        column[ind:ind+max_age] = Infs/nums
+        ind += max_age
+        column[ind:ind+max_age] = observedDis/nums
+        ind += max_age
+        column[ind:ind+max_age] = manyInfs/nums
+        ind += max_age
+        nums[k] = 0
+        column[ind:ind+max_age] = nums
+        ind += max_age
+        column[ind] = d[j].nSurvey
+        ind += 1
+        column[ind] = d[j].surveyPass
+        ind += 1
+    return column
+
+
+def collateIHME(columns, outputYear, n_years, max_age):
+    '''
+    Put the IHME columns of several draws (from getDrawIHME), each covering
+    n_years output years, in a data frame.
+    '''
+    df = pd.DataFrame(0, range(len(outputYear)*4*60 + len(outputYear)*2 ), columns= range(len(columns)+4))
+    df = df.rename(columns={0: "Time", 1: "age_start", 2: "age_end", 3: "measure"}) 
+
+    if len(columns) > 0:
+        ind = 0
+        for j in range(n_years):
+            year = outputYear[j]
+            for measure in ["TruePrevalence", "ObservedTF", "heavyInfections", "number"]:
                 df.iloc[range(ind, ind+max_age), 0] = np.repeat(year,max_age)
                 df.iloc[range(ind, ind+max_age), 1] = range(0, max_age)
                 df.iloc[range(ind, ind+max_age), 2] = range(1, max_age + 1)
-                df.iloc[range(ind, ind+max_age), 3] = np.repeat("number", max_age)
-                df.iloc[range(ind, ind+max_age), i+4] = nums
+                df.iloc[range(ind, ind+max_age), 3] = np.repeat(measure, max_age)
                 ind += max_age
+            for measure in ["nSurvey", "surveyPass"]:
                 df.iloc[ind, 0] = year
-                df.iloc[ind, 3] = "nSurvey"
-                df.iloc[ind, 1] = "None"
-                df.iloc[ind, 2] = "None"
-                df.iloc[ind, i+4] = d[j].nSurvey
-                ind += 1
-                df.iloc[ind, 0] = year
-                df.iloc[ind, 3] = "surveyPass"
+                df.iloc[ind, 3] = measure
                 df.iloc[ind, 1] = "None"
                 df.iloc[ind, 2] = "None"
-                df.iloc[ind, i+4] = d[j].surveyPass
                 ind += 1
-            else:
-                df.iloc[range(ind, ind+max_age), i+4] = Infs/nums
-                ind += max_age
-                df.iloc[range(ind, ind+max_age), i+4] = observedDis/nums
-                ind += max_age
-                df.iloc[range(ind, ind+max_age), i+4] = manyInfs/nums
-                ind += max_age
-                df.iloc[range(ind, ind+max_age), i+4] = nums
-                ind += max_age
-                df.iloc[ind, i+4] = d[j].nSurvey
-                ind += 1
-                df.iloc[ind, i+4] = d[j].surveyPass
-                ind += 1
-    for i in range(len(results)):
+    for i, column in enumerate(columns):
+        df[i+4] = _drawColumn(column, len(df))
+    for i in range(len(columns)):
         df = df.rename(columns={i+4: "draw_"+ str(i)}) 
     return df
 
@@ -1471,8 +1834,8 @@ def getSurveyInfo(res, Start_date, sim_params, demog):
         
     return output
 
-def combineIHME_MDA_SurveyData(results, demog, params, outputYear, Start_date, sim_params):
-    IHME = getResultsIHME(results, demog, params, outputYear)
+def combineIHME_MDA_SurveyData(results, demog, params, outputYear, Start_date, sim_params, aggregateObservedTF=False):
+    IHME = getResultsIHME(results, demog, params, outputYear, aggregateObservedTF=aggregateObservedTF)
     MDA = getMDAInfo(results, Start_date, sim_params, demog)
     Vacc = getVaccInfo(results, Start_date, sim_params, demog)
     Survey = getSurveyInfo(results, Start_date, sim_params, demog)
@@ -1486,117 +1849,67 @@ def combineIHME_MDA_SurveyData(results, demog, params, outputYear, Start_date, s
 
 
 def getInterventionAgeRanges(coverageFileName, intervention, data_path=None):
-    PlatCov = pd.read_csv(
-        _validate_data_path(data_path) / coverageFileName
-    )
-    InterventionRows = np.where(PlatCov.Platform == intervention)[0]
-    PlatCov = PlatCov.iloc[InterventionRows, :]
-    InterventionAgeRanges = np.zeros([PlatCov.shape[0],2], dtype = object)
-    minAgeIndex = np.where(PlatCov.columns == "min age")[0][0]
-    maxAgeIndex = np.where(PlatCov.columns == "max age")[0][0]
-    for i in range(PlatCov.shape[0]):
-        InterventionAgeRanges[i, 0] = PlatCov.iloc[i, minAgeIndex]
-        InterventionAgeRanges[i, 1] = PlatCov.iloc[i, maxAgeIndex]
-        
-    return InterventionAgeRanges
+    schedule = loadInterventionSchedule(_validate_data_path(data_path) / coverageFileName)
+    return schedule.ageRanges(intervention)
 
 def getResultsIPM(results, demog, params, outputYear, MDAAgeRanges, VaccAgeRanges):
     '''
     Function to collate results for IPM
     '''
    
+    columns = [getDrawIPM(res[1], len(MDAAgeRanges), len(VaccAgeRanges)) for res in results]
+    return collateIPM(columns, outputYear, len(results[0][1]) if len(results) > 0 else 0, MDAAgeRanges, VaccAgeRanges)
+
+
+def getDrawIPM(d, nMDAAgeRanges, nVaccAgeRanges):
+    '''
+    IPM output column of a single draw, from the list of Result snapshots d.
+    '''
+    column = np.zeros(len(d) * (3 + 3 * nMDAAgeRanges + 3 * nVaccAgeRanges))
+    ind = 0
+    for j in range(len(d)):
+        column[ind:ind+3] = [d[j].nSurvey, d[j].surveyPass, d[j].elimination]
+        ind += 3
+        for k in range(nMDAAgeRanges):
+            column[ind:ind+3] = [d[j].nMDADoses[k], d[j].propMDA[k], d[j].nMDA[k]]
+            ind += 3
+        for k in range(nVaccAgeRanges):
+            column[ind:ind+3] = [d[j].nVaccDoses[k], d[j].propVacc[k], d[j].nVacc[k]]
+            ind += 3
+    return column
+
+
+def collateIPM(columns, outputYear, n_years, MDAAgeRanges, VaccAgeRanges):
+    '''
+    Put the IPM columns of several draws (from getDrawIPM), each covering
+    n_years output years, in a data frame.
+    '''
     df = pd.DataFrame(0, range(len(outputYear)*3 + len(outputYear) * 3 * len(MDAAgeRanges) + len(outputYear) * 3 * len(VaccAgeRanges)), 
-                      columns= range(len(results)+4))
+                      columns= range(len(columns)+4))
     df = df.rename(columns={0: "Time", 1: "age_start", 2: "age_end", 3: "measure"}) 
-    
-    for i in range(len(results)):
+
+    if len(columns) > 0:
         ind = 0
-        d = copy.deepcopy(results[i][1])
-        for j in range(len(d)):
+        for j in range(n_years):
             year = outputYear[j]
-            
-            if i == 0:
-                df.iloc[ind, 0] = year
-                df.iloc[ind, 3] = "nSurvey"
-                df.iloc[ind, 1] = "None"
-                df.iloc[ind, 2] = "None"
-                df.iloc[ind, i+4] = d[j].nSurvey
-                ind += 1
+            for measure in ["nSurvey", "surveyPass", "trueElimination"]:
                 df.iloc[ind, 0] = year
-                df.iloc[ind, 3] = "surveyPass"
+                df.iloc[ind, 3] = measure
                 df.iloc[ind, 1] = "None"
                 df.iloc[ind, 2] = "None"
-                df.iloc[ind, i+4] = d[j].surveyPass
                 ind += 1
-                df.iloc[ind, 0] = year
-                df.iloc[ind, 3] = "trueElimination"
-                df.iloc[ind, 1] = "None"
-                df.iloc[ind, 2] = "None"
-                df.iloc[ind, i+4] = d[j].elimination
-                ind += 1
-                for k in range(len(MDAAgeRanges)):
-                    df.iloc[ind, 0] = year
-                    df.iloc[ind, 3] = "nDosesMDA"
-                    df.iloc[ind, 1] = MDAAgeRanges[k][0]
-                    df.iloc[ind, 2] = MDAAgeRanges[k][1]
-                    df.iloc[ind, i+4] = d[j].nMDADoses[k]
-                    ind += 1
-                    df.iloc[ind, 0] = year
-                    df.iloc[ind, 3] = "MDAcoverage"
-                    df.iloc[ind, 1] = MDAAgeRanges[k][0]
-                    df.iloc[ind, 2] = MDAAgeRanges[k][1]
-                    df.iloc[ind, i+4] = d[j].propMDA[k]
-                    ind += 1
-                    df.iloc[ind, 0] = year
-                    df.iloc[ind, 3] = "numMDAs"
-                    df.iloc[ind, 1] = MDAAgeRanges[k][0]
-                    df.iloc[ind, 2] = MDAAgeRanges[k][1]
-                    df.iloc[ind, i+4] = d[j].nMDA[k]
-                    ind += 1
-                for k in range(len(VaccAgeRanges)):
-                    df.iloc[ind, 0] = year
-                    df.iloc[ind, 3] = "nDosesVacc"
-                    df.iloc[ind, 1] = VaccAgeRanges[k][0]
-                    df.iloc[ind, 2] = VaccAgeRanges[k][1]
-                    df.iloc[ind, i+4] = d[j].nVaccDoses[k]
-                    ind += 1
-                    df.iloc[ind, 0] = year
-                    df.iloc[ind, 3] = "VaccCoverage"
-                    df.iloc[ind, 1] = VaccAgeRanges[k][0]
-                    df.iloc[ind, 2] = VaccAgeRanges[k][1]
-                    df.iloc[ind, i+4] = d[j].propVacc[k]
-                    ind += 1
-                    df.iloc[ind, 0] = year
-                    df.iloc[ind, 3] = "numVaccs"
-                    df.iloc[ind, 1] = VaccAgeRanges[k][0]
-                    df.iloc[ind, 2] = VaccAgeRanges[k][1]
-                    df.iloc[ind, i+4] = d[j].nVacc[k]
-                    ind += 1
-                    
-                
-            else:
-                df.iloc[ind, i+4] = d[j].nSurvey
-                ind += 1
-                df.iloc[ind, i+4] = d[j].surveyPass
-                ind += 1
-                df.iloc[ind, i+4] = d[j].elimination
-                ind += 1
-                for k in range(len(MDAAgeRanges)):               
-                    df.iloc[ind, i+4] = d[j].nMDADoses[k]
-                    ind += 1   
-                    df.iloc[ind, i+4] = d[j].propMDA[k]
-                    ind += 1
-                    df.iloc[ind, i+4] = d[j].nMDA[k]
-                    ind += 1
-                for k in range(len(VaccAgeRanges)):               
-                    df.iloc[ind, i+4] = d[j].nVaccDoses[k]
-                    ind += 1   
-                    df.iloc[ind, i+4] = d[j].propVacc[k]
-                    ind += 1
-                    df.iloc[ind, i+4] = d[j].nVacc[k]
-                    ind += 1
-                
-    for i in range(len(results)):
+            for ageRanges, measures in [(MDAAgeRanges, ["nDosesMDA", "MDAcoverage", "numMDAs"]),
+                                        (VaccAgeRanges, ["nDosesVacc", "VaccCoverage", "numVaccs"])]:
+                for k in range(len(ageRanges)):
+                    for measure in measures:
+                        df.iloc[ind, 0] = year
+                        df.iloc[ind, 3] = measure
+                        df.iloc[ind, 1] = ageRanges[k][0]
+                        df.iloc[ind, 2] = ageRanges[k][1]
+                        ind += 1
+    for i, column in enumerate(columns):
+        df[i+4] = _drawColumn(column, len(df))
+    for i in range(len(columns)):
         df = df.rename(columns={i+4: "draw_"+ str(i)}) 
     return df
 
@@ -1615,27 +1928,94 @@ def resetMDAVaccAndSurveyData(vals):
     return vals
 
 def run_single_simulation(pickleData, params, timesim, burnin, demog, beta, MDA_times, MDAData, vacc_times, VaccData,
-                          outputTimes, doSurvey, doIHMEOutput, index, numpy_state, distToUse = "Poisson"):
+                          outputTimes, doSurvey, doIHMEOutput, index, numpy_state, distToUse = "Poisson",
+                          profile = False, telemetry = None, arena = None, rng = None,
+                          crn_seed = None, adaptive_burnin = None):
 
     '''
     Function to run a single instance of the simulation. The starting point for these simulations
     is
+
+    If profile is True, the time, number of calls and peak memory of each phase of the simulation
+    are returned in vals['phase_profile']. These can be combined across draws with
+    collatePhaseProfiles. If profile is 'time' only the times and calls are recorded, which is
+    needed for simulations run at the same time in threads (see trachoma.profiling).
+
+    telemetry can be a path, a logger, a function or a Telemetry object (see trachoma.telemetry),
+    which is sent task_start, progress and task_end events for this simulation.
+
+    If an OutputArena is given (see trachoma.arena), the IHME, IPM and NTDMC outputs of this
+    simulation are written to its slice index.
+
+    rng is the source of random numbers, by default the global np.random state. Simulations run
+    at the same time in different threads must each be given their own np.random.RandomState,
+    which gives the same results as the global state for the same numpy_state.
+
+    If params['complianceQuantiles'] is True, each person's probability of treatment follows from a
+    fixed compliance quantile (see trachoma.compliance) rather than being redrawn.
+
+    If crn_seed is given, the random numbers are common random numbers (see trachoma.crn), with a
+    stream for each process of the model in each week seeded by crn_seed, index and the week, in
+    place of rng. Running a draw under two scenarios with the same crn_seed, index and numpy_state
+    then gives less variable differences between them.
+
+    If a trachoma.burnin.AdaptiveBurnin is given as adaptive_burnin, the burnin stops once the
+    prevalence and bacterial load are stationary, and the rest of it is skipped, so MDA and output
+    times are as for the full burnin. The weeks of burnin run are returned in vals['Burnin_weeks'],
+    and those skipped in vals['Burnin_skipped_weeks'], which aren't counted in the task_end event.
+    '''
+    if crn_seed is not None:
+        rng = CommonRandomNumbers(crn_seed, draw=index)
+    rng = np.random if rng is None else rng
+    telemetry = make_telemetry(telemetry).bind(draw=index)
+    telemetry.task_start(N=len(pickleData['IndI']), timesim=timesim)
+    vals, params, demog = prepareSimulation(pickleData, params, demog, MDAData, numpy_state, rng)
+    profiler = PhaseProfiler(trace_memory=profile != 'time') if profile else NULL_PROFILER
+    profiler.start()
+    try:
+        results = sim_Ind_MDA_Include_Survey(params=params,
+                                            vals = vals, timesim = timesim,
+                                            burnin=burnin,
+                                            demog=demog, bet=beta, MDA_times = MDA_times, 
+                                            MDAData=MDAData, vacc_times = vacc_times, VaccData = VaccData,
+                                            outputTimes= outputTimes, doSurvey=doSurvey, doIHMEOutput=doIHMEOutput,
+                                            numpy_state=numpy_state, distToUse= distToUse, profiler=profiler,
+                                            telemetry=telemetry, rng=rng,
+                                            adaptive_burnin=adaptive_burnin)
+    finally:
+        profiler.stop()
+    # an adaptive burnin runs its own weeks and skips the rest of the nominal burnin
+    telemetry.task_end(weeks=timesim - results[0].get('Burnin_skipped_weeks', 0))
+    if profile:
+        results[0]['phase_profile'] = profiler.report()
+    if arena is not None:
+        arena.write(index, results[0], results[1], params, rng)
+    return results
+
+def prepareSimulation(pickleData, params, demog, MDAData, numpy_state, rng = np.random):
+    '''
+    Copy the starting population pickleData and add anything missing from it for
+    sim_Ind_MDA_Include_Survey, as run_single_simulation does. Returns the population
+    and the compiled ModelParams and Demography.
     '''
     vals = copy.deepcopy(pickleData)
     vals = Check_and_init_vaccination_state(params,vals)
-    vals = Check_and_init_MDA_treatment_state(params, vals, MDAData, numpy_state)
+    vals = Check_and_init_MDA_treatment_state(params, vals, MDAData, numpy_state, rng)
+    if params.get('complianceQuantiles', False):
+        vals = Check_and_init_compliance_quantiles(vals, rng)
     vals = Check_for_IDs(vals)
     vals = Check_for_MDA_Vacc_And_Survey_Data(vals)
     vals = resetMDAVaccAndSurveyData(vals)
-    params['N'] = len(vals['IndI'])
-    results = sim_Ind_MDA_Include_Survey(params=params,
-                                        vals = vals, timesim = timesim,
-                                        burnin=burnin,
-                                        demog=demog, bet=beta, MDA_times = MDA_times, 
-                                        MDAData=MDAData, vacc_times = vacc_times, VaccData = VaccData,
-                                        outputTimes= outputTimes, doSurvey=doSurvey, doIHMEOutput=doIHMEOutput,
-                                        numpy_state=numpy_state, distToUse= distToUse)
-    return results
+    params = ModelParams.from_dict(dict(params, N=len(vals['IndI'])))
+    demog = Demography.from_dict(demog)
+    return vals, params, demog
+
+def collatePhaseProfiles(results):
+    '''
+    Combine the phase profiles of the simulations in results (as returned by
+    run_single_simulation with profile=True) into a single report.
+    '''
+    return merge_reports(res[0].get('phase_profile') for res in results)
 
 def seed_to_state(seed):
     np.random.seed(seed)
@@ -0,0 +1,134 @@
+import math
+import threading
+
+import numpy as np
+
+"""
+Vaccination state as the week each person was vaccinated.
+
+The effect of the vaccine on transmission wanes linearly over
+vacc_waning_length weeks. vals['time_since_vaccinated'] holds the weeks since
+each person was vaccinated, which the step function increments for everyone
+vaccinated every week, and the infection pressure calculates the remaining
+effect of the vaccine for the whole population from it every week, whether or
+not anyone has been vaccinated.
+
+VaccinationStamps instead records the week each person was vaccinated in, and
+the people who have been vaccinated, so a week passing is a matter of advancing
+its week. The remaining effect of the vaccine w weeks after vaccination is
+looked up in a table made once for the vaccine's parameters (see waningTable),
+and is only calculated for the people who have been vaccinated. With nobody
+vaccinated the vaccine costs nothing.
+
+sim_Ind_MDA_Include_Survey keeps VaccinationStamps in vals['vaccination'] while
+it runs, during which vals['time_since_vaccinated'] isn't updated, and writes
+the times since vaccination back into it at the end. vals['vaccinated'] is
+kept up to date.
+"""
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+# number of waning tables kept
+MAX_CACHED_TABLES = 64
+
+
+def waningTable(vacc_prob_block_transmission, vacc_waning_length):
+    '''
+    Reduction in the infection pressure on someone vaccinated w weeks ago, for
+    every w up to the end of the waning period, after which it is 0. The values
+    are calculated as getIndividualLambdas does, so they are the same.
+    '''
+    key = (float(vacc_prob_block_transmission), float(vacc_waning_length))
+    with _tables_lock:
+        table = _tables.get(key)
+    if table is None:
+        weeks = np.arange(math.ceil(vacc_waning_length), dtype=float)
+        table = np.maximum(vacc_prob_block_transmission * (- weeks / vacc_waning_length + 1), 0)
+        table.setflags(write=False)
+        with _tables_lock:
+            if len(_tables) >= MAX_CACHED_TABLES:
+                _tables.clear()
+            _tables[key] = table
+    return table
+
+
+class VaccinationStamps:
+    '''
+    Week of vaccination of everyone who has been vaccinated.
+
+    Parameters
+    ----------
+    vaccinated : array of bool
+        who has been vaccinated
+    time_since_vaccinated : array
+        weeks since each person was vaccinated, which have to be whole numbers
+
+    Attributes
+    ----------
+    week : int
+        number of weeks since the stamps were made
+    stamp : array of int
+        week each vaccinated person was vaccinated in
+    people : array of int
+        everyone who has been vaccinated, in increasing order
+    '''
+
+    def __init__(self, vaccinated, time_since_vaccinated):
+        time_since_vaccinated = np.asarray(time_since_vaccinated)
+        self.week = 0
+        self.people = np.flatnonzero(vaccinated)
+        weeks = time_since_vaccinated[self.people]
+        if np.any(weeks != np.round(weeks)):
+            raise ValueError('the times since vaccination must be whole numbers of weeks')
+        self.stamp = np.zeros(len(time_since_vaccinated), dtype=np.int64)
+        self.stamp[self.people] = -weeks.astype(np.int64)
+
+    def advance(self, weeks=1):
+        '''
+        Add weeks to everyone's time since vaccination.
+        '''
+        self.week += weeks
+
+    def vaccinate(self, indices):
+        '''
+        Record that the people indices have been vaccinated this week.
+        '''
+        indices = np.asarray(indices, dtype=np.int64)
+        self.stamp[indices] = self.week
+        self.people = np.union1d(self.people, indices)
+
+    def remove(self, indices):
+        '''
+        Forget the vaccination of the people indices, who have been reset or imported.
+        '''
+        if len(self.people) == 0:
+            return
+        indices = np.asarray(indices, dtype=np.int64)
+        positions = np.searchsorted(self.people, indices)
+        found = positions < len(self.people)
+        found[found] = self.people[positions[found]] == indices[found]
+        if np.any(found):
+            self.people = np.delete(self.people, positions[found])
+
+    def weeksSinceVaccination(self):
+        '''
+        Weeks since the vaccination of each person in people.
+        '''
+        return self.week - self.stamp[self.people]
+
+    def protection(self, params):
+        '''
+        The people still protected by the vaccine, and the reduction in the infection
+        pressure on each of them.
+        '''
+        table = waningTable(params['vacc_prob_block_transmission'], params['vacc_waning_length'])
+        weeks = self.weeksSinceVaccination()
+        protected = weeks < len(table)
+        return self.people[protected], table[weeks[protected]]
+
+    def write(self, time_since_vaccinated):
+        '''
+        Write the weeks since vaccination of everyone vaccinated into time_since_vaccinated.
+        '''
+        time_since_vaccinated[self.people] = self.weeksSinceVaccination()